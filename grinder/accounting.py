@@ -0,0 +1,136 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import re
+import threading
+
+from . profiling import api_name
+from . profiling import timed
+
+# Addresses and ids in wait_for messages, so that polls for different
+# instances are counted together.
+VARYING_PATTERN = re.compile(r'[0-9a-fA-F]{8}(?:-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}'
+                             r'|\d+(?:\.\d+)*')
+
+def poll_name(message):
+    return VARYING_PATTERN.sub('*', message)
+
+class CallCounts(object):
+
+    '''Counts the calls made while a test runs: API requests by service,
+    method and endpoint, shell commands by target and verb, and wait_for
+    polls by what they wait for.'''
+
+    KINDS = ['api', 'ssh', 'poll']
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (kind, name) -> count
+        self.counts = {}
+
+    def add(self, kind, name, count=1):
+        with self.lock:
+            self.counts[(kind, name)] = self.counts.get((kind, name), 0) + count
+
+    def merge(self, other):
+        for ((kind, name), count) in other.items():
+            self.add(kind, name, count)
+
+    def items(self):
+        with self.lock:
+            return sorted(self.counts.items())
+
+    def totals(self):
+        totals = dict((kind, 0) for kind in self.KINDS)
+        for ((kind, name), count) in self.items():
+            totals[kind] = totals.get(kind, 0) + count
+        return totals
+
+    def properties(self):
+        '''Returns [(name, count)] for the junit XML: the total of each kind
+        followed by every counter.'''
+        properties = [('calls.%s' % kind, count)
+                      for (kind, count) in sorted(self.totals().items())]
+        properties.extend(('calls.%s.%s' % (kind, name), count)
+                          for ((kind, name), count) in self.items())
+        return properties
+
+class CallAccounting(object):
+
+    '''The counts of the running test and of every test in the session.'''
+
+    def __init__(self):
+        self.current = CallCounts()
+        self.session = CallCounts()
+        # test name -> CallCounts
+        self.tests = {}
+
+    def start(self, test_name):
+        self.current = CallCounts()
+        self.tests[test_name] = self.current
+        return self.current
+
+    def count(self, kind, name):
+        self.current.add(kind, name)
+        self.session.add(kind, name)
+
+    def format_summary(self, limit=10):
+        '''Returns the busiest tests and the most frequent calls, or [] if
+        nothing was counted.'''
+        if len(self.session.items()) == 0:
+            return []
+        lines = ['%-60s %8s %8s %8s' % ('test', 'api', 'ssh', 'poll')]
+        busiest = sorted(self.tests.items(),
+                         key=lambda (name, counts): -counts.totals()['api'])
+        for (name, counts) in busiest[:limit]:
+            totals = counts.totals()
+            lines.append('%-60s %8d %8d %8d' % (name[:60], totals['api'],
+                                                totals['ssh'], totals['poll']))
+        lines.append('')
+        lines.append('%-60s %8s' % ('call', 'count'))
+        frequent = sorted(self.session.items(),
+                          key=lambda (key, count): -count)
+        for ((kind, name), count) in frequent[:limit]:
+            lines.append('%-60s %8d' % (('%s %s' % (kind, name))[:60], count))
+        return lines
+
+accounting = CallAccounting()
+
+def count(kind, name):
+    accounting.count(kind, name)
+
+def instrument_client(client, service):
+    '''Counts, and profiles, the HTTP requests made by an OpenStack client:
+    novaclient and cinderclient send them through client.request, neutron
+    and quantum clients through httpclient.do_request. A client is only
+    instrumented once, however often it is passed in. Returns the
+    client.'''
+    for (attr, method) in (('client', 'request'), ('httpclient', 'do_request')):
+        http = getattr(client, attr, None)
+        if http is not None and hasattr(http, method):
+            break
+    else:
+        return client
+    request = getattr(http, method)
+    if getattr(request, 'counted', False):
+        return client
+    def counted_request(url, method, **kwargs):
+        name = api_name(method, url)
+        count('api', '%s %s' % (service, name))
+        with timed('api', name):
+            return request(url, method, **kwargs)
+    counted_request.counted = True
+    setattr(http, method, counted_request)
+    return client
@@ -0,0 +1,72 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from . accounting import CallAccounting, CallCounts
+from . accounting import instrument_client, poll_name
+
+def test_poll_name():
+    assert poll_name('shell 10.0.0.3 to respond') == 'shell * to respond'
+    assert poll_name('server 6c1b8a36-8d0e-4a7f-9a3c-2f6a4c1e5d7b to be '
+                     'ACTIVE') == 'server * to be ACTIVE'
+
+def test_counts():
+    counts = CallCounts()
+    counts.add('api', 'nova GET /servers/{id}')
+    counts.add('api', 'nova GET /servers/{id}')
+    counts.add('ssh', '10.0.0.3 vmsctl')
+    assert counts.totals() == {'api': 2, 'ssh': 1, 'poll': 0}
+    assert counts.properties() == [
+        ('calls.api', 2), ('calls.poll', 0), ('calls.ssh', 1),
+        ('calls.api.nova GET /servers/{id}', 2),
+        ('calls.ssh.10.0.0.3 vmsctl', 1)]
+
+def test_accounting():
+    accounting = CallAccounting()
+    assert accounting.format_summary() == []
+    first = accounting.start('test_one')
+    accounting.count('api', 'nova GET /servers')
+    second = accounting.start('test_two')
+    accounting.count('api', 'nova GET /servers')
+    accounting.count('api', 'nova POST /servers')
+    accounting.count('poll', 'shell * to respond')
+    assert first.totals()['api'] == 1
+    assert second.totals() == {'api': 2, 'ssh': 0, 'poll': 1}
+    assert accounting.session.totals() == {'api': 3, 'ssh': 0, 'poll': 1}
+    lines = accounting.format_summary()
+    # The busiest test comes first, then the most frequent call.
+    assert lines[1].startswith('test_two')
+    assert lines[5].startswith('api nova GET /servers ')
+
+class FakeHTTPClient(object):
+    def do_request(self, url, method, **kwargs):
+        return method
+
+class FakeNetworkClient(object):
+    def __init__(self):
+        self.httpclient = FakeHTTPClient()
+
+def test_instrument_client():
+    from . import accounting
+    client = instrument_client(FakeNetworkClient(), 'network')
+    counts = accounting.accounting.start('test_instrument_client')
+    assert client.httpclient.do_request('http://neutron/v2.0/ports/42',
+                                        'DELETE') == 'DELETE'
+    assert counts.items() == [(('api', 'network DELETE /v2.0/ports/{id}'), 1)]
+    # Instrumenting a client again does not count its requests twice.
+    assert instrument_client(client, 'network') is client
+    client.httpclient.do_request('http://neutron/v2.0/ports/42', 'DELETE')
+    assert counts.items() == [(('api', 'network DELETE /v2.0/ports/{id}'), 2)]
+    unknown = object()
+    assert instrument_client(unknown, 'nova') is unknown
@@ -0,0 +1,133 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+'''Seeded balloon contents.
+
+A balloon is a file of pages whose contents are a pure function of a seed:
+every page is unique (it starts with the seed and its page number) and the
+rest of the page is a pseudorandom block derived from the seed. The guest
+writes it without touching /dev/urandom, and the harness can compute the
+digest of any chunk locally, so integrity checks only need the guest to
+hash the chunks being sampled.
+
+This module is also uploaded into Linux guests with guesthelper.py, which
+imports it, so it must only depend on the standard library and must work on
+both python 2 and 3.
+'''
+
+import hashlib
+import os
+import random
+import struct
+
+PAGE_SIZE = 4096
+
+# Balloons are written and verified in chunks of 2MiB.
+CHUNK_PAGES = 512
+
+def base_block(seed):
+    '''The pseudorandom page body shared by all pages of a seed.'''
+    digests = [hashlib.md5(('%d:%d' % (seed, i)).encode('ascii')).digest()
+               for i in range(PAGE_SIZE // 16)]
+    return b''.join(digests)[16:]
+
+def chunk_data(seed, pages, index, base=None):
+    '''The contents of chunk index of a balloon of the given size.'''
+    if base is None:
+        base = base_block(seed)
+    first = index * CHUNK_PAGES
+    last = min(first + CHUNK_PAGES, pages)
+    return b''.join([struct.pack('<QQ', seed, page) + base
+                     for page in range(first, last)])
+
+def num_chunks(pages):
+    return (pages + CHUNK_PAGES - 1) // CHUNK_PAGES
+
+def fill(path, seed, pages):
+    '''Writes the balloon into path. An existing file is overwritten in
+    place, so every one of its pages is written to again.'''
+    base = base_block(seed)
+    if os.path.exists(path):
+        mode = 'r+b'
+    else:
+        mode = 'wb'
+    f = open(path, mode)
+    try:
+        f.seek(0)
+        for index in range(num_chunks(pages)):
+            f.write(chunk_data(seed, pages, index, base))
+        f.truncate(pages * PAGE_SIZE)
+    finally:
+        f.close()
+
+def digests(path, indexes):
+    '''Returns the md5 of the given chunks of the file at path.'''
+    result = {}
+    f = open(path, 'rb')
+    try:
+        for index in indexes:
+            f.seek(index * CHUNK_PAGES * PAGE_SIZE)
+            data = f.read(CHUNK_PAGES * PAGE_SIZE)
+            result[str(index)] = hashlib.md5(data).hexdigest()
+    finally:
+        f.close()
+    return result
+
+class BalloonFingerprint(object):
+
+    '''Identifies the contents of a seeded balloon. Returned by
+    allocate_balloon() and checked by assert_balloon_integrity().'''
+
+    def __init__(self, seed, pages):
+        self.seed = seed
+        self.pages = pages
+
+    @staticmethod
+    def generate(pages):
+        return BalloonFingerprint(random.getrandbits(32), pages)
+
+    def chunks(self):
+        return num_chunks(self.pages)
+
+    def chunk_digest(self, index):
+        return hashlib.md5(chunk_data(self.seed, self.pages, index)).hexdigest()
+
+    def sample(self, count):
+        '''Picks count chunks to verify, always including the first and the
+        last one. A count of 0 (or more than there are chunks) picks them
+        all.'''
+        chunks = self.chunks()
+        if count <= 0 or count >= chunks:
+            return range(chunks)
+        picked = set([0, chunks - 1])
+        picked.update(random.sample(range(1, chunks - 1),
+                                    max(0, min(count - 2, chunks - 2))))
+        return sorted(picked)
+
+    def mismatches(self, reported):
+        '''Given the chunk digests reported by the guest, returns the sorted
+        list of chunk indexes that do not match.'''
+        return sorted([int(index) for (index, digest) in reported.items()
+                       if digest != self.chunk_digest(int(index))])
+
+    def __eq__(self, other):
+        return isinstance(other, BalloonFingerprint) and \
+            (self.seed, self.pages) == (other.seed, other.pages)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'BalloonFingerprint(seed=%d, pages=%d)' % (self.seed, self.pages)
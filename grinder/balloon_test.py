@@ -0,0 +1,52 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import tempfile
+
+from . import balloon
+from . balloon import BalloonFingerprint
+
+def test_balloon_fill_and_digest():
+    fingerprint = BalloonFingerprint(1234, balloon.CHUNK_PAGES * 3 + 7)
+    (fd, path) = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        balloon.fill(path, fingerprint.seed, fingerprint.pages)
+        assert os.path.getsize(path) == fingerprint.pages * balloon.PAGE_SIZE
+        indexes = range(fingerprint.chunks())
+        assert fingerprint.mismatches(balloon.digests(path, indexes)) == []
+
+        # Refilling in place with another seed changes every chunk.
+        balloon.fill(path, 4321, fingerprint.pages)
+        assert fingerprint.mismatches(balloon.digests(path, indexes)) == \
+            [0, 1, 2, 3]
+    finally:
+        os.unlink(path)
+
+def test_balloon_pages_are_unique():
+    data = balloon.chunk_data(99, 8, 0)
+    pages = [data[i:i + balloon.PAGE_SIZE]
+             for i in range(0, len(data), balloon.PAGE_SIZE)]
+    assert len(pages) == 8
+    assert len(set(pages)) == 8
+
+def test_fingerprint_sample():
+    fingerprint = BalloonFingerprint(1, balloon.CHUNK_PAGES * 100)
+    sample = fingerprint.sample(10)
+    assert len(sample) == 10
+    assert sample[0] == 0 and sample[-1] == 99
+    assert fingerprint.sample(0) == range(100)
+    assert fingerprint.sample(1000) == range(100)
@@ -0,0 +1,124 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import csv
+import json
+import os
+import time
+
+from . logger import log
+from . util import percentile
+
+def doubling(start, limit):
+    '''Returns [start, 2*start, 4*start, ...] up to and including limit.'''
+    counts = []
+    count = start
+    while count <= limit:
+        counts.append(count)
+        count *= 2
+    return counts
+
+def phase_timings(instance, phases):
+    '''Returns the seconds from the start of a launch to each of the phases
+    recorded in instance.timings.'''
+    start = instance.timings['start']
+    return dict((phase, instance.timings[phase] - start)
+                for phase in phases if phase in instance.timings)
+
+class Benchmark(object):
+
+    '''Collects the samples of one benchmark run. A sample is a dict of the
+    parameters it was taken with (e.g. the number of clones) and a dict of
+    the values measured. report() logs a percentile table per parameter
+    set and writes everything to a JSON file in config.benchmark_dir, and
+    to a CSV file next to it for plotting.'''
+
+    def __init__(self, harness, name):
+        self.harness = harness
+        self.name = name
+        self.started = time.time()
+        self.samples = []
+
+    def add(self, params, values):
+        self.samples.append({'params': params, 'values': values})
+
+    def groups(self):
+        '''Returns [(params, {value name: [values]})], in the order each
+        set of parameters was first seen.'''
+        groups = []
+        index = {}
+        for sample in self.samples:
+            key = tuple(sorted(sample['params'].items()))
+            if key not in index:
+                index[key] = {}
+                groups.append((sample['params'], index[key]))
+            for (name, value) in sample['values'].items():
+                index[key].setdefault(name, []).append(value)
+        return groups
+
+    def table(self):
+        lines = ['%-32s %-12s %6s %9s %9s %9s %9s' %
+                 ('parameters', 'value', 'count', 'p50', 'p90', 'p99', 'max')]
+        for (params, values) in self.groups():
+            label = ','.join('%s=%s' % item for item in sorted(params.items()))
+            for (name, vals) in sorted(values.items()):
+                lines.append('%-32s %-12s %6d %9.3f %9.3f %9.3f %9.3f' %
+                             (label, name, len(vals), percentile(vals, 50),
+                              percentile(vals, 90), percentile(vals, 99),
+                              max(vals)))
+        return lines
+
+    def rows(self):
+        '''Returns the samples as a header and one row per sample, with a
+        column for every parameter and value name.'''
+        params = sorted(set(name for sample in self.samples
+                            for name in sample['params']))
+        values = sorted(set(name for sample in self.samples
+                            for name in sample['values']))
+        rows = [params + values]
+        for sample in self.samples:
+            rows.append([sample['params'].get(name, '') for name in params] +
+                        [sample['values'].get(name, '') for name in values])
+        return rows
+
+    def result(self):
+        return {'benchmark': self.name,
+                'run': self.harness.config.run_name,
+                'test': self.harness.test_name,
+                'started': self.started,
+                'duration': time.time() - self.started,
+                'samples': self.samples}
+
+    def report(self):
+        '''Logs the table and writes the result file. Returns its path.'''
+        log.info('Benchmark %s:\n%s' % (self.name, '\n'.join(self.table())))
+        directory = self.harness.config.benchmark_dir
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        path = os.path.join(directory, '%s-%s-%d.json' %
+                            (self.harness.config.run_name, self.name,
+                             int(self.started)))
+        f = open(path, 'w')
+        try:
+            json.dump(self.result(), f, indent=1)
+        finally:
+            f.close()
+        f = open(os.path.splitext(path)[0] + '.csv', 'wb')
+        try:
+            csv.writer(f).writerows(self.rows())
+        finally:
+            f.close()
+        log.info('Benchmark %s results written to %s' % (self.name, path))
+        return path
@@ -0,0 +1,65 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+
+from . benchmark import Benchmark, doubling, phase_timings
+from . config import Config
+
+class FakeHarness(object):
+    def __init__(self, directory):
+        self.config = Config()
+        self.config.run_name = 'run'
+        self.config.benchmark_dir = directory
+        self.test_name = 'test_bench'
+
+class FakeInstance(object):
+    def __init__(self, timings):
+        self.timings = timings
+
+def test_doubling():
+    assert doubling(1, 16) == [1, 2, 4, 8, 16]
+    assert doubling(2, 12) == [2, 4, 8]
+
+def test_phase_timings():
+    instance = FakeInstance({'start': 10.0, 'accepted': 10.5, 'ssh': 14.0})
+    assert phase_timings(instance, ['accepted', 'ping', 'ssh']) == \
+        {'accepted': 0.5, 'ssh': 4.0}
+
+def test_report():
+    directory = tempfile.mkdtemp()
+    try:
+        bench = Benchmark(FakeHarness(directory), 'bench')
+        for i in range(4):
+            bench.add({'clones': 2}, {'ssh': float(i)})
+        bench.add({'clones': 4}, {'ssh': 9.0})
+        groups = bench.groups()
+        assert groups[0] == ({'clones': 2}, {'ssh': [0.0, 1.0, 2.0, 3.0]})
+        assert len(bench.table()) == 3
+        path = bench.report()
+        assert os.path.dirname(path) == directory
+        result = json.load(open(path))
+        assert result['benchmark'] == 'bench'
+        assert len(result['samples']) == 5
+        rows = list(csv.reader(open(path[:-len('.json')] + '.csv')))
+        assert rows[0] == ['clones', 'ssh']
+        assert rows[-1] == ['4', '9.0']
+        assert len(rows) == 6
+    finally:
+        shutil.rmtree(directory)
@@ -13,26 +13,47 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
 import random
 
 from . logger import log
 
+def chain_digest(digest, breadcrumb):
+    '''The rolling digest of a trail: each breadcrumb is hashed together with
+    the digest of the trail before it. The empty trail's digest is ''.'''
+    return hashlib.md5((digest + breadcrumb).encode('utf-8')).hexdigest()
+
+def trail_digest(trail):
+    digest = ''
+    for breadcrumb in trail:
+        digest = chain_digest(digest, breadcrumb)
+    return digest
+
 class Breadcrumbs(object):
 
+    '''A trail of breadcrumbs kept both here and in the guest. Each add() is
+    verified in the same round trip that writes it: the guest answers with
+    its line count and rolling digest, which must match ours. The whole
+    trail is only read back by assert_trail(), at checkpoints such as bless,
+    launch and migrate.'''
+
     def __init__(self, instance):
         self.instance = instance
         self.trail = []
+        self.digest = ''
         self.data = None
 
     class Snapshot(object):
         def __init__(self, breadcrumbs):
             self.trail = list(breadcrumbs.trail)
+            self.digest = breadcrumbs.digest
             self.data = breadcrumbs.data
             self.constructor = breadcrumbs.__class__
 
         def instantiate(self, server):
             result = self.constructor(server)
             result.trail = list(self.trail)
+            result.digest = self.digest
             result.data = self.data
             return result
 
@@ -40,12 +61,18 @@ class Breadcrumbs(object):
         return Breadcrumbs.Snapshot(self)
 
     def add(self, breadcrumb):
-        self.assert_trail()
         breadcrumb = '%d: %s' % (len(self.trail), breadcrumb)
         log.debug('Adding breadcrumb "%s"', breadcrumb)
-        self._put(breadcrumb)
+        digest = chain_digest(self.digest, breadcrumb)
+        (count, guest_digest) = self._put(breadcrumb)
+        if (count, guest_digest) != (len(self.trail) + 1, digest):
+            log.error('Breadcrumb trail diverged: guest has %d with digest %s, '
+                      'expected %d with digest %s. Trail was: %s' %
+                      (count, guest_digest, len(self.trail) + 1, digest,
+                       self.trail))
+            assert False
         self.trail.append(breadcrumb)
-        self.assert_trail()
+        self.digest = digest
 
     def assert_trail(self):
         if len(self.trail) == 0:
@@ -58,6 +85,8 @@ class Breadcrumbs(object):
             assert [x.strip('\r') for x in contents.split('\n')] == list(self.trail)
 
     def _put(self, buf):
+        '''Appends buf to the guest's trail. Returns the guest's resulting
+        (count, digest) as per chain_digest.'''
         raise NotImplementedError()
 
     def _get(self):
@@ -73,18 +102,16 @@ class SSHBreadcrumbs(Breadcrumbs):
         self.data = '/dev/shm/test-breadcrumbs-%d' % random.randint(0, 1<<32)
 
     def _put(self, buf):
-        self.instance.root_command('echo %s >> %s' % (buf, self.data))
+        (count, digest) = self.instance.helper('breadcrumb-add',
+                                               path=self.data, text=buf)
+        return (count, digest)
 
     def _get(self):
-        stdout, stderr = self.instance.root_command('cat %s' % self.data)
-        return stdout
+        return '\n'.join(self.instance.helper('breadcrumb-list',
+                                               path=self.data) or [])
 
     def _emptyp(self):
-        try:
-            self.instance.root_command('test ! -e %s' % self.data)
-            return True
-        except:
-            return False
+        return self.instance.helper('breadcrumb-list', path=self.data) is None
 
 class LinkBreadcrumbs(Breadcrumbs):
     """
@@ -96,7 +123,11 @@ class LinkBreadcrumbs(Breadcrumbs):
         Breadcrumbs.__init__(self, instance)
 
     def _put(self, buf):
+        # The TestListener knows nothing about digests: read the trail back
+        # and compute them here.
         self.instance.get_shell().check_output('breadcrumb-add %s' % buf)
+        trail = [x.strip('\r') for x in self._get().split('\n') if x]
+        return (len(trail), trail_digest(trail))
 
     def _get(self):
         buf, _ = self.instance.get_shell().check_output('breadcrumb-list',
@@ -16,6 +16,7 @@
 import os
 
 from . logger import log
+from . accounting import instrument_client
 
 class GcApi(object):
     '''Wrap the gridcentric API.
@@ -90,6 +91,9 @@ class GcApi(object):
 
 def create_nova_client(config):
     '''Creates a nova Client from the environment variables.'''
+    if config.fake_cloud:
+        from . fakecloud import get_fake_cloud
+        return get_fake_cloud(config).nova
     from novaclient import shell
     extensions = shell.OpenStackComputeShell()._discover_extensions("1.1")
     if not set(['gridcentric', 'cobalt', 'gridcentric_python_novaclient_ext',
@@ -108,6 +112,9 @@ def create_nova_client(config):
         http_log_debug=config.http_log_debug)
 
 def create_cinder_client(config):
+    if config.fake_cloud:
+        from . fakecloud import get_fake_cloud
+        return get_fake_cloud(config).cinder
     from cinderclient.client import Client
     return Client(1,
         username=config.os_username,
@@ -118,6 +125,9 @@ def create_cinder_client(config):
 
 # Because one day it will not be named neutron either
 def create_network_client(config):
+    if config.fake_cloud:
+        from . fakecloud import get_fake_cloud
+        return get_fake_cloud(config).network
     try:
         from neutronclient.common import clientmanager
         from neutronclient.common.exceptions import EndpointNotFound
@@ -143,7 +153,9 @@ def create_network_client(config):
 
 def create_client(config):
     '''Creates a nova Client with a gcapi client embeded.'''
-    nova = create_nova_client(config)
-    cinder = create_cinder_client(config)
+    nova = instrument_client(create_nova_client(config), 'nova')
+    cinder = instrument_client(create_cinder_client(config), 'cinder')
     network = create_network_client(config)
+    if network is not None:
+        network = instrument_client(network, 'network')
     return (nova, GcApi(nova), cinder, network)
@@ -0,0 +1,91 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from . logger import log
+from . host import Host
+from . util import run_parallel
+
+class ClusterSnapshot(object):
+
+    '''The merged result of querying several hosts at once. Results and
+    errors are keyed by host id; indexing a host that failed re-raises its
+    error.'''
+
+    def __init__(self, timestamp, duration, results, errors):
+        self.timestamp = timestamp
+        self.duration = duration
+        self.results = results
+        self.errors = errors
+
+    def __getitem__(self, hostname):
+        if hostname in self.errors:
+            raise self.errors[hostname]
+        return self.results[hostname]
+
+    def __contains__(self, hostname):
+        return hostname in self.results
+
+    def complete(self):
+        return len(self.errors) == 0
+
+    def __str__(self):
+        return 'ClusterSnapshot(hosts=%s, failed=%s, duration=%.2fs)' % \
+            (sorted(self.results.keys()), sorted(self.errors.keys()),
+             self.duration)
+
+class Cluster(object):
+
+    '''Queries a set of hosts in parallel, so that collecting state from the
+    whole cluster takes as long as the slowest host rather than the sum of
+    all of them. Hosts that fail or exceed the per-host timeout are reported
+    in the snapshot's errors instead of failing the whole collection.'''
+
+    def __init__(self, hosts, timeout=None):
+        self.hosts = list(hosts)
+        self.timeout = timeout
+
+    @staticmethod
+    def from_config(config, hostnames=None):
+        if hostnames is None:
+            hostnames = config.hosts
+        return Cluster([Host(hostname, config) for hostname in hostnames],
+                       config.cluster_timeout)
+
+    def collect(self, fn):
+        '''Calls fn(host) on every host in parallel.'''
+        start = time.time()
+        (results, errors) = run_parallel(fn, self.hosts, self.timeout)
+        snapshot = ClusterSnapshot(
+            start, time.time() - start,
+            dict((host.id, result) for (host, result) in results.items()),
+            dict((host.id, error) for (host, error) in errors.items()))
+        for (hostname, error) in snapshot.errors.items():
+            log.warn('Collecting from host %s failed: %s' % (hostname, error))
+        log.debug('Collected %s' % snapshot)
+        return snapshot
+
+    def vmsfs_stats(self, genid=None):
+        return self.collect(lambda host: host.get_vmsfs_stats(genid))
+
+    def ips(self):
+        return self.collect(lambda host: host.get_ips())
+
+    def iptables(self):
+        return self.collect(lambda host: host.get_iptables_snapshot())
+
+    def vmsfs_generations(self):
+        return self.collect(lambda host: host.get_vmsfs_generations())
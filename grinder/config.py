@@ -31,6 +31,19 @@ DEFAULT_SHARE_RATIO         = 0.8
 DEFAULT_COW_SLACK           = 1500
 DEFAULT_SSH_PORT            = 22
 DEFAULT_WINDOWS_LINK_PORT   = 9845
+DEFAULT_WATCH_INTERVAL      = 0.25
+DEFAULT_SAMPLE_INTERVAL     = 0.5
+DEFAULT_CLUSTER_TIMEOUT     = 60
+DEFAULT_INFO_TTL            = 1.0
+DEFAULT_BALLOON_CHUNKS      = 64
+DEFAULT_VOLUME_TEST_MB      = 16
+DEFAULT_VOLUME_CHUNKS       = 64
+DEFAULT_BENCHMARK_CLONES    = 16
+DEFAULT_PROBE_INTERVAL      = 0.1
+DEFAULT_STORM_CONCURRENCY   = 8
+DEFAULT_STORM_DURATION      = 300
+DEFAULT_HISTORY_BASELINE    = 10
+DEFAULT_READINESS_TIMEOUT   = 30
 
 class Image(object):
     '''Add an image.
@@ -119,6 +132,67 @@ class Config(object):
         # etc. In seconds.
         self.ops_timeout = 600
 
+        # How often, in seconds, the host-side vmsctl watcher samples
+        # parameters while waiting for hoarding or eviction to finish. The
+        # samples are streamed back over a single ssh channel.
+        self.vmsctl_watch_interval = DEFAULT_WATCH_INTERVAL
+
+        # How long, in seconds, a parsed vmsctl info snapshot is reused before
+        # asking the host again. Changing a parameter through Vmsctl always
+        # discards the snapshot.
+        self.vmsctl_info_ttl = DEFAULT_INFO_TTL
+
+        # How often, in seconds, a VmsfsSampler reads the vmsfs stats of the
+        # generations it follows in the background.
+        self.vmsfs_sample_interval = DEFAULT_SAMPLE_INTERVAL
+
+        # The host network interfaces whose traffic the benchmarks account.
+        # By default, every physical interface, so that traffic crossing a
+        # bridge and its port, or a tap, is only counted once.
+        self.host_net_interfaces = []
+
+        # How long, in seconds, to wait for each host when collecting state
+        # from all hosts in parallel. Hosts that do not answer in time are
+        # reported as failed rather than holding up the others.
+        self.cluster_timeout = DEFAULT_CLUSTER_TIMEOUT
+
+        # Where launched clones report readiness, as host:port. The host must
+        # be an address of this machine that guests can reach; the harness
+        # listens for UDP reports on the port. Clones are then known to be up
+        # as soon as their clone.d hooks have run, instead of by probing ping
+        # and ssh. Unset to probe. A clone that has not reported this many
+        # seconds after going ACTIVE is probed instead, as its report may
+        # be filtered or its master may predate the hook.
+        self.readiness_address = None
+        self.readiness_timeout = DEFAULT_READINESS_TIMEOUT
+
+        # A file to append the metrics of the session to, one JSON object per
+        # line. Operation latencies (boot, bless, launch, migrate, delete,
+        # discard) are always recorded, and summarized at the end of the
+        # session whether or not they are written.
+        self.metrics_path = None
+
+        # Wrap the clone.d hooks of blessed Linux masters so that every hook
+        # logs when it starts and ends in the clones. Launch then records
+        # the timeline of each clone's hooks in the test's metrics.
+        self.hook_timing = False
+
+        # Account the wall time of each test into API requests, shell
+        # commands and sleeps, to tell a slow cloud from a slow harness. The
+        # breakdown is logged and added to the metrics as profile.*. With
+        # profile_dir, a cProfile dump and folded stacks for flamegraph tools
+        # are also written there for each test.
+        self.profiling = False
+        self.profile_dir = None
+
+        # A SQLite database to add the operation latencies of the session
+        # to, keyed by run name, history_revision (the revision of the
+        # system under test), image and flavor. The session is then compared
+        # against the history_baseline runs before it, see history.py.
+        self.history_path = None
+        self.history_revision = None
+        self.history_baseline = DEFAULT_HISTORY_BASELINE
+
         # The port to use to initiate ssh connections.
         self.ssh_port = DEFAULT_SSH_PORT
 
@@ -213,9 +287,73 @@ class Config(object):
         # pages and prevent spurious failures.
         self.test_sharing_cow_slack = DEFAULT_COW_SLACK
 
+        # Balloons are filled with a seeded pattern whose digests the
+        # harness computes locally. Integrity checks verify this many 2MiB
+        # chunks sampled across the balloon; 0 verifies every chunk.
+        self.balloon_verify_chunks = DEFAULT_BALLOON_CHUNKS
+
+        # Volume tests write a seeded test file of this many MiB on each
+        # volume, and verify this many of its 2MiB chunks sampled across the
+        # file (0 verifies every chunk).
+        self.volume_test_mb = DEFAULT_VOLUME_TEST_MB
+        self.volume_verify_chunks = DEFAULT_VOLUME_CHUNKS
+
         # Self explanatory
         self.skip_migration_tests = False
 
+        # While an instance migrates, it is probed over TCP from the outside
+        # and a heartbeat runs inside the guest, both every this many
+        # seconds, to measure the downtime seen by the guest's peers and by
+        # the guest itself. The probe connects to the guest's sshd, so much
+        # faster rates risk its MaxStartups limit refusing connections,
+        # which would be taken for downtime.
+        self.migration_probe_interval = DEFAULT_PROBE_INTERVAL
+
+        # If set, the migration tests fail when the downtime seen by the
+        # probe exceeds this many seconds.
+        self.migration_downtime_budget = None
+
+        # Benchmarks measure rather than check, take long and launch many
+        # instances, so they are skipped unless asked for. Their results are
+        # written to benchmark_dir as JSON.
+        self.benchmarks = False
+        self.benchmark_dir = 'benchmarks'
+
+        # The largest number of clones the launch benchmarks go up to.
+        self.benchmark_max_clones = DEFAULT_BENCHMARK_CLONES
+
+        # The launch storm keeps 1, 2, 4, ... up to storm_concurrency
+        # launches in flight against one blessed instance, for
+        # storm_duration seconds at each level, or for storm_launches
+        # launches if that is set.
+        self.storm_concurrency = DEFAULT_STORM_CONCURRENCY
+        self.storm_duration = DEFAULT_STORM_DURATION
+        self.storm_launches = None
+
+        # The hoard benchmark hoards clones of masters of each of
+        # hoard_flavors (the image's flavor if empty) at each of hoard_rates.
+        self.hoard_flavors = []
+        self.hoard_rates = [1000, 10000, 100000]
+
+        # The eviction benchmark pages a hoarded clone out down to each of
+        # these fractions of its memory, and hoards it back in.
+        self.eviction_fractions = [0.75, 0.5, 0.25]
+
+        # Run against an in-process fake of nova, cobalt, cinder and neutron
+        # instead of a real cloud, see fakecloud.py. fake_latencies sets how
+        # long operations take (e.g. launch=0.5,api=0.01) and
+        # fake_error_rates how often they fail (e.g. launch=0.1).
+        self.fake_cloud = False
+        self.fake_latencies = []
+        self.fake_error_rates = []
+
+        # Run host and guest commands against an in-process simulator instead
+        # of over ssh, see simshell.py. This needs fake_cloud, whose servers
+        # the simulated hosts run. sim_model sets the simulator's memory
+        # model and timings (e.g. time_scale=100,fetch_rate=2000,ssh=0.01).
+        self.sim_shell = False
+        self.sim_model = []
+
         # Test output spews endless 'DEBUG' API calls when logging level is set
         # to 'DEBUG'. Control what logging levels we want to see.
         self.log_level = 'INFO'
@@ -293,6 +431,71 @@ class Config(object):
             handle_number_option(self.test_memory_dropall_fraction,
                                  float, "dropall fraction",
                                  DEFAULT_DROPALL_FRACTION, 0.25, 0.99)
+        self.balloon_verify_chunks =\
+            handle_number_option(self.balloon_verify_chunks,
+                                 int, "balloon verify chunks",
+                                 DEFAULT_BALLOON_CHUNKS, 0, 1 << 20)
+        self.volume_test_mb =\
+            handle_number_option(self.volume_test_mb,
+                                 int, "volume test size",
+                                 DEFAULT_VOLUME_TEST_MB, 1, 1024)
+        self.volume_verify_chunks =\
+            handle_number_option(self.volume_verify_chunks,
+                                 int, "volume verify chunks",
+                                 DEFAULT_VOLUME_CHUNKS, 0, 1 << 20)
+        self.benchmark_max_clones =\
+            handle_number_option(self.benchmark_max_clones,
+                                 int, "benchmark max clones",
+                                 DEFAULT_BENCHMARK_CLONES, 1, 1024)
+        self.hoard_rates = [int(rate) for rate in self.hoard_rates]
+        self.eviction_fractions = [float(fraction) for fraction in
+                                   self.eviction_fractions]
+        self.history_baseline =\
+            handle_number_option(self.history_baseline,
+                                 int, "history baseline",
+                                 DEFAULT_HISTORY_BASELINE, 1, 1000)
+        self.storm_concurrency =\
+            handle_number_option(self.storm_concurrency,
+                                 int, "storm concurrency",
+                                 DEFAULT_STORM_CONCURRENCY, 1, 256)
+        self.storm_duration =\
+            handle_number_option(self.storm_duration,
+                                 float, "storm duration",
+                                 DEFAULT_STORM_DURATION, 1, 24 * 3600)
+        if self.storm_launches is not None:
+            self.storm_launches =\
+                handle_number_option(self.storm_launches,
+                                     int, "storm launches",
+                                     None, 1, 1 << 20)
+        self.migration_probe_interval =\
+            handle_number_option(self.migration_probe_interval,
+                                 float, "migration probe interval",
+                                 DEFAULT_PROBE_INTERVAL, 0.001, 1.0)
+        if self.migration_downtime_budget is not None:
+            self.migration_downtime_budget =\
+                handle_number_option(self.migration_downtime_budget,
+                                     float, "migration downtime budget",
+                                     None, 0, 3600)
+        self.vmsctl_watch_interval =\
+            handle_number_option(self.vmsctl_watch_interval,
+                                 float, "vmsctl watch interval",
+                                 DEFAULT_WATCH_INTERVAL, 0.01, 10.0)
+        self.vmsctl_info_ttl =\
+            handle_number_option(self.vmsctl_info_ttl,
+                                 float, "vmsctl info ttl",
+                                 DEFAULT_INFO_TTL, 0, 60.0)
+        self.vmsfs_sample_interval =\
+            handle_number_option(self.vmsfs_sample_interval,
+                                 float, "vmsfs sample interval",
+                                 DEFAULT_SAMPLE_INTERVAL, 0.05, 60.0)
+        self.cluster_timeout =\
+            handle_number_option(self.cluster_timeout,
+                                 float, "cluster timeout",
+                                 DEFAULT_CLUSTER_TIMEOUT, 1, 3600)
+        self.readiness_timeout =\
+            handle_number_option(self.readiness_timeout,
+                                 float, "readiness timeout",
+                                 DEFAULT_READINESS_TIMEOUT, 0.1, 3600)
 
     def get_images(self, distro, arch, platform):
         return filter(lambda i: i.distro == distro and \
@@ -25,6 +25,10 @@ import ConfigParser
 from socket import gethostname
 import exceptions
 import inspect
+import pytest
+
+# The py.test config, for hooks that are not passed it.
+session_config = None
 
 def parse_option(value, argspec):
     '''Parses an option value qemu style: comma-separated, optional keys.
@@ -64,7 +68,22 @@ def parse_option(value, argspec):
 def pytest_runtest_setup(item):
     # Can't import harness earlier because pytest screws up importing logger.
     from . import harness
+    from . accounting import accounting
     harness.test_name = item.reportinfo()[2]
+    accounting.start(harness.test_name)
+
+@pytest.mark.trylast
+def pytest_runtest_logreport(report):
+    # Runs after the junitxml plugin has added the test case, so that the
+    # test's call counts can be attached to it once teardown is done.
+    xml = getattr(session_config, '_xml', None)
+    if xml is None or report.when != 'teardown' or len(xml.tests) == 0:
+        return
+    from _pytest.junitxml import Junit
+    from . accounting import accounting
+    xml.tests[-1].append(Junit.properties(
+        [Junit.property(name=name, value=value)
+         for (name, value) in accounting.current.properties()]))
 
 def pytest_addoption(parser):
     # Add options for each of the default_config fields.
@@ -90,6 +109,8 @@ def parse_image_options(image):
     return Image(*args, **kwargs)
 
 def pytest_configure(config):
+    global session_config
+    session_config = config
     for name, value in vars(default_config).iteritems():
         if name == 'images':
             new_value = getattr(config.option, 'image')
@@ -231,6 +252,54 @@ def pytest_configure(config):
 
     default_config.post_config()
 
+    if default_config.metrics_path:
+        from . metrics import session_metrics
+        session_metrics.open(default_config.metrics_path)
+
+def pytest_terminal_summary(terminalreporter):
+    from . metrics import session_metrics
+    lines = session_metrics.format_summary()
+    if len(lines) > 0:
+        terminalreporter.write_sep('=', 'metrics (seconds)')
+        for line in lines:
+            terminalreporter.write_line(line)
+    if default_config.history_path:
+        from . history import History, format_report
+        history = History(default_config.history_path)
+        try:
+            run_id = history.record(default_config.run_name,
+                                    default_config.history_revision,
+                                    session_metrics.metrics)
+            if run_id is not None:
+                baseline = history.baseline_runs(
+                    run_id, default_config.history_baseline)
+                comparisons = history.compare(run_id,
+                                              default_config.history_baseline)
+        finally:
+            history.close()
+        if run_id is not None and len(baseline) == 0:
+            # Runs are only compared with earlier runs of the same name,
+            # and the default name is new every session.
+            terminalreporter.write_line(
+                'No earlier runs named %s to compare latencies with; give '
+                'runs a fixed name with --run_name or RUN_NAME.' %
+                default_config.run_name)
+        elif run_id is not None:
+            terminalreporter.write_sep('=',
+                'latency against the last %d runs' % len(baseline))
+            for line in format_report(comparisons):
+                terminalreporter.write_line(line)
+    from . accounting import accounting
+    lines = accounting.format_summary()
+    if len(lines) > 0:
+        terminalreporter.write_sep('=', 'api, ssh and poll calls')
+        for line in lines:
+            terminalreporter.write_line(line)
+
+def pytest_unconfigure(config):
+    from . metrics import session_metrics
+    session_metrics.close()
+
 def pytest_generate_tests(metafunc):
     if "image_finder" in metafunc.funcargnames:
         ImageFinder.parametrize(metafunc, 'image_finder',
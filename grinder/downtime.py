@@ -0,0 +1,130 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+import threading
+import time
+
+from . logger import log
+
+def max_outage(samples, end=None):
+    '''Given (timestamp, ok) samples in order, returns the longest time
+    between two successful samples with failures in between (or between
+    the last success and end, if the failures never stopped). Returns None
+    if no sample succeeded, as nothing was measured then.'''
+    outage = 0.0
+    last_ok = None
+    failed = False
+    for (timestamp, ok) in samples:
+        if ok:
+            if failed and last_ok is not None:
+                outage = max(outage, timestamp - last_ok)
+            last_ok = timestamp
+            failed = False
+        else:
+            failed = True
+    if last_ok is None:
+        return None
+    if failed and end is not None:
+        outage = max(outage, end - last_ok)
+    return outage
+
+class TcpProbe(object):
+
+    '''Opens TCP connections to an address as fast as it can, one every
+    interval seconds, in a background thread. A connection attempt times out
+    after ten intervals, which bounds how precisely an outage is timed.'''
+
+    def __init__(self, address, port, interval):
+        self.address = address
+        self.port = port
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+        self.thread = None
+        self.end = None
+
+    def probe(self):
+        try:
+            sock = socket.create_connection((self.address, self.port),
+                                            max(10 * self.interval, 0.05))
+            sock.close()
+            return True
+        except (socket.error, socket.timeout):
+            return False
+
+    def run(self):
+        while not self.stopped.is_set():
+            ok = self.probe()
+            self.samples.append((time.time(), ok))
+            self.stopped.wait(self.interval)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.end = time.time()
+
+    def downtime(self):
+        return max_outage(self.samples, self.end)
+
+class MigrationMonitor(object):
+
+    '''Watches an instance while it migrates: a TcpProbe on its shell port
+    from the outside, and a heartbeat inside the guest where the platform
+    has one. stop() returns the guest-visible downtime measured by both.'''
+
+    def __init__(self, instance):
+        self.instance = instance
+        interval = instance.harness.config.migration_probe_interval
+        self.probe = TcpProbe(instance.get_address(),
+                              instance.get_shell().port, interval)
+        self.heartbeat = None
+
+    def start(self):
+        self.heartbeat = self.instance.start_heartbeat()
+        self.probe.start()
+
+    def stop(self):
+        self.probe.stop()
+        result = {'probe_downtime': self.probe.downtime()}
+        if self.heartbeat is not None:
+            try:
+                beats = self.instance.stop_heartbeat(self.heartbeat)
+                result['heartbeat_gap'] = beats['max_gap']
+            except Exception, e:
+                log.warn('Could not stop the heartbeat on %s: %s' %
+                         (self.instance, e))
+        return result
+
+def check_downtime_budget(config, stats):
+    '''Logs the migration stats returned by Instance.migrate() and, if
+    config.migration_downtime_budget is set, asserts the downtime seen by
+    the probe is within it. A probe that never connected measured nothing,
+    and fails the budget.'''
+    log.info('Migration took %.3fs, downtime %s (probe) %s (heartbeat)' %
+             (stats['total'], stats['probe_downtime'],
+              stats.get('heartbeat_gap')))
+    if stats['probe_downtime'] is None:
+        log.warn('The downtime probe never connected to the instance.')
+    if config.migration_downtime_budget is not None:
+        assert stats['probe_downtime'] is not None
+        assert stats['probe_downtime'] <= config.migration_downtime_budget
@@ -0,0 +1,57 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+import time
+
+from . downtime import TcpProbe, check_downtime_budget, max_outage
+
+def test_max_outage():
+    # Nothing was measured if the probe never got through.
+    assert max_outage([]) is None
+    assert max_outage([(1.0, False), (2.0, False)], end=6.0) is None
+    assert max_outage([(1.0, True), (2.0, True)]) == 0.0
+    samples = [(1.0, True), (1.5, False), (2.0, False), (3.0, True),
+               (3.1, False), (3.5, True)]
+    assert max_outage(samples) == 2.0
+    # Failures that never stopped count until the end.
+    assert max_outage([(1.0, True), (2.0, False)], end=6.0) == 5.0
+    assert max_outage([(1.0, True), (2.0, False)]) == 0.0
+
+def test_probe():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(128)
+    probe = TcpProbe('127.0.0.1', listener.getsockname()[1], 0.01)
+    probe.start()
+    time.sleep(0.1)
+    probe.stop()
+    listener.close()
+    assert len(probe.samples) > 0
+    assert all(ok for (timestamp, ok) in probe.samples)
+    assert probe.downtime() == 0.0
+
+class BudgetConfig(object):
+    migration_downtime_budget = 1.0
+
+def test_downtime_budget():
+    stats = {'total': 2.0, 'probe_downtime': 0.5}
+    check_downtime_budget(BudgetConfig(), stats)
+    stats['probe_downtime'] = None
+    try:
+        check_downtime_budget(BudgetConfig(), stats)
+    except AssertionError:
+        return
+    assert False
@@ -0,0 +1,120 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from . import harness
+from . logger import log
+from . benchmark import Benchmark
+
+# The pages the guest keeps reading while its memory is paged out and in,
+# to see how much it slows down.
+WORKING_SET_PAGES = 4096
+# How long the guest reads them undisturbed, for comparison.
+BASELINE_SECONDS = 10
+
+class TestEvictionBenchmark(harness.TestCase):
+
+    def memwalk(self, clone, fn):
+        '''Runs fn while the guest walks its working set. Returns fn's
+        result and the walk's.'''
+        memwalk = clone.start_memwalk(WORKING_SET_PAGES)
+        walk = None
+        try:
+            result = fn()
+        finally:
+            if memwalk is not None:
+                walk = clone.stop_memwalk(memwalk)
+        return (result, walk)
+
+    def slowdown(self, baseline, walk):
+        if baseline is None or walk is None or walk['rate'] <= 0:
+            return {}
+        return {'guest_slowdown': baseline['rate'] / walk['rate'],
+                'guest_worst_slowdown':
+                    baseline['rate'] / max(walk['min_rate'], 1e-9)}
+
+    @harness.benchmark
+    @harness.hosttest
+    def test_eviction_throughput(self, image_finder):
+        bench = Benchmark(self.harness, 'eviction_throughput')
+        with self.harness.blessed(image_finder) as blessed:
+            clone = blessed.launch()
+            try:
+                vmsctl = clone.vmsctl()
+                vmsctl.clear_flag("zeros.enabled")
+                vmsctl.clear_flag("share.enabled")
+                vmsctl.clear_flag("eviction.sharing")
+                assert vmsctl.full_hoard()
+
+                # Fill the guest with dirty pages, as test_eviction_paging
+                # does, and hoard whatever else it has.
+                clone.drop_caches()
+                flavor_used = self.harness.nova.flavors.find(
+                                        name=clone.image_config.flavor)
+                maxmem_pages = flavor_used.ram * 256
+                balloon_pages = min(256 * 256, int(0.9 * float(maxmem_pages)))
+                fingerprint = clone.allocate_balloon(balloon_pages)
+                assert vmsctl.full_hoard()
+
+                (_, baseline) = self.memwalk(clone,
+                                             lambda: time.sleep(BASELINE_SECONDS))
+                log.info('Guest reads %s pages/s undisturbed' %
+                         (baseline and baseline['rate']))
+
+                for fraction in self.config.eviction_fractions:
+                    resident = vmsctl.get_current_memory()
+                    target = int(fraction * resident)
+
+                    # Page out, sampling the vmsctl counters at the watch
+                    # interval until the target is met.
+                    vmsctl.set_flag("eviction.dropdirty")
+                    vmsctl.clear_flag("eviction.dropclean")
+                    vmsctl.clear_flag("eviction.dropshared")
+                    vmsctl.set_flag("eviction.paging")
+                    vmsctl.set_flag("eviction.enabled")
+                    vmsctl.set_target(target)
+                    (trajectory, walk) = self.memwalk(clone,
+                        lambda: vmsctl.watch(
+                            ["memory.current", "eviction.pagedout"],
+                            lambda values: values["memory.current"] < target))
+                    assert trajectory.met
+                    pagedout = trajectory.values('eviction.pagedout')
+                    values = {'seconds': trajectory.duration(),
+                              'pages': pagedout[-1] - pagedout[0],
+                              'pages_per_s': trajectory.rate('eviction.pagedout'),
+                              'evicted_per_s': -trajectory.rate('memory.current')}
+                    values.update(self.slowdown(baseline, walk))
+                    log.info('Paging out to %.2f: %s' % (fraction, values))
+                    bench.add({'phase': 'pageout', 'fraction': fraction},
+                              values)
+
+                    # Refill.
+                    (met, walk) = self.memwalk(clone, vmsctl.full_hoard)
+                    assert met
+                    trajectory = vmsctl.trajectory
+                    current = trajectory.values('memory.current')
+                    values = {'seconds': trajectory.duration(),
+                              'pages': current[-1] - current[0],
+                              'pages_per_s': trajectory.rate('memory.current')}
+                    values.update(self.slowdown(baseline, walk))
+                    log.info('Refilling from %.2f: %s' % (fraction, values))
+                    bench.add({'phase': 'refill', 'fraction': fraction}, values)
+
+                clone.assert_guest_stable()
+                clone.assert_balloon_integrity(fingerprint)
+            finally:
+                clone.delete()
+        bench.report()
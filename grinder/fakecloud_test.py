@@ -0,0 +1,220 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from novaclient.exceptions import ClientException
+from novaclient.exceptions import NotFound
+
+from . client import GcApi
+from . config import Config, Image
+from . fakecloud import FakeCloud, parse_settings
+from . instance import wait_while_exists, wait_while_status
+from . volumes import VolumeTracker
+
+LATENCIES = dict((name, 0.05) for name in
+                 ('boot', 'bless', 'launch', 'migrate', 'delete', 'discard',
+                  'volume_create', 'volume_attach', 'volume_detach',
+                  'volume_delete'))
+
+def make_cloud(**kwargs):
+    return FakeCloud(['host1', 'host2'], ['precise'], latencies=LATENCIES,
+                     **kwargs)
+
+def settle(server):
+    '''Waits out the fake latencies and refreshes server.'''
+    time.sleep(0.06)
+    server.get()
+
+def boot(cloud, host='host1'):
+    nova = cloud.nova
+    server = nova.servers.create(name='master',
+                                 image=nova.images.find(name='precise').id,
+                                 flavor=nova.flavors.find(name='m1.tiny').id,
+                                 availability_zone='nova:%s' % host)
+    assert server.status == 'BUILD'
+    settle(server)
+    return server
+
+def assert_raises(exception, fn, *args):
+    try:
+        fn(*args)
+    except exception:
+        return
+    assert False
+
+def test_parse_settings():
+    assert parse_settings(['launch=0.5', 'api = 0.01']) == \
+        {'launch': 0.5, 'api': 0.01}
+
+def test_boot_and_delete():
+    cloud = make_cloud()
+    server = cloud.nova.servers.create(name='master',
+        image=cloud.nova.images.find(name='precise').id,
+        flavor=cloud.nova.flavors.find(name='m1.tiny').id,
+        availability_zone='nova:host1')
+    # The harness' own waits work on fake servers.
+    wait_while_status(server, 'BUILD')
+    assert server.status == 'ACTIVE'
+    assert getattr(server, 'OS-EXT-SRV-ATTR:host') == 'host1'
+    assert getattr(server, 'OS-EXT-STS:power_state') == 1
+    assert len(server.networks['private']) == 1
+    assert [s.id for s in cloud.nova.servers.list()] == [server.id]
+    assert_raises(NotFound, lambda: cloud.nova.flavors.find(name='m1.huge'))
+    server.delete()
+    wait_while_exists(server)
+    assert_raises(NotFound, cloud.nova.servers.get, server.id)
+    assert cloud.nova.servers.list() == []
+
+def test_bless_launch_discard():
+    cloud = make_cloud()
+    gcapi = GcApi(cloud.nova)
+    master = boot(cloud)
+    (blessed,) = gcapi.bless_instance(master)
+    assert blessed['metadata']['blessed_from'] == master.id
+    assert blessed['status'] == 'BUILD'
+    assert master.name in blessed['name']
+    blessed = cloud.nova.servers.get(blessed['id'])
+    settle(blessed)
+    assert blessed.status == 'BLESSED'
+    assert [b['id'] for b in gcapi.list_blessed_instances(master)] == \
+        [blessed.id]
+
+    (launched,) = gcapi.launch_instance(blessed, params={
+        'num_instances': 3, 'availability_zone': 'nova:host2',
+        'guest': {'key': 'value'}})
+    clones = cloud.nova.gridcentric.list_launched(blessed)
+    assert len(clones) == 3
+    assert launched['id'] in [clone.id for clone in clones]
+    time.sleep(0.06)
+    for clone in clones:
+        clone.get()
+        assert clone.metadata['launched_from'] == blessed.id
+        assert clone.status == 'ACTIVE'
+        assert getattr(clone, 'OS-EXT-SRV-ATTR:host') == 'host2'
+
+    # Blessed instances with clones can't be discarded.
+    assert_raises(ClientException, gcapi.discard_instance, blessed)
+    for clone in clones:
+        clone.delete()
+    time.sleep(0.06)
+    assert gcapi.list_launched_instances(blessed) == []
+    gcapi.discard_instance(blessed)
+    time.sleep(0.06)
+    assert_raises(NotFound, blessed.get)
+
+def test_rejected_requests():
+    cloud = make_cloud()
+    gcapi = GcApi(cloud.nova)
+    master = boot(cloud)
+    # Only blessed instances can be discarded, and they can't be deleted.
+    assert_raises(ClientException, gcapi.discard_instance, master)
+    (blessed,) = gcapi.bless_instance(master)
+    blessed = cloud.nova.servers.get(blessed['id'])
+    settle(blessed)
+    assert_raises(ClientException, blessed.delete)
+    # Unknown availability zones and hosts, and hints no host passes.
+    for params in [{'availability_zone': 'nonexistent'},
+                   {'availability_zone': 'nonexistent:host1'},
+                   {'availability_zone': 'nova:nonexistent'},
+                   {'scheduler_hints':
+                       {'query': '[">=","$free_ram_mb",1099511627776]'}}]:
+        assert_raises(ClientException,
+                      lambda: gcapi.launch_instance(blessed, params=params))
+    (launched,) = gcapi.launch_instance(blessed, params={
+        'scheduler_hints': {'query': '["<=","$free_ram_mb",65536]'}})
+    clone = cloud.nova.servers.get(launched['id'])
+    settle(clone)
+    assert clone.status == 'ACTIVE'
+    # Oversized guest parameters fail the launch.
+    (launched,) = gcapi.launch_instance(blessed, params={
+        'guest': {'sometext': 'somelargetext' * 1000}})
+    clone = cloud.nova.servers.get(launched['id'])
+    settle(clone)
+    assert clone.status == 'ERROR'
+
+def test_migrate():
+    cloud = make_cloud()
+    server = boot(cloud)
+    GcApi(cloud.nova).migrate_instance(server, 'host2')
+    server.get()
+    assert server.status == 'MIGRATING'
+    assert getattr(server, 'OS-EXT-SRV-ATTR:host') == 'host1'
+    settle(server)
+    assert server.status == 'ACTIVE'
+    assert getattr(server, 'OS-EXT-SRV-ATTR:host') == 'host2'
+
+def test_error_rates():
+    cloud = make_cloud(error_rates={'boot': 1.0})
+    assert boot(cloud).status == 'ERROR'
+
+def test_security_groups():
+    cloud = make_cloud()
+    server = boot(cloud)
+    group = cloud.nova.security_groups.create('sg', 'test')
+    cloud.nova.security_group_rules.create(group.id, ip_protocol='tcp',
+                                           from_port=22, to_port=22,
+                                           cidr='0.0.0.0/0')
+    server.add_security_group('sg')
+    server.remove_security_group('sg')
+    assert_raises(ClientException, server.remove_security_group, 'sg')
+    cloud.nova.security_groups.delete(group)
+    assert cloud.nova.security_groups.list() == []
+
+def test_volumes():
+    cloud = make_cloud()
+    server = boot(cloud)
+    tracker = VolumeTracker(cloud.cinder, interval=0.01)
+    volume = cloud.cinder.volumes.create(1, display_name='vol')
+    assert volume.status == 'creating'
+    tracker.wait_for({volume.id: 'available'})
+    cloud.nova.volumes.create_server_volume(server.id, volume.id, '/dev/vdb')
+    tracker.wait_for({volume.id: 'in-use'})
+    assert_raises(ClientException, volume.delete)
+    volume.detach()
+    tracker.wait_for({volume.id: 'available'})
+    volume.delete()
+    time.sleep(0.1)
+    assert cloud.cinder.volumes.list() == []
+
+def test_create_client():
+    from . accounting import accounting
+    from . client import create_client
+    from . import fakecloud
+    config = Config()
+    config.fake_cloud = True
+    config.fake_latencies = ['boot=0.01']
+    config.images = [Image('precise', 'ubuntu', '64')]
+    # Set the session's fake cloud aside; the simulated hosts and guests
+    # of the session keep pointing at it.
+    saved = dict(fakecloud.clouds)
+    fakecloud.clouds.clear()
+    try:
+        (nova, gcapi, cinder, network) = create_client(config)
+        assert nova is fakecloud.get_fake_cloud(config).nova
+        # Every harness creates its clients; requests are counted once.
+        create_client(config)
+        counts = accounting.start('test_create_client')
+        assert nova.images.find(name='precise').name == 'precise'
+        assert cinder.volumes.list() == []
+        assert counts.items() == [(('api', 'cinder GET /volumes/detail'), 1),
+                                  (('api', 'nova GET /images/detail'), 1)]
+        assert sorted(set(h.host_name for h in nova.hosts.list_all())) == \
+            fakecloud.FAKE_HOSTS
+        assert network.list_networks()['networks'][0]['name'] == 'private'
+        assert nova.gridcentric.satisfies(['launch-name', 'num-instances'])
+    finally:
+        fakecloud.clouds.clear()
+        fakecloud.clouds.update(saved)
@@ -0,0 +1,322 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+'''Guest-side helper for Linux instances.
+
+LinuxInstance uploads this script (together with the balloon module) into
+the guest once, and then runs each composite test operation as a single
+command. The request is a JSON object {"op": ..., "args": {...}} on stdin,
+and the response is a JSON object on stdout, either {"result": ...} or
+{"error": "..."}. Output of the tools the helper runs goes to stderr.
+
+This runs inside the guest as root, so it must only depend on the standard
+library and must work on both python 2 and 3.
+'''
+
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import traceback
+
+import balloon
+
+def run(*command):
+    subprocess.check_call(list(command), stdout=sys.stderr)
+
+def read_file(path):
+    f = open(path, 'rb')
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+def list_devices():
+    lines = read_file('/proc/partitions').decode('ascii').split('\n')[2:]
+    return ['/dev/%s' % line.split()[-1] for line in lines if line.strip()]
+
+def drop_caches():
+    f = open('/proc/sys/vm/drop_caches', 'w')
+    try:
+        f.write('3\n')
+    finally:
+        f.close()
+
+def mountpoint(device):
+    # Each device gets its own mountpoint, so that several devices can be
+    # primed or verified at the same time.
+    path = '/mnt/grinder-%s' % os.path.basename(device)
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    return path
+
+def prime_volume(device, seed, pages):
+    # Format, mount and umount the device. The test file holds a seeded
+    # balloon, so the harness knows the digest of each of its chunks.
+    path = mountpoint(device)
+    run('mkfs.ext3', '-q', device)
+    run('mount', device, path)
+    try:
+        balloon.fill(os.path.join(path, 'test.file'), seed, pages)
+    finally:
+        # *Really* ensure it's no longer in the page cache
+        run('umount', path)
+    drop_caches()
+    run('blockdev', '--flushbufs', device)
+
+def verify_volume(device, indexes):
+    path = mountpoint(device)
+    run('mount', device, path)
+    try:
+        test_file = os.path.join(path, 'test.file')
+        digests = balloon.digests(test_file, indexes)
+        run('shred', '-f', '-u', '-n', '1', '-z', test_file)
+    finally:
+        run('umount', path)
+    return digests
+
+def balloon_fill(path, seed, pages):
+    balloon.fill(path, seed, pages)
+
+def balloon_digest(path, indexes):
+    return balloon.digests(path, indexes)
+
+def chain_digest(digest, breadcrumb):
+    # Must match breadcrumbs.chain_digest in the harness.
+    return hashlib.md5((digest + breadcrumb).encode('utf-8')).hexdigest()
+
+def breadcrumb_add(path, text):
+    # The trail's line count and rolling digest are kept next to it, so an
+    # append never needs to reread the trail.
+    state_path = path + '.state'
+    if os.path.exists(state_path):
+        (count, digest) = json.loads(read_file(state_path).decode('utf-8'))
+    else:
+        (count, digest) = (0, '')
+        for breadcrumb in breadcrumb_list(path) or []:
+            (count, digest) = (count + 1, chain_digest(digest, breadcrumb))
+    f = open(path, 'a')
+    try:
+        f.write(text + '\n')
+    finally:
+        f.close()
+    (count, digest) = (count + 1, chain_digest(digest, text))
+    f = open(state_path, 'w')
+    try:
+        f.write(json.dumps([count, digest]))
+    finally:
+        f.close()
+    return (count, digest)
+
+def breadcrumb_list(path):
+    if not os.path.exists(path):
+        return None
+    return read_file(path).decode('utf-8').strip().split('\n')
+
+HOOK_TIMING_MARKER = '# grinder-hook-timing'
+
+HOOK_WRAPPER = '''#!/bin/sh
+%(marker)s
+read up rest < /proc/uptime
+echo "start %(name)s $up" >> %(log)s
+%(timed)s/%(name)s "$@"
+rc=$?
+read up rest < /proc/uptime
+echo "end %(name)s $up $rc" >> %(log)s
+exit $rc
+'''
+
+# Runs first and starts a fresh timeline for the clone.
+HOOK_RESUME = '''#!/bin/sh
+%(marker)s
+read up rest < /proc/uptime
+echo "resume $up" > %(log)s
+'''
+
+def write_script(path, script):
+    f = open(path, 'w')
+    try:
+        f.write(script)
+    finally:
+        f.close()
+    os.chmod(path, int('755', 8))
+
+def wrap_hooks(hooks, timed, log):
+    '''Moves every clone hook in hooks into timed and puts a wrapper that
+    logs its start and end in its place. Hooks that are already wrapped are
+    left alone, so this can be repeated after hooks are (re)installed.'''
+    if not os.path.isdir(timed):
+        os.makedirs(timed)
+    if not os.path.isdir(os.path.dirname(log)):
+        os.makedirs(os.path.dirname(log))
+    wrapped = []
+    for name in sorted(os.listdir(hooks)):
+        path = os.path.join(hooks, name)
+        if not os.path.isfile(path) or not os.access(path, os.X_OK):
+            continue
+        if HOOK_TIMING_MARKER in read_file(path).decode('utf-8', 'replace'):
+            continue
+        os.rename(path, os.path.join(timed, name))
+        write_script(path, HOOK_WRAPPER % {'marker': HOOK_TIMING_MARKER,
+                                           'name': name, 'timed': timed,
+                                           'log': log})
+        wrapped.append(name)
+    write_script(os.path.join(hooks, '00_grinder_resume'),
+                 HOOK_RESUME % {'marker': HOOK_TIMING_MARKER, 'log': log})
+    return wrapped
+
+def hook_timeline(log):
+    '''Returns the hooks that ran, in order, with start and end times in
+    seconds since the first hook started. end and rc are None for hooks
+    that have not finished.'''
+    if not os.path.exists(log):
+        return []
+    base = None
+    hooks = []
+    running = {}
+    for line in read_file(log).decode('utf-8').split('\n'):
+        fields = line.split()
+        if len(fields) == 2 and fields[0] == 'resume':
+            base = float(fields[1])
+        elif len(fields) == 3 and fields[0] == 'start' and base is not None:
+            hook = {'hook': fields[1],
+                    'start': round(float(fields[2]) - base, 2),
+                    'end': None, 'rc': None}
+            running[fields[1]] = hook
+            hooks.append(hook)
+        elif len(fields) == 4 and fields[0] == 'end' and fields[1] in running:
+            hook = running.pop(fields[1])
+            hook['end'] = round(float(fields[2]) - base, 2)
+            hook['rc'] = int(fields[3])
+    return hooks
+
+def uptime():
+    return float(read_file('/proc/uptime').split()[0])
+
+def heartbeat_start(path, interval):
+    '''Forks a process that appends the uptime to path every interval
+    seconds, until heartbeat_stop.'''
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.setsid()
+            devnull = os.open(os.devnull, os.O_RDWR)
+            for fd in (0, 1, 2):
+                os.dup2(devnull, fd)
+            f = open(path, 'w')
+            while True:
+                f.write('%.2f\n' % uptime())
+                f.flush()
+                time.sleep(interval)
+        finally:
+            os._exit(0)
+    return pid
+
+def heartbeat_stop(path, pid):
+    '''Stops the heartbeat and returns the number of beats and the longest
+    gap between two of them, in seconds.'''
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except OSError:
+        pass
+    beats = [float(line) for line in
+             read_file(path).decode('ascii').split('\n') if line.strip()]
+    os.remove(path)
+    gaps = [b - a for (a, b) in zip(beats, beats[1:])]
+    return {'beats': len(beats), 'max_gap': round(max(gaps or [0.0]), 2)}
+
+def memwalk_start(path, log, pages, interval):
+    '''Forks a process that reads the first pages of the file at path over
+    and over, appending the uptime and the pages read so far to log every
+    interval seconds, until memwalk_stop.'''
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.setsid()
+            devnull = os.open(os.devnull, os.O_RDWR)
+            for fd in (0, 1, 2):
+                os.dup2(devnull, fd)
+            out = open(log, 'w')
+            f = open(path, 'rb')
+            read = 0
+            mark = uptime()
+            while True:
+                f.seek(0)
+                for i in range(0, pages, 256):
+                    read += len(f.read(min(256, pages - i) * 4096)) // 4096
+                    now = uptime()
+                    if now - mark >= interval:
+                        out.write('%.2f %d\n' % (now, read))
+                        out.flush()
+                        mark = now
+        finally:
+            os._exit(0)
+    return pid
+
+def memwalk_stop(log, pid):
+    '''Stops the walk and returns the pages read per second over all of it
+    and the slowest interval.'''
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except OSError:
+        pass
+    samples = [tuple(float(x) for x in line.split()) for line in
+               read_file(log).decode('ascii').split('\n') if line.strip()]
+    os.remove(log)
+    rates = [(b[1] - a[1]) / (b[0] - a[0])
+             for (a, b) in zip(samples, samples[1:]) if b[0] > a[0]]
+    if len(rates) == 0:
+        return {'rate': 0.0, 'min_rate': 0.0, 'samples': len(samples)}
+    return {'rate': (samples[-1][1] - samples[0][1]) /
+                    (samples[-1][0] - samples[0][0]),
+            'min_rate': min(rates),
+            'samples': len(samples)}
+
+def read_params():
+    return json.loads(read_file('/tmp/clone.log').decode('utf-8'))
+
+OPS = {
+    'list-devices': list_devices,
+    'drop-caches': drop_caches,
+    'prime-volume': prime_volume,
+    'verify-volume': verify_volume,
+    'balloon-fill': balloon_fill,
+    'balloon-digest': balloon_digest,
+    'breadcrumb-add': breadcrumb_add,
+    'breadcrumb-list': breadcrumb_list,
+    'read-params': read_params,
+    'wrap-hooks': wrap_hooks,
+    'hook-timeline': hook_timeline,
+    'heartbeat-start': heartbeat_start,
+    'heartbeat-stop': heartbeat_stop,
+    'memwalk-start': memwalk_start,
+    'memwalk-stop': memwalk_stop,
+}
+
+def main():
+    try:
+        request = json.loads(sys.stdin.read())
+        args = dict((str(key), value)
+                    for (key, value) in request.get('args', {}).items())
+        response = {'result': OPS[request['op']](**args)}
+    except Exception:
+        response = {'error': traceback.format_exc()}
+    sys.stdout.write(json.dumps(response))
+
+if __name__ == '__main__':
+    main()
@@ -14,6 +14,7 @@
 #    under the License.
 
 import uuid
+import time
 import pytest
 import random
 
@@ -27,6 +28,10 @@ from . instance import InstanceFactory
 from . instance import wait_while_status
 from . host import Host
 from . network import network_name_to_uuid
+from . volumes import VolumeTracker
+from . metrics import MetricsRecorder
+from . metrics import session_metrics
+from . import profiling
 
 # This is set by pytest_runtest_setup in conftest.py.
 # This is done prior to each test.
@@ -162,6 +167,10 @@ def hosttest(fn):
     mark_test(fn, hosttest=True)
     return fn
 
+def benchmark(fn):
+    mark_test(fn, benchmark=True)
+    return fn
+
 def requires(*requirements):
     def decorator(fn):
         mark_test(fn, requirements=requirements)
@@ -251,22 +260,66 @@ class Volume:
                     (self.name, long(self.size), str(self.kwargs)))
         self.volume = self.harness.cinder.volumes.create(
             self.size, display_name=self.name, **self.kwargs)
-        wait_for('volume %s to be available' % (self.volume.id), \
-            lambda: self.harness.cinder.volumes.get(self.volume.id).status.lower() == 'available')
+        self.harness.volume_tracker.wait_for({self.volume.id: 'available'})
         return self.volume
 
     def __exit__(self, type, value, tb):
         if type == None or not(self.harness.config.leave_on_failure):
             self.volume.delete()
 
+class Volumes:
+    '''Creates several volumes at once and waits for all of them together.'''
+    def __init__(self, harness, count, size=None, **kwargs):
+        self.harness = harness
+        self.volumes = [Volume(harness, size=size, **kwargs)
+                        for i in range(count)]
+
+    def __enter__(self):
+        created = []
+        try:
+            for volume in self.volumes:
+                log.debug("Creating volume %s size %ld kwargs %s" %\
+                            (volume.name, long(volume.size), str(volume.kwargs)))
+                volume.volume = self.harness.cinder.volumes.create(
+                    volume.size, display_name=volume.name, **volume.kwargs)
+                created.append(volume.volume)
+            self.harness.volume_tracker.wait_for(
+                dict((volume.id, 'available') for volume in created))
+        except:
+            if not(self.harness.config.leave_on_failure):
+                for volume in created:
+                    volume.delete()
+            raise
+        return created
+
+    def __exit__(self, type, value, tb):
+        for volume in self.volumes:
+            volume.__exit__(type, value, tb)
+
 class TestHarness(Notifier):
     '''There's one instance of TestHarness per test function that runs.'''
     def __init__(self, config, test_name):
         Notifier.__init__(self)
         self.config = config
         self.test_name = test_name
+        # Measurements taken during the test, see add_metric.
+        self.metrics = []
         (self.nova, self.gcapi, self.cinder, self.network) =\
                 create_client(self.config)
+        self.volume_tracker = VolumeTracker(self.cinder)
+        self.recorder = MetricsRecorder(self)
+
+    def add_metric(self, name, value, **tags):
+        '''Records a measurement taken during the test. tags say what was
+        measured, e.g. the instance or hook. The metric is also added to
+        the session's metrics.'''
+        metric = {'name': name, 'value': value, 'time': time.time(),
+                  'test': self.test_name, 'run': self.config.run_name,
+                  'tags': tags}
+        log.debug('Metric %s=%s %s' % (name, value, tags))
+        self.metrics.append(metric)
+        session_metrics.add(metric)
+        return metric
 
     @Notifier.notify
     def setup(self):
@@ -292,18 +345,20 @@ class TestHarness(Notifier):
             if self.config.flavor_name == None:
                 log.error('tempest [compute] flavor_ref must be defined')
                 assert False
-        if self.config.os_username == None:
-            log.error('os_username must be defined')
-            assert False
-        if self.config.os_password == None:
-            log.error('os_password must be defined')
-            assert False
-        if self.config.os_tenant_name == None:
-            log.error('os_tenant_name must be defined')
-            assert False
-        if self.config.os_auth_url == None:
-            log.error('os_auth_url must be defined')
-            assert False
+        # The fake cloud needs no credentials.
+        if not(self.config.fake_cloud):
+            if self.config.os_username == None:
+                log.error('os_username must be defined')
+                assert False
+            if self.config.os_password == None:
+                log.error('os_password must be defined')
+                assert False
+            if self.config.os_tenant_name == None:
+                log.error('os_tenant_name must be defined')
+                assert False
+            if self.config.os_auth_url == None:
+                log.error('os_auth_url must be defined')
+                assert False
 
     @Notifier.notify
     def teardown(self):
@@ -342,6 +397,9 @@ class TestHarness(Notifier):
     def volume(self, size=None, **kwargs):
         return Volume(self, size=size, **kwargs)
 
+    def volumes(self, count, size=None, **kwargs):
+        return Volumes(self, count, size=size, **kwargs)
+
     def fake_id(self):
         # Generate a fake id (ensure it's fake).
         fake_id = str(uuid.uuid4())
@@ -360,15 +418,29 @@ class TestCase(object):
 
     def setup_method(self, method):
         self.config = default_config
+        if self.config.profiling:
+            profiling.start(test_name, self.config.profile_dir)
         self.harness = TestHarness(self.config, test_name)
         self.harness.setup()
         requirements = get_test_marker(method, 'requirements', ())
         if not self.harness.satisfies(requirements):
             pytest.skip('Requirements not met for {}'.format(method.__name__))
         if get_test_marker(method, 'hosttest', False):
-            if not(default_config.host_user):
+            # Simulated hosts need no login.
+            if not(default_config.host_user or default_config.sim_shell):
                 pytest.skip('Need host user to run %s.' % method.__name__)
+        if get_test_marker(method, 'benchmark', False):
+            if not(default_config.benchmarks):
+                pytest.skip('Benchmarks not enabled, skipping %s.' % method.__name__)
 
     def teardown_method(self, method):
         if self.harness:
             self.harness.teardown()
+        profile = profiling.stop()
+        if profile is not None:
+            for line in profile.format_summary():
+                log.info(line)
+            if self.harness:
+                for (category, seconds) in profile.totals().items():
+                    self.harness.add_metric('profile.%s' % category, seconds)
+                self.harness.add_metric('profile.cpu', profile.cpu)
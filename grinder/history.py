@@ -0,0 +1,248 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+'''
+Keeps the operation latencies of every run in a SQLite database, and
+compares a run against the runs of the same name before it:
+
+    python -m grinder.history [--baseline N] history.db [run name]
+
+Exits with 1 if any operation got significantly slower.
+'''
+
+import argparse
+import math
+import sqlite3
+import sys
+import time
+
+from . util import percentile
+
+# The latency.* metrics that are kept, see MetricsRecorder.
+OPERATIONS = ['boot', 'bless', 'launch', 'migrate', 'hoard', 'delete',
+              'discard']
+
+DEFAULT_BASELINE = 10
+DEFAULT_ALPHA = 0.01
+DEFAULT_THRESHOLD = 0.1
+# Fewer samples than this on either side can't show anything.
+MIN_SAMPLES = 3
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY,
+        run TEXT NOT NULL,
+        revision TEXT,
+        started REAL NOT NULL)''',
+    '''CREATE TABLE IF NOT EXISTS timings (
+        run_id INTEGER NOT NULL REFERENCES runs (id),
+        test TEXT,
+        operation TEXT NOT NULL,
+        image TEXT,
+        flavor TEXT,
+        seconds REAL NOT NULL)''',
+    '''CREATE INDEX IF NOT EXISTS timings_run ON timings (run_id)''',
+]
+
+def mann_whitney(current, baseline):
+    '''Returns the one-sided p-value of the Mann-Whitney U test for current
+    being larger than baseline, using the normal approximation with tie
+    correction.'''
+    n1 = len(current)
+    n2 = len(baseline)
+    ranked = sorted([(value, 0) for value in current] +
+                    [(value, 1) for value in baseline])
+    ranks = [0.0] * len(ranked)
+    ties = 0.0
+    i = 0
+    while i < len(ranked):
+        j = i
+        while j + 1 < len(ranked) and ranked[j + 1][0] == ranked[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2.0 + 1
+        t = j - i + 1
+        ties += t ** 3 - t
+        i = j + 1
+    rank_sum = sum(rank for (rank, (value, side)) in zip(ranks, ranked)
+                   if side == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2.0
+    n = n1 + n2
+    variance = n1 * n2 / 12.0 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2.0 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+class Comparison(object):
+
+    '''The latencies of one operation, image and flavor in a run against
+    the baseline. The run regressed if it is slower with a p-value below
+    alpha and its median is over threshold slower.'''
+
+    def __init__(self, key, current, baseline, alpha, threshold):
+        (self.operation, self.image, self.flavor) = key
+        self.current = current
+        self.baseline = baseline
+        self.p = None
+        self.change = None
+        if len(current) >= MIN_SAMPLES and len(baseline) >= MIN_SAMPLES:
+            self.p = mann_whitney(current, baseline)
+            base = percentile(baseline, 50)
+            if base > 0:
+                self.change = percentile(current, 50) / base - 1
+        self.regressed = self.p is not None and self.change is not None and \
+            self.p < alpha and self.change > threshold
+
+    def __str__(self):
+        def median(values):
+            if len(values) == 0:
+                return '%9s' % '-'
+            return '%9.3f' % percentile(values, 50)
+        if self.p is None:
+            stats = '%8s %8s' % ('-', '-')
+        else:
+            stats = '%+7.1f%% %8.4f' % (100.0 * (self.change or 0), self.p)
+        return '%-8s %-20s %-12s %4d %s %4d %s %s%s' % \
+            (self.operation, (self.image or '')[:20], (self.flavor or '')[:12],
+             len(self.baseline), median(self.baseline),
+             len(self.current), median(self.current), stats,
+             '  REGRESSION' if self.regressed else '')
+
+class History(object):
+
+    '''The operation latencies of past runs. A run is recorded with the
+    revision of the system under test and its latency metrics, keyed by
+    operation, image and flavor.'''
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        for statement in SCHEMA:
+            self.db.execute(statement)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def record(self, run, revision, metrics, started=None):
+        '''Records the latency metrics of a run. Returns the run's id, or
+        None when the run has no latencies and nothing was recorded.'''
+        timings = []
+        for metric in metrics:
+            (prefix, dot, operation) = metric['name'].partition('.')
+            if prefix != 'latency' or operation not in OPERATIONS:
+                continue
+            tags = metric.get('tags', {})
+            timings.append((metric.get('test'), operation,
+                            tags.get('image'), tags.get('flavor'),
+                            metric['value']))
+        if len(timings) == 0:
+            return None
+        if started is None:
+            started = min([metric['time'] for metric in metrics] +
+                          [time.time()])
+        cursor = self.db.execute(
+            'INSERT INTO runs (run, revision, started) VALUES (?, ?, ?)',
+            (run, revision, started))
+        run_id = cursor.lastrowid
+        self.db.executemany('INSERT INTO timings VALUES (?, ?, ?, ?, ?, ?)',
+                            [(run_id,) + timing for timing in timings])
+        self.db.commit()
+        return run_id
+
+    def find_run(self, run=None):
+        '''Returns the id of the last run with the given name, or the last
+        run of all, or None.'''
+        if run is None:
+            row = self.db.execute('SELECT MAX(id) FROM runs').fetchone()
+        else:
+            row = self.db.execute('SELECT MAX(id) FROM runs WHERE run = ?',
+                                  (run,)).fetchone()
+        return row[0]
+
+    def samples(self, run_ids):
+        '''Returns {(operation, image, flavor): [seconds]} over the runs.'''
+        samples = {}
+        if len(run_ids) == 0:
+            return samples
+        query = 'SELECT operation, image, flavor, seconds FROM timings ' \
+                'WHERE run_id IN (%s)' % ','.join('?' * len(run_ids))
+        for (operation, image, flavor, seconds) in \
+                self.db.execute(query, run_ids):
+            samples.setdefault((operation, image, flavor), []).append(seconds)
+        return samples
+
+    def baseline_runs(self, run_id, count=DEFAULT_BASELINE):
+        '''Returns the ids of the count runs before run_id that share its
+        name.'''
+        rows = self.db.execute('SELECT id FROM runs WHERE id < ? AND run IS '
+                               '(SELECT run FROM runs WHERE id = ?) '
+                               'ORDER BY id DESC LIMIT ?',
+                               (run_id, run_id, count))
+        return [row[0] for row in rows]
+
+    def compare(self, run_id, count=DEFAULT_BASELINE, alpha=DEFAULT_ALPHA,
+                threshold=DEFAULT_THRESHOLD):
+        '''Compares a run against the count runs of the same name before
+        it. Returns a list of Comparison, ordered by operation, image and
+        flavor.'''
+        current = self.samples([run_id])
+        baseline = self.samples(self.baseline_runs(run_id, count))
+        def order(key):
+            return (OPERATIONS.index(key[0]), key[1:])
+        return [Comparison(key, current[key], baseline.get(key, []),
+                           alpha, threshold)
+                for key in sorted(current.keys(), key=order)]
+
+def format_report(comparisons):
+    lines = ['%-8s %-20s %-12s %4s %9s %4s %9s %8s %8s' %
+             ('op', 'image', 'flavor', 'n', 'baseline', 'n', 'current',
+              'change', 'p')]
+    lines.extend(str(comparison) for comparison in comparisons)
+    return lines
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Compares the operation latencies of a run against '
+                    'the runs before it.')
+    parser.add_argument('database')
+    parser.add_argument('run', nargs='?',
+                        help='the run name (the last run by default)')
+    parser.add_argument('--baseline', type=int, default=DEFAULT_BASELINE,
+                        help='how many earlier runs to compare against')
+    parser.add_argument('--alpha', type=float, default=DEFAULT_ALPHA,
+                        help='the p-value below which a change counts')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='the relative slowdown of the median that counts')
+    args = parser.parse_args(argv)
+
+    history = History(args.database)
+    try:
+        run_id = history.find_run(args.run)
+        if run_id is None:
+            sys.stderr.write('No such run in %s\n' % args.database)
+            return 2
+        comparisons = history.compare(run_id, args.baseline, args.alpha,
+                                      args.threshold)
+    finally:
+        history.close()
+    for line in format_report(comparisons):
+        print line
+    if any(comparison.regressed for comparison in comparisons):
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,89 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import random
+import shutil
+import tempfile
+
+from . history import History, format_report, main, mann_whitney
+
+def latencies(operation, values, image='precise', flavor='m1.tiny'):
+    return [{'name': 'latency.%s' % operation, 'value': value,
+             'time': 1000.0 + i, 'test': 'test_x',
+             'tags': {'image': image, 'flavor': flavor}}
+            for (i, value) in enumerate(values)]
+
+def test_mann_whitney():
+    rng = random.Random(1)
+    same = [rng.gauss(10, 1) for i in range(20)]
+    other = [rng.gauss(10, 1) for i in range(20)]
+    slower = [rng.gauss(12, 1) for i in range(20)]
+    assert mann_whitney(other, same) > 0.05
+    assert mann_whitney(slower, same) < 0.001
+    # Faster is not a regression.
+    assert mann_whitney(same, slower) > 0.99
+    assert mann_whitney([1, 1, 1], [1, 1, 1]) == 1.0
+
+def test_history():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'history.db')
+        rng = random.Random(2)
+        history = History(path)
+        for run in range(5):
+            history.record('nightly', 'abc123',
+                latencies('launch', [rng.gauss(5, 0.2) for i in range(10)]) +
+                latencies('boot', [rng.gauss(30, 1) for i in range(5)]) +
+                [{'name': 'clone_hook', 'value': 1.0, 'time': 0, 'tags': {}}])
+        # Runs of another name are not part of the baseline.
+        history.record('other', 'abc123',
+            latencies('launch', [rng.gauss(9, 0.2) for i in range(10)]))
+        last = history.record('nightly', 'def456',
+            latencies('launch', [rng.gauss(7, 0.2) for i in range(10)]) +
+            latencies('boot', [rng.gauss(30, 1) for i in range(5)]) +
+            latencies('migrate', [3.0]))
+        # Nothing is recorded for a run without latencies.
+        assert history.record('nightly', 'def456',
+            [{'name': 'clone_hook', 'value': 1.0, 'time': 0, 'tags': {}}]) \
+            is None
+        history.close()
+
+        history = History(path)
+        assert history.find_run() == last
+        assert history.find_run('nightly') == last
+        assert history.find_run('missing') is None
+        assert len(history.baseline_runs(last, 3)) == 3
+        assert len(history.baseline_runs(last, 10)) == 5
+        comparisons = history.compare(last, 3)
+        assert [c.operation for c in comparisons] == \
+            ['boot', 'launch', 'migrate']
+        (boot, launch, migrate) = comparisons
+        assert not boot.regressed
+        assert launch.regressed
+        assert launch.change > 0.3
+        assert migrate.p is None and not migrate.regressed
+        assert len(launch.baseline) == 30
+        assert len(format_report(comparisons)) == 4
+        # The run before the slow one was fine.
+        assert not any(c.regressed
+                       for c in history.compare(last - 2))
+        history.close()
+
+        assert main([path]) == 1
+        assert main([path, 'other']) == 0
+        assert main([path, 'missing']) == 2
+    finally:
+        shutil.rmtree(directory)
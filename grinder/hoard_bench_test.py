@@ -0,0 +1,79 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from . import harness
+from . logger import log
+from . benchmark import Benchmark
+
+# How many clones are hoarded at each rate.
+REPEATS = 3
+
+def resource_cost(before, after):
+    '''Returns the cpu seconds, cpu utilization and megabytes moved on a
+    host between two of its resource counters.'''
+    busy = after['cpu_busy'] - before['cpu_busy']
+    total = after['cpu_total'] - before['cpu_total']
+    # /proc/stat counts in USER_HZ, which is 100 on all Linux platforms.
+    return {'host_cpu_s': busy / 100.0,
+            'host_cpu_util': float(busy) / max(total, 1),
+            'host_rx_mb': (after['net_rx'] - before['net_rx']) / float(1 << 20),
+            'host_tx_mb': (after['net_tx'] - before['net_tx']) / float(1 << 20)}
+
+class TestHoardBenchmark(harness.TestCase):
+
+    def hoard(self, blessed, rate):
+        clone = blessed.launch(paused_on_launch=True)
+        try:
+            host = clone.get_host()
+            vmsctl = clone.vmsctl()
+            before = host.get_resource_counters()
+            start = time.time()
+            assert vmsctl.full_hoard(rate=rate)
+            duration = time.time() - start
+            after = host.get_resource_counters()
+            trajectory = vmsctl.trajectory
+            current = trajectory.values('memory.current')
+            values = {'seconds': duration,
+                      'pages': current[-1] - current[0],
+                      'pages_per_s': trajectory.rate('memory.current')}
+            values.update(resource_cost(before, after))
+            return values
+        finally:
+            clone.delete()
+
+    @harness.benchmark
+    @harness.hosttest
+    def test_hoard_throughput(self, image_finder):
+        bench = Benchmark(self.harness, 'hoard_throughput')
+        for flavor in self.config.hoard_flavors or [None]:
+            with self.harness.booted(image_finder, flavor=flavor) as master:
+                flavor = master.image_config.flavor
+                # Give the clones memory worth hoarding.
+                ram = self.harness.nova.flavors.find(name=flavor).ram
+                master.allocate_balloon(int(0.8 * ram * 256))
+                blessed = master.bless()
+                try:
+                    for rate in self.config.hoard_rates:
+                        for i in range(REPEATS):
+                            values = self.hoard(blessed, rate)
+                            log.info('Hoard of a %s clone at rate %d: %s' %
+                                     (flavor, rate, values))
+                            bench.add({'flavor': flavor, 'ram_mb': ram,
+                                       'rate': rate}, values)
+                finally:
+                    blessed.discard()
+        bench.report()
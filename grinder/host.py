@@ -14,9 +14,153 @@
 #    under the License.
 
 import re
+import threading
 
 from . logger import log
-from . shell import RootShell
+from . shell import root_shell
+
+class VmsIndex(object):
+
+    '''Maps the instance names on one host to the pids of their qemu (vms)
+    processes. The index is filled by a single scan of the process table, is
+    refreshed on a miss, and is shared by all Host objects for a host (see
+    get_vms_index). Callers invalidate it after migrating or deleting.'''
+
+    def __init__(self, hostname):
+        self.hostname = hostname
+        self.pids = None
+        self.lock = threading.Lock()
+
+    def refresh(self, host):
+        (stdout, stderr) = host.check_output('ps -eo pid=,args=')
+        pids = {}
+        for line in stdout.split('\n'):
+            tokens = line.split()
+            if len(tokens) < 2 or 'qemu-system' not in tokens[1]:
+                continue
+            try:
+                # Newer libvirts pass -name guest=<name>,debug-threads=on.
+                name = tokens[tokens.index('-name') + 1].split(',')[0]
+            except (ValueError, IndexError):
+                continue
+            if name.startswith('guest='):
+                name = name[len('guest='):]
+            pids[name] = int(tokens[0])
+        log.debug('vms pids on host %s: %s' % (self.hostname, str(pids)))
+        self.pids = pids
+
+    def find(self, osid):
+        if self.pids is None:
+            return None
+        for (name, pid) in self.pids.items():
+            if name.endswith(osid):
+                return pid
+        return None
+
+    def lookup(self, host, osid):
+        with self.lock:
+            pid = self.find(osid)
+            if pid is None:
+                self.refresh(host)
+                pid = self.find(osid)
+            if pid is None:
+                raise KeyError('No vms process for %s on host %s' %
+                               (osid, self.hostname))
+            return pid
+
+    def invalidate(self):
+        with self.lock:
+            self.pids = None
+
+def parse_resource_counters(stdout, interfaces=None):
+    '''Parses the cpu line of /proc/stat followed by /proc/net/dev and the
+    /sys/class/net/<interface>/device paths of the physical interfaces into
+    the busy and total cpu jiffies and the bytes received and sent on the
+    given interfaces, or on the physical ones.'''
+    lines = stdout.split('\n')
+    # guest and guest_nice, after the first 8 fields, are already counted
+    # in user and nice.
+    jiffies = [long(x) for x in lines[0].split()[1:9]]
+    # idle and iowait are the fourth and fifth fields.
+    if interfaces is None:
+        interfaces = [line.split('/')[4] for line in lines
+                      if line.startswith('/sys/class/net/')]
+    counters = {'cpu_total': sum(jiffies),
+                'cpu_busy': sum(jiffies) - sum(jiffies[3:5]),
+                'net_rx': 0,
+                'net_tx': 0}
+    for line in lines[1:]:
+        if ':' not in line:
+            continue
+        (name, fields) = line.split(':', 1)
+        fields = fields.split()
+        if name.strip() not in interfaces or len(fields) < 9:
+            continue
+        counters['net_rx'] += long(fields[0])
+        counters['net_tx'] += long(fields[8])
+    return counters
+
+def parse_vmsfs_stats(stdout):
+    lines = [x.strip() for x in stdout.split('\n')]
+    statsdict = {}
+    for line in lines:
+        if len(line) == 0:
+            continue
+        m = re.match('([a-z_]+): ([0-9]+) -', line)
+        if m is None:
+            raise ValueError('Unexpected vmsfs stats line: %s' % line)
+        (key, value) = m.groups()
+        statsdict[key] = long(value)
+    return statsdict
+
+IPTABLES_SEPARATOR = '-- grinder iptables --'
+
+class IptablesSnapshot(object):
+
+    '''Decomposes the output of iptables-save for the filter table into a
+    dictionary of chain to a sorted list of string repr of rules. The
+    "-A <chain>" prefix is dropped and host IP addresses are replaced with
+    HOST_IP, so that rules captured on different hosts compare equal.'''
+
+    def __init__(self, output, ips):
+        self.chains = {}
+        for line in output.split('\n'):
+            line = line.strip()
+            if line.startswith(':'):
+                self.chains.setdefault(line[1:].split()[0], [])
+            elif line.startswith('-A '):
+                tokens = line.split()
+                rule = []
+                for tok in tokens[2:]:
+                    if tok.split('/')[0] in ips:
+                        tok = 'HOST_IP'
+                    rule.append(tok)
+                self.chains.setdefault(tokens[1], []).append(' '.join(rule))
+        # Sort to rule out comparison false negatives
+        for rules in self.chains.values():
+            rules.sort()
+
+    def rules(self, chain):
+        return list(self.chains.get(chain, []))
+
+    def instance_filter_rules(self, id):
+        server_iptables_chain = "nova-compute-inst-%s" % (str(id))
+        for rule in self.rules('nova-compute-local'):
+            if server_iptables_chain in rule.split():
+                # This server has rules defined on this host.
+                return (True, self.rules(server_iptables_chain))
+
+        # No chains and no rules
+        return (False, [])
+
+vms_indexes = {}
+vms_indexes_lock = threading.Lock()
+
+def get_vms_index(hostname):
+    with vms_indexes_lock:
+        if hostname not in vms_indexes:
+            vms_indexes[hostname] = VmsIndex(hostname)
+        return vms_indexes[hostname]
 
 class Host(object):
 
@@ -37,10 +181,9 @@ class Host(object):
         return '%s:%s' % (self.config.default_az, self.id)
 
     def get_shell(self):
-        return RootShell(self.id,
-                         self.config.host_key_path,
-                         self.config.host_user,
-                         self.config.ssh_port)
+        return root_shell(self.config, self.id,
+                          self.config.host_key_path,
+                          self.config.host_user)
 
     def __str__(self):
         return 'Host(id=%s)' % (self.id)
@@ -49,6 +192,14 @@ class Host(object):
         shell = self.get_shell()
         return shell.check_output(command, **kwargs)
 
+    def get_vms_id(self, osid):
+        '''Returns the pid of the vms process whose instance name ends in
+        osid, from the index shared by all Host objects for this host.'''
+        return get_vms_index(self.id).lookup(self, osid)
+
+    def invalidate_vms_ids(self):
+        get_vms_index(self.id).invalidate()
+
     def get_vmsfs_stats(self, genid=None):
         if genid is None:
             path = '/sys/fs/vmsfs/stats'
@@ -57,15 +208,52 @@ class Host(object):
 
         # Grab the stats.
         (stdout, stderr) = self.check_output('cat %s' % path)
+        return parse_vmsfs_stats(stdout)
+
+    def get_resource_counters(self):
+        '''Returns the host's cpu and network counters, see
+        parse_resource_counters. The traffic is that of
+        config.host_net_interfaces, or of the physical interfaces.'''
+        (stdout, stderr) = self.check_output(
+            'head -1 /proc/stat; cat /proc/net/dev; '
+            'ls -d /sys/class/net/*/device 2>/dev/null || true')
+        return parse_resource_counters(
+            stdout, self.config.host_net_interfaces or None)
 
-        # Post-process.
-        lines = [x.strip() for x in stdout.split('\n')]
-        statsdict = {}
-        for line in lines:
-            m = re.match('([a-z_]+): ([0-9]+) -', line)
-            (key, value) = m.groups()
-            statsdict[key] = long(value)
-        return statsdict
+    def get_vmsfs_generations(self):
+        '''Returns the set of generations vmsfs has on this host.'''
+        (stdout, stderr) = self.check_output('ls /sys/fs/vmsfs')
+        return set(stdout.split()) - set(['stats'])
+
+    def get_vmsfs_stats_many(self, genids):
+        '''Returns a dictionary of genid to the stats of that generation,
+        read in a single round trip. A genid of None stands for the global
+        vmsfs stats. Raises ValueError naming the generation whose stats
+        are missing or can't be parsed.'''
+        names = [genid is None and 'stats' or str(genid) for genid in genids]
+        (stdout, stderr) = self.check_output(
+            'for f in %s; do echo "== $f"; cat /sys/fs/vmsfs/$f; done' %
+                ' '.join(names))
+        chunks = {}
+        name = None
+        for line in stdout.split('\n'):
+            if line.startswith('== '):
+                name = line[3:].strip()
+                chunks[name] = []
+            elif name is not None:
+                chunks[name].append(line)
+        result = {}
+        for (genid, name) in zip(genids, names):
+            try:
+                stats = parse_vmsfs_stats('\n'.join(chunks.get(name, [])))
+            except ValueError, e:
+                raise ValueError('Bad vmsfs stats for generation %s on %s: '
+                                 '%s' % (name, self.id, e))
+            if len(stats) == 0:
+                raise ValueError('No vmsfs stats for generation %s on %s' %
+                                 (name, self.id))
+            result[genid] = stats
+        return result
 
     def get_ips(self):
         # Return the list of all assigned IP addresses.
@@ -73,49 +261,26 @@ class Host(object):
         ips = map(lambda x: x.split()[1], stdout.split("\n"))
         return [ip.split("/")[0] for ip in ips]
 
-    # Decomposes a chain in the default "filter" table in the host
-    # into a list of string repr of rules.
-    def __get_iptables_rules(self, chain):
-        # Return the list of iptables rules for the specified chain
-        stdout, stderr = self.check_output('iptables -L %s || true' % chain)
-        try:
-            rules = stdout.split('\n')[2:]
-            if rules[-1] == '':
-                rules = rules[:-1]
-        except:
-            return []
-
-        ips = self.get_ips()
-        modified_rules = []
-        for rule in rules:
-            rule_tokens = rule.split()
-            new_rule = []
-            for tok in rule_tokens:
-                if tok in ips:
-                    tok = 'HOST_IP'
-                new_rule.append(tok)
-            # Re join tokens, clean up spacing
-            modified_rules.append(' '.join(new_rule))
-        # Sort to rule out comparison false negatives
-        modified_rules.sort()
-        log.debug("Iptable rules for chain %s on host %s: %s." %
-                    (chain, self.id, str(modified_rules)))
-        return modified_rules
+    def get_iptables_snapshot(self):
+        '''Captures the host's IP addresses and its whole filter table in a
+        single round trip. See IptablesSnapshot.'''
+        stdout, stderr = self.check_output(
+            'ip addr | grep "inet "; echo "%s"; iptables-save -t filter || true' %
+                IPTABLES_SEPARATOR)
+        (addrs, rules) = stdout.split(IPTABLES_SEPARATOR, 1)
+        ips = [line.split()[1].split("/")[0]
+               for line in addrs.split("\n") if line.strip()]
+        snapshot = IptablesSnapshot(rules, ips)
+        log.debug("Iptables chains on host %s: %s." %
+                    (self.id, str(snapshot.chains.keys())))
+        return snapshot
 
     # Return a (bool, [list]), where bool indicates that a chain
     # for this instance exists in the main filtering chain, and
     # the list contains the rules for the instance chain as per
-    # __get_iptables_rules. That way we can catch cases when
+    # IptablesSnapshot. That way we can catch cases when
     # empty chains are left dangling
-    def get_nova_compute_instance_filter_rules(self, id):
-        server_iptables_chain = "nova-compute-inst-%s" % (str(id))
-        for rule in self.__get_iptables_rules('nova-compute-local'):
-            if server_iptables_chain in rule:
-                # This server has rules defined on this host.
-                # Grab the server rules for that chain.
-                return (True,\
-                        self.__get_iptables_rules(server_iptables_chain))
-
-        # No chains and no rules
-        return (False, [])
-
+    def get_nova_compute_instance_filter_rules(self, id, snapshot=None):
+        if snapshot is None:
+            snapshot = self.get_iptables_snapshot()
+        return snapshot.instance_filter_rules(id)
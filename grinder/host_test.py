@@ -0,0 +1,85 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import pytest
+
+from . config import Config
+from . host import Host
+from . host import IptablesSnapshot
+from . host import parse_resource_counters
+
+IPTABLES_SAVE = """# Generated by iptables-save v1.4.12 on Thu Sep 12 10:00:00 2013
+*filter
+:INPUT ACCEPT [0:0]
+:nova-compute-inst-10 - [0:0]
+:nova-compute-inst-1 - [0:0]
+:nova-compute-local - [0:0]
+-A nova-compute-inst-10 -s 10.0.0.1/32 -p udp -m udp --sport 67 --dport 68 -j ACCEPT
+-A nova-compute-inst-10 -m state --state INVALID -j DROP
+-A nova-compute-local -d 10.0.0.5/32 -j nova-compute-inst-10
+COMMIT
+"""
+
+def test_iptables_snapshot():
+    snapshot = IptablesSnapshot(IPTABLES_SAVE, ['10.0.0.1'])
+    (exists, rules) = snapshot.instance_filter_rules(10)
+    assert exists
+    assert rules == ['-m state --state INVALID -j DROP',
+                     '-s HOST_IP -p udp -m udp --sport 67 --dport 68 -j ACCEPT']
+    # An empty chain dangling without a jump is not reported as existing.
+    assert (False, []) == snapshot.instance_filter_rules(1)
+    assert (False, []) == snapshot.instance_filter_rules(2)
+    assert [] == snapshot.rules('INPUT')
+
+PROC_STAT_NET_DEV = """cpu  100 5 50 1000 20 0 3 0 40 0
+Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo:    5000      50    0    0    0     0          0         0     5000      50    0    0    0     0       0          0
+  eth0: 1000000    900    0    0    0     0          0         0   200000     400    0    0    0     0       0          0
+   br0:   30000     10    0    0    0     0          0         0     4000      10    0    0    0     0       0          0
+/sys/class/net/eth0/device"""
+
+def test_resource_counters():
+    # The guest time (40) is already in user; the bridge is not physical.
+    counters = parse_resource_counters(PROC_STAT_NET_DEV)
+    assert counters == {'cpu_total': 1178, 'cpu_busy': 158,
+                        'net_rx': 1000000, 'net_tx': 200000}
+    counters = parse_resource_counters(PROC_STAT_NET_DEV, ['br0'])
+    assert (counters['net_rx'], counters['net_tx']) == (30000, 4000)
+
+class CannedHost(Host):
+
+    def __init__(self, stdout):
+        Host.__init__(self, 'host1', Config())
+        self.stdout = stdout
+
+    def check_output(self, command, **kwargs):
+        return (self.stdout, '')
+
+def test_vmsfs_stats_many():
+    host = CannedHost('== stats\n'
+                      'cur_resident: 100 - resident pages\n'
+                      '== 3\n'
+                      'cur_resident: 20 - resident pages\n'
+                      'sh_cow: 5 - shared pages broken\n')
+    assert host.get_vmsfs_stats_many([None, 3]) == \
+        {None: {'cur_resident': 100}, 3: {'cur_resident': 20, 'sh_cow': 5}}
+    # A generation that went away leaves an empty chunk.
+    host = CannedHost('== stats\ncur_resident: 100 - resident pages\n== 3\n')
+    e = pytest.raises(ValueError, host.get_vmsfs_stats_many, [None, 3])
+    assert 'generation 3' in str(e.value)
+    host = CannedHost('== 3\ngarbage\n')
+    e = pytest.raises(ValueError, host.get_vmsfs_stats_many, [3])
+    assert 'generation 3' in str(e.value)
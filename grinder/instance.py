@@ -13,23 +13,33 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
 import json
 import time
 import random
+import hashlib
 import tempfile
 
 from . logger import log
 from . util import Notifier
-from . shell import SecureShell
-from . shell import RootShell
+from . shell import secure_shell
+from . shell import root_shell
 from . shell import WinShell
 from . host import Host
+from . cluster import Cluster
 from . vmsctl import Vmsctl
+from . balloon import BalloonFingerprint
 from . breadcrumbs import SSHBreadcrumbs
 from . breadcrumbs import LinkBreadcrumbs
+from . readiness import get_listener
+from . readiness import READY_HOOK_PATH
+from . downtime import MigrationMonitor
+from . import profiling
 from . util import fix_url_for_yum
 from . util import wait_for
 from . util import wait_for_ping
+from . util import reraise
+from . util import run_parallel
 from . shell import wait_for_shell
 from . requirements import AVAILABILITY_ZONE, SCHEDULER_HINTS
 
@@ -52,6 +62,18 @@ def wait_while_exists(server):
             return True
     wait_for('server %s to not exist' % server.id, condition)
 
+guest_sources = {}
+
+def guest_source(name):
+    '''Returns the source of one of the modules that run inside guests.'''
+    if name not in guest_sources:
+        f = open(os.path.join(os.path.dirname(__file__), '%s.py' % name))
+        try:
+            guest_sources[name] = f.read()
+        finally:
+            f.close()
+    return guest_sources[name]
+
 def get_addrs(server, network=None):
     log.debug('get_addrs network=%s: %s', network, server.networks)
     if network != None:
@@ -92,6 +114,11 @@ class Instance(Notifier):
         self.snapshot = snapshot
         self.breadcrumbs = breadcrumbs
         self.volumes = []
+        # Set by wait_for_ready() when the clone reported in by itself.
+        self.ready_report = None
+        # When the phases of bringing the instance up (accepted, active,
+        # ready, ping, ssh) completed, as set by launch and wait_for_boot.
+        self.timings = {}
 
         if keypair is not None:
             self.privkey_fd = tempfile.NamedTemporaryFile()
@@ -105,8 +132,16 @@ class Instance(Notifier):
         self.wait_while_status('BUILD')
         assert self.get_status() == status
         if status == 'ACTIVE':
+            self.timings['active'] = time.time()
             self.instance_wait_for_ping()
+            self.timings['ping'] = time.time()
             wait_for_shell(self.get_shell())
+            self.timings['ssh'] = time.time()
+
+    def wait_for_ready(self, since):
+        '''Waits for a freshly launched clone to come up. since is the time
+        at which the launch was requested.'''
+        self.wait_for_boot()
 
     def wait_while_host(self, host):
         wait_for('%s to not be on host %s' % (self, host),
@@ -114,8 +149,12 @@ class Instance(Notifier):
 
     def wait_for_migrate(self, host, dest):
         self.wait_while_host(host)
+        self.timings['migrate_host'] = time.time()
         self.wait_while_status('MIGRATING')
         self.assert_alive(dest)
+        self.timings['migrate_alive'] = time.time()
+        # Checkpoint: read the whole trail back after the move.
+        self.breadcrumbs.assert_trail()
         self.breadcrumbs.add('post migration to %s' % dest.id)
 
     def wait_while_status(self, status):
@@ -188,22 +227,23 @@ class Instance(Notifier):
     def get_vms_id(self):
         host = self.get_host()
         osid = '%08x' % self.get_raw_id()
-        (stdout, _) = \
-            host.check_output('ps aux | grep qemu-system | grep %s | grep -v ssh | grep -v ssh' % osid)
-        return int(stdout.split('\n')[0].strip().split()[1])
+        return host.get_vms_id(osid)
 
-    def get_iptables_rules(self, host=None):
+    def get_iptables_rules(self, host=None, snapshot=None):
         if host == None:
             host = self.get_host()
 
         server_id = self.get_raw_id()
 
         # Check if the server has iptables rules.
-        return host.get_nova_compute_instance_filter_rules(server_id)
+        return host.get_nova_compute_instance_filter_rules(server_id,
+                                                           snapshot=snapshot)
 
     @Notifier.notify
     def bless(self, **kwargs):
         log.info('Blessing %s', self)
+        # Checkpoint: the clones will start from this trail.
+        self.breadcrumbs.assert_trail()
         self.breadcrumbs.add('Pre bless')
 
         # Unconditionally set up the params script on the master. This
@@ -273,44 +313,52 @@ class Instance(Notifier):
             if availability_zone is not None:
                 params['availability_zone'] = availability_zone
 
-        # get an old list of launched VMs so we can discount these
-        # from the launched VMs we're about to create.
-        old_launches = self.harness.nova.gridcentric.list_launched(self.server)
+        single = num_instances is None or num_instances == 1
+        if not single:
+            # get an old list of launched VMs so we can discount these
+            # from the launched VMs we're about to create.
+            old_launches = self.harness.nova.gridcentric.list_launched(self.server)
 
-        launched_list = self.harness.gcapi.launch_instance(self.server,
+        launch_start = time.time()
+        returned_list = self.harness.gcapi.launch_instance(self.server,
                                                            params=params)
+        accepted = time.time()
 
         # Verify the metadata returned by nova-gc. Even with multiple instances
         # requested, a single server is returned (as per nova boot semantics)
-        assert len(launched_list) == 1
-
-        # The conform to the nova boot semantics, launch_instance only
-        # returns one instance ID.  However, the user may have
-        # requested more than one instance.  That's why we need to
-        # re-list the launched instances to find the other instances
-        # launched from the call above (and exclude the old launches).
-        #
-        # FIXME: TODO:
-        #
-        # The launch itself is using the wrapped gcapi.launch, which
-        # is good.  We really should be using
-        # harness.gcapi.list_launched_instances here for consistency.
-        # Unfortunately, all of the code that depends on this function
-        # expects a 'server' object instead of a 'dict'.
-        launched_list = []
-        all_launches = self.harness.nova.gridcentric.list_launched(self.server)
-        for launched in all_launches:
-            isnew = True
-            for existing in old_launches:
-                if existing.id == launched.id:
-                    isnew = False
-                    break
-            if isnew:
-                launched_list.append(launched)
+        assert len(returned_list) == 1
+
+        if single:
+            # The one clone is the one returned. Re-listing would also pick
+            # up the clones of concurrent launches from the same instance.
+            launched_list = [self.harness.nova.servers.get(returned_list[0]['id'])]
+        else:
+            # The conform to the nova boot semantics, launch_instance only
+            # returns one instance ID.  However, the user may have
+            # requested more than one instance.  That's why we need to
+            # re-list the launched instances to find the other instances
+            # launched from the call above (and exclude the old launches).
+            #
+            # FIXME: TODO:
+            #
+            # The launch itself is using the wrapped gcapi.launch, which
+            # is good.  We really should be using
+            # harness.gcapi.list_launched_instances here for consistency.
+            # Unfortunately, all of the code that depends on this function
+            # expects a 'server' object instead of a 'dict'.
+            launched_list = []
+            all_launches = self.harness.nova.gridcentric.list_launched(self.server)
+            for launched in all_launches:
+                isnew = True
+                for existing in old_launches:
+                    if existing.id == launched.id:
+                        isnew = False
+                        break
+                if isnew:
+                    launched_list.append(launched)
         assert len(launched_list) >= 1
 
-        clones = []
-        for launched in launched_list:
+        def bring_up(launched):
             assert launched.id != self.id
             assert launched.status in [status, 'BUILD']
 
@@ -330,10 +378,20 @@ class Instance(Notifier):
             instance = self.__class__(self.harness, server, self.image_config,
                                       breadcrumbs=None, snapshot=None,
                                       keypair=keypair)
+            instance.timings['start'] = launch_start
+            instance.timings['accepted'] = accepted
             instance.breadcrumbs = self.snapshot.instantiate(instance)
-            instance.wait_for_boot(status)
+            if status == 'ACTIVE':
+                instance.wait_for_ready(launch_start)
+            else:
+                instance.wait_for_boot(status)
             # Only ensure cloud init for launched clones
             instance.ensure_cloudinit_done()
+            if status == 'ACTIVE':
+                # Checkpoint: the clone must have the trail of its master.
+                instance.breadcrumbs.assert_trail()
+                if self.harness.config.hook_timing:
+                    instance.record_hook_timeline()
 
             # Folsom and later: if the availability zone targeted a specific host, verify
             if (AVAILABILITY_ZONE.check(self.harness.nova) and
@@ -344,14 +402,54 @@ class Instance(Notifier):
 
             if paused_on_launch:
                 self.harness.nova.servers.pause(server)
-            clones.append(instance)
+            return instance
+
+        if len(launched_list) == 1:
+            clones = [bring_up(launched_list[0])]
+        else:
+            # Wait for the clones together, so that each one is seen (and
+            # timed) as it comes up rather than after those before it.
+            (results, errors) = run_parallel(
+                lambda index: bring_up(launched_list[index]),
+                range(len(launched_list)))
+            for (index, error) in sorted(errors.items()):
+                log.error('Clone %s failed to come up: %s' %
+                          (launched_list[index].id, error),
+                          exc_info=getattr(error, 'exc_info', None))
+            if len(errors) > 0:
+                reraise(errors[min(errors.keys())])
+            clones = [results[index] for index in range(len(launched_list))]
 
         # Most callers expect a singleton return value
         if num_instances is not None and num_instances != 1:
             return clones
         return clones[0]
 
+    def record_hook_timeline(self):
+        '''Adds the timeline of the clone hooks that ran in this clone to
+        the test's metrics.'''
+        timeline = self.hook_timeline()
+        for hook in timeline:
+            if hook['end'] is None:
+                log.warn('Clone hook %s on %s did not finish' %
+                         (hook['hook'], self))
+                continue
+            self.harness.add_metric('clone_hook', hook['end'] - hook['start'],
+                                    instance=self.id, hook=hook['hook'],
+                                    start=hook['start'], end=hook['end'],
+                                    rc=hook['rc'])
+        finished = [hook for hook in timeline if hook['end'] is not None]
+        if len(finished) > 0:
+            slowest = max(finished, key=lambda hook: hook['end'] - hook['start'])
+            log.info('Clone hooks on %s took %.2fs, slowest was %s (%.2fs)' %
+                     (self, finished[-1]['end'], slowest['hook'],
+                      slowest['end'] - slowest['start']))
+        return timeline
+
     def instance_wait_for_ping(self):
+        # Simulated guests answer their shell but are not on the network.
+        if self.harness.config.sim_shell:
+            return
         wait_for_ping([self.get_address()])
 
     def assert_alive(self, host=None):
@@ -371,12 +469,40 @@ class Instance(Notifier):
         self.assert_alive(host)
         pre_migrate_iptables = self.get_iptables_rules(host)
         self.breadcrumbs.add('pre migration to %s' % dest.id)
-        self.harness.gcapi.migrate_instance(self.server, dest.id)
-        self.wait_for_migrate(host, dest)
+        monitor = MigrationMonitor(self)
+        monitor.start()
+        start = time.time()
+        try:
+            self.harness.gcapi.migrate_instance(self.server, dest.id)
+            accepted = time.time()
+            self.wait_for_migrate(host, dest)
+        finally:
+            downtime = monitor.stop()
+        # Seconds from the migrate request until the API accepted it, until
+        # the API showed the new host, and until the instance was alive
+        # there; and the downtime seen from outside and inside the guest.
+        stats = dict(downtime)
+        stats['accepted'] = accepted - start
+        stats['api_host'] = self.timings['migrate_host'] - start
+        stats['total'] = self.timings['migrate_alive'] - start
+        for (key, value) in stats.items():
+            if value is None:
+                # The probe never got through; there is nothing to record.
+                continue
+            self.harness.add_metric('migration.%s' % key, value,
+                                    instance=self.id, source=host.id,
+                                    dest=dest.id)
+        # The vms pids on both ends have changed.
+        host.invalidate_vms_ids()
+        dest.invalidate_vms_ids()
         # Assert that the iptables rules have been cleaned up.
-        time.sleep(1.0)
-        assert (False, []) == self.get_iptables_rules(host)
-        assert pre_migrate_iptables == self.get_iptables_rules(dest)
+        profiling.sleep(1.0, 'migrate')
+        snapshots = Cluster([host, dest],
+                            self.harness.config.cluster_timeout).iptables()
+        assert (False, []) == self.get_iptables_rules(host, snapshots[host.id])
+        assert pre_migrate_iptables == \
+            self.get_iptables_rules(dest, snapshots[dest.id])
+        return stats
 
     @Notifier.notify
     def delete(self, recursive=False):
@@ -391,8 +517,12 @@ class Instance(Notifier):
             log.info('Detaching volume %s', volume.id)
             volume.detach()
         log.info('Deleting %s', self)
+        # Use the last known host rather than asking nova again.
+        hostname = getattr(self.server, 'OS-EXT-SRV-ATTR:host', None)
         self.server.delete()
         self.wait_while_exists()
+        if hostname:
+            Host(hostname, self.harness.config).invalidate_vms_ids()
 
     @Notifier.notify
     def discard(self, recursive=False):
@@ -422,7 +552,7 @@ class Instance(Notifier):
             except:
                 if id in self.list_launched():
                     raise
-            time.sleep(1.0) # Sleep after the delete.
+            profiling.sleep(1.0, 'delete') # Sleep after the delete.
 
     def vmsctl(self):
         return Vmsctl(self)
@@ -434,28 +564,34 @@ class Instance(Notifier):
         return self.server.remove_security_group(*args, **kwargs)
 
     def attach_volume(self, volume):
-        # Figure out a decent name for a volume.
+        return self.attach_volumes([volume])[0]
+
+    def attach_volumes(self, volumes):
+        '''Attaches all of volumes at once and returns their devices, in
+        order. The attachments proceed together: the waits poll every volume
+        with one listing and the guest devices with one list_devices.'''
+        # Figure out decent names for the volumes.
         before = set(self.list_devices())
         suggested = set(self.suggested_devices())
         available = list(suggested.difference(before))
         available.sort()
-        device = available[0]
-
-        # Do the attach and save the volume (returning the device).
-        wait_for('volume %s to be available' % (volume.id), \
-            lambda: self.harness.cinder.volumes.get(volume.id).status.lower() == 'available')
+        devices = available[:len(volumes)]
+        tracker = self.harness.volume_tracker
 
-        self.harness.nova.volumes.create_server_volume(self.server.id, volume.id, device)
+        # Do the attaches and save the volumes (returning the devices).
+        tracker.wait_for(dict((volume.id, 'available') for volume in volumes))
 
-        self.volumes.append(volume)
+        for (volume, device) in zip(volumes, devices):
+            self.harness.nova.volumes.create_server_volume(self.server.id,
+                                                           volume.id, device)
+            self.volumes.append(volume)
 
-        wait_for('volume %s to be attached' % (volume.id), \
-            lambda: self.harness.cinder.volumes.get(volume.id).status.lower() == 'in-use')
+        tracker.wait_for(dict((volume.id, 'in-use') for volume in volumes))
 
-        wait_for('volume %s to be listed' % (volume.id), \
-            lambda: device in self.list_devices())
+        wait_for('devices %s to be listed' % ', '.join(devices),
+                 lambda: set(devices).issubset(self.list_devices()))
 
-        return device
+        return devices
 
     ### Platform-specific functionality.
 
@@ -476,6 +612,15 @@ class Instance(Notifier):
         '''
         raise NotImplementedError()
 
+    def hook_timeline(self):
+        '''
+        Returns the clone hooks that ran in this clone as a list of dicts
+        with the hook name, its start and end in seconds since the first hook
+        started, and its exit status. Requires config.hook_timing when the
+        master was blessed.
+        '''
+        raise NotImplementedError()
+
     def read_params(self):
         '''
         Returns a python object representation of the vms params passed to this
@@ -523,6 +668,38 @@ class Instance(Notifier):
         '''
         raise NotImplementedError()
 
+    def start_heartbeat(self):
+        '''
+        Starts a process in the guest that records a heartbeat at the
+        migration probe interval. Returns a handle for stop_heartbeat(), or
+        None if the platform has no heartbeat.
+        '''
+        raise NotImplementedError()
+
+    def stop_heartbeat(self, heartbeat):
+        '''
+        Stops the heartbeat and returns a dict with the number of 'beats'
+        and the longest gap between two of them ('max_gap'), in seconds of
+        guest time.
+        '''
+        raise NotImplementedError()
+
+    def start_memwalk(self, pages):
+        '''
+        Starts a process in the guest that reads the first pages of the
+        balloon over and over, to see how fast the guest can touch its
+        memory. Returns a handle for stop_memwalk(), or None if the
+        platform has no such process.
+        '''
+        raise NotImplementedError()
+
+    def stop_memwalk(self, memwalk):
+        '''
+        Stops the walk and returns a dict with the pages read per second
+        over all of it ('rate') and in its slowest interval ('min_rate').
+        '''
+        raise NotImplementedError()
+
     def drop_caches(self):
         '''
         Cause the guest operating system to drop all cached memory.
@@ -567,16 +744,17 @@ class Instance(Notifier):
 
     def prime_volume(self, device):
         '''
-        Format and do block IO to store random bytes on a named volume.
-        Returns the hash of the random bytes, which are guaranteed to
-        not be cached in RAM.
+        Format and do block IO to store pseudorandom bytes on a named volume.
+        Returns a fingerprint of the bytes, which are guaranteed to not be
+        cached in RAM.
         '''
         raise NotImplementedError()
 
-    def verify_volume(self, device, md5):
+    def verify_volume(self, device, fingerprint):
         '''
-        Remount the named volume and verify the stored random bytes.
-        Shred those bytes to test consistency of parent/sibling volumes.
+        Remount the named volume and verify the stored bytes against the
+        fingerprint returned by prime_volume(). Shred those bytes to test
+        consistency of parent/sibling volumes.
         '''
         raise NotImplementedError()
 
@@ -624,19 +802,68 @@ open("/tmp/clone.log", "w").write(sys.argv[2])
             **kwargs)
         self.TMP_SSH_KEY_PATH   = "/tmp/curr_ssh_key"
         self.RSA_HOST_KEY_PATH  = "/etc/ssh/ssh_host_rsa_key.pub"
+        self.root_shell = None
 
     def get_shell(self):
-        return SecureShell(self.get_address(),
-                           self.privkey_path,
-                           self.image_config.user,
-                           self.harness.config.ssh_port)
+        return secure_shell(self.harness.config, self.get_address(),
+                            self.privkey_path,
+                            self.image_config.user)
 
     def root_command(self, command, **kwargs):
-        ssh = RootShell(self.get_address(),
-                        self.privkey_path,
-                        self.image_config.user,
-                        self.harness.config.ssh_port)
-        return ssh.check_output(command, **kwargs)
+        # Keep the shell around so the sudo probe is only paid once.
+        address = self.get_address()
+        if self.root_shell is None or self.root_shell.host != address:
+            self.root_shell = root_shell(self.harness.config, address,
+                                         self.privkey_path,
+                                         self.image_config.user)
+        return self.root_shell.check_output(command, **kwargs)
+
+    # The guest helper (guesthelper.py and the balloon module it imports)
+    # lives in a directory named after a digest of its sources, so a stale
+    # copy baked into an older master is never used.
+    HELPER_MODULES = ['guesthelper', 'balloon']
+    HELPER_MISSING = 'GRINDER_HELPER_MISSING'
+
+    def helper_dir(self):
+        digest = hashlib.md5()
+        for name in self.HELPER_MODULES:
+            digest.update(guest_source(name))
+        return '/var/lib/grinder/helper-%s' % digest.hexdigest()[:12]
+
+    def install_helper(self):
+        helper_dir = self.helper_dir()
+        log.debug('Installing guest helper in %s on %s' % (helper_dir, self))
+        with profiling.naming('install guesthelper'):
+            self.root_command("mkdir -p %s" % helper_dir)
+            for name in self.HELPER_MODULES:
+                self.root_command("cat > %s/%s.py" % (helper_dir, name),
+                                  input=guest_source(name))
+
+    def helper(self, op, **args):
+        '''
+        Runs one operation of the guest helper and returns its result. The
+        helper is installed on first use; clones inherit it from their master.
+        '''
+        path = '%s/guesthelper.py' % self.helper_dir()
+        command = 'if [ -e %s ]; then python %s; else echo %s; fi' % \
+                    (path, path, self.HELPER_MISSING)
+        request = json.dumps({'op': op, 'args': args})
+        with profiling.naming('guesthelper %s' % op):
+            (stdout, stderr) = self.root_command(command, input=request,
+                                                 expected_rc=None)
+            if stdout == self.HELPER_MISSING:
+                self.install_helper()
+                (stdout, stderr) = self.root_command(command, input=request,
+                                                     expected_rc=None)
+        try:
+            response = json.loads(stdout)
+        except ValueError:
+            raise Exception('Guest helper %s on %s failed:\n%s\n%s' %
+                            (op, self, stdout, stderr))
+        if 'error' in response:
+            raise Exception('Guest helper %s on %s failed:\n%s' %
+                            (op, self, response['error']))
+        return response['result']
 
     def ensure_cloudinit_done(self):
         # Do we have cloud init? Wait until it's done reshuffling ssh
@@ -659,27 +886,72 @@ open("/tmp/clone.log", "w").write(sys.argv[2])
 
         wait_for("Cloud init to be done", check_cloudinit_done)
 
+    HOOKS_DIR = "/etc/gridcentric/clone.d"
+    # Where the real hooks go once wrapped for timing.
+    TIMED_HOOKS_DIR = "/etc/gridcentric/clone.timed"
+    HOOK_TIMELINE_PATH = "/var/lib/grinder/clone-hooks.log"
+
     def setup_params(self):
         params_path = "/etc/gridcentric/clone.d/90_clone_params"
         self.root_command("cat > %s" % params_path, input=self.PARAMS_SCRIPT)
         self.root_command("chmod a+x %s" % params_path)
+        # Have the clones report in as soon as their hooks have run.
+        listener = get_listener(self.harness.config)
+        if listener is not None:
+            self.root_command("cat > %s" % READY_HOOK_PATH,
+                              input=listener.script())
+            self.root_command("chmod a+x %s" % READY_HOOK_PATH)
+        # Bake the guest helper into the clones.
+        self.install_helper()
+        # Wrapping goes last so it catches every hook installed above.
+        if self.harness.config.hook_timing:
+            wrapped = self.helper('wrap-hooks', hooks=self.HOOKS_DIR,
+                                  timed=self.TIMED_HOOKS_DIR,
+                                  log=self.HOOK_TIMELINE_PATH)
+            log.debug('Wrapped clone hooks %s on %s' % (wrapped, self))
+
+    def hook_timeline(self):
+        # The last hooks may still be running when the clone is first seen
+        # up; give them a few seconds to finish.
+        for attempt in range(50):
+            timeline = self.helper('hook-timeline',
+                                   log=self.HOOK_TIMELINE_PATH)
+            if all(hook['end'] is not None for hook in timeline):
+                break
+            profiling.sleep(0.1, 'hook_timeline')
+        return timeline
+
+    def wait_for_ready(self, since):
+        listener = get_listener(self.harness.config)
+        if listener is None:
+            return Instance.wait_for_ready(self, since)
+        self.wait_while_status('BUILD')
+        assert self.get_status() == 'ACTIVE'
+        self.timings['active'] = time.time()
+        report = listener.wait(self.get_addrs(), since,
+                               self.harness.config.readiness_timeout)
+        if report is None:
+            log.warn('No readiness report from %s, probing instead.' % self)
+            return Instance.wait_for_ready(self, since)
+        log.info('%s ready %.3fs after launch (guest uptime %.3fs)' %
+                 (self, report.received - since, report.uptime))
+        self.ready_report = report
+        self.timings['ready'] = report.received
+        # The report proves the network is up; ssh may still be starting.
+        wait_for_shell(self.get_shell())
+        self.timings['ssh'] = time.time()
 
     def read_params(self):
         attempt = 0
-        while attempt < 100:
+        while True:
             try:
-                (output, _) = self.root_command('cat /tmp/clone.log')
-                break
+                return self.helper('read-params')
             except:
                 # Wait a short bit and retry.
                 attempt += 1
-                time.sleep(0.1)
-        try:
-            return json.loads(output)
-        except:
-            log.error("Exception parsing params json, raw string was: %s" % \
-                          str(output))
-            raise
+                if attempt >= 100:
+                    raise
+                profiling.sleep(0.1, 'read_params')
 
     def install_agent(self):
         if not self.image_config.agent_skip:
@@ -745,59 +1017,78 @@ cat %s > %s
         self.root_command('ps aux')
         self.root_command('find / > /dev/null')
 
+    HEARTBEAT_PATH = "/dev/shm/grinder-heartbeat"
+
+    def start_heartbeat(self):
+        return self.helper('heartbeat-start', path=self.HEARTBEAT_PATH,
+                           interval=self.harness.config.migration_probe_interval)
+
+    def stop_heartbeat(self, heartbeat):
+        return self.helper('heartbeat-stop', path=self.HEARTBEAT_PATH,
+                           pid=heartbeat)
+
+    MEMWALK_LOG = "/var/lib/grinder/memwalk.log"
+
+    def start_memwalk(self, pages):
+        return self.helper('memwalk-start', path=self.BALLOON_PATH,
+                           log=self.MEMWALK_LOG, pages=pages, interval=0.5)
+
+    def stop_memwalk(self, memwalk):
+        return self.helper('memwalk-stop', log=self.MEMWALK_LOG, pid=memwalk)
+
     def drop_caches(self):
-        self.root_command("sh", input = "echo 3 > /proc/sys/vm/drop_caches")
+        self.helper('drop-caches')
+
+    BALLOON_PATH = "/dev/shm/file"
 
     def allocate_balloon(self, size_pages):
         # Remount tmpfs with a 16MiB headroom on top of the requested size.
         tmpfs_size = (size_pages << 12) + (16 << 20)
         self.root_command("mount -o remount,size=%d /dev/shm" % (tmpfs_size))
-        # Convert target to 2M super pages.
-        self.root_command("dd if=/dev/urandom of=/dev/shm/file bs=2M count=%d" % (size_pages >> 9))
-        (md5, _) = self.root_command("md5sum /dev/shm/file")
-        return md5
+        fingerprint = BalloonFingerprint.generate(size_pages)
+        self.helper('balloon-fill', path=self.BALLOON_PATH,
+                    seed=fingerprint.seed, pages=fingerprint.pages)
+        return fingerprint
 
     def assert_balloon_integrity(self, fingerprint):
-        (md5, _) = self.root_command("md5sum /dev/shm/file")
-        assert fingerprint == md5
+        indexes = fingerprint.sample(self.harness.config.balloon_verify_chunks)
+        reported = self.helper('balloon-digest', path=self.BALLOON_PATH,
+                               indexes=indexes)
+        mismatches = fingerprint.mismatches(reported)
+        if len(mismatches) > 0:
+            log.error("Balloon %s corrupted in chunks %s of %s checked." %
+                      (fingerprint, mismatches, len(indexes)))
+        assert len(reported) == len(indexes)
+        assert mismatches == []
 
     def thrash_balloon_memory(self, target_pages):
-        self.root_command("shred -f -u -n 1 /dev/shm/file")
-        self.drop_caches()
-        # Remount tmpfs with a 16MiB headroom on top of the requested size.
-        tmpfs_size = (target_pages << 12) + (16 << 20)
-        self.root_command("mount -o remount,size=%d /dev/shm" % (tmpfs_size))
-        self.root_command(
-            "dd if=/dev/urandom of=/dev/shm/file bs=4k count=%d" % (target_pages))
+        # Refilling with a new seed overwrites the balloon in place, so
+        # every one of its pages is written to (and unshared) again.
+        return self.allocate_balloon(target_pages)
 
     def list_devices(self):
-        # Return the output from parsing /proc/partitions.
-        (output, _) = self.root_command("cat /proc/partitions")
-        lines = output.split("\n")[2:]
-        devices = ["/dev/%s" % line.split()[-1] for line in lines if len(line) > 0]
-        return devices
+        return self.helper('list-devices')
 
     def suggested_devices(self):
         return map(lambda x: '/dev/vd%s' % chr(x), range(ord('a'), ord('z')))
 
     def prime_volume(self, device):
-        # Format, mount and umount the device.
-        self.root_command("mkfs.ext3 %s" % device)
-        self.root_command("mount %s /mnt" % device)
-        self.root_command("dd if=/dev/urandom of=/mnt/test.file bs=1K count=1024")
-        (md5, _) = self.root_command("md5sum /mnt/test.file")
-        # *Really* ensure it's no longer in the page cache
-        self.root_command("umount /mnt")
-        self.drop_caches()
-        self.root_command("blockdev --flushbufs %s" % device)
-        return md5
-
-    def verify_volume(self, device, md5):
-        self.root_command("mount %s /mnt" % device)
-        (new_md5, _) = self.root_command("md5sum /mnt/test.file")
-        self.root_command("shred -f -u -n 1 -z /mnt/test.file")
-        self.root_command("umount /mnt")
-        assert new_md5 == md5
+        fingerprint = BalloonFingerprint.generate(
+            self.harness.config.volume_test_mb << 8)
+        self.helper('prime-volume', device=device,
+                    seed=fingerprint.seed, pages=fingerprint.pages)
+        return fingerprint
+
+    def verify_volume(self, device, fingerprint):
+        indexes = fingerprint.sample(self.harness.config.volume_verify_chunks)
+        reported = self.helper('verify-volume', device=device,
+                               indexes=indexes)
+        mismatches = fingerprint.mismatches(reported)
+        if len(mismatches) > 0:
+            log.error("Volume %s on %s corrupted in chunks %s of %s checked." %
+                      (device, self, mismatches, len(indexes)))
+        assert len(reported) == len(indexes)
+        assert mismatches == []
 
 class WindowsInstance(Instance):
 
@@ -818,6 +1109,16 @@ class WindowsInstance(Instance):
     def setup_params(self):
         pass
 
+    def hook_timeline(self):
+        # Windows clones have no clone.d hooks.
+        return []
+
+    def start_heartbeat(self):
+        return None
+
+    def start_memwalk(self, pages):
+        return None
+
     def read_params(self):
         output, _ = self.get_shell().check_output('agent-proxy dump-params',
                                        expected_output=None)
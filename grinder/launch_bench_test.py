@@ -0,0 +1,105 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from . import harness
+from . import requirements
+from . logger import log
+from . benchmark import Benchmark, doubling, phase_timings
+from . cluster import Cluster
+from . storm import LaunchStorm, LeakCheck
+from . util import reraise
+from . util import run_parallel
+from . util import wait_for
+
+PHASES = ['accepted', 'active', 'ready', 'ping', 'ssh']
+
+def launch_concurrently(blessed, count):
+    '''Launches count clones with as many single launches at once.'''
+    (results, errors) = run_parallel(lambda i: blessed.launch(), range(count))
+    for error in errors.values():
+        log.error('Concurrent launch failed: %s' % error)
+    if len(errors) > 0:
+        delete_all(results.values())
+        reraise(errors.values()[0])
+    return results.values()
+
+def delete_all(clones):
+    (results, errors) = run_parallel(lambda clone: clone.delete(), clones)
+    if len(errors) > 0:
+        reraise(errors.values()[0])
+
+class TestLaunchBenchmark(harness.TestCase):
+
+    @harness.benchmark
+    def test_launch_scaling(self, image_finder):
+        bench = Benchmark(self.harness, 'launch_scaling')
+        modes = ['concurrent']
+        if self.harness.satisfies([requirements.NUM_INSTANCES]):
+            modes.insert(0, 'num_instances')
+        with self.harness.blessed(image_finder) as blessed:
+            for count in doubling(1, self.config.benchmark_max_clones):
+                for mode in modes:
+                    log.info('Launching %d clones (%s)' % (count, mode))
+                    if mode == 'num_instances':
+                        clones = blessed.launch(num_instances=count)
+                        if count == 1:
+                            clones = [clones]
+                    else:
+                        clones = launch_concurrently(blessed, count)
+                    try:
+                        for clone in clones:
+                            bench.add({'mode': mode, 'clones': count},
+                                      phase_timings(clone, PHASES))
+                    finally:
+                        delete_all(clones)
+        bench.report()
+
+    @harness.benchmark
+    @harness.hosttest
+    def test_launch_storm(self, image_finder):
+        bench = Benchmark(self.harness, 'launch_storm')
+        with self.harness.blessed(image_finder) as blessed:
+            leak_check = LeakCheck(Cluster.from_config(self.config))
+            for concurrency in doubling(1, self.config.storm_concurrency):
+                if self.config.storm_launches is not None:
+                    storm = LaunchStorm(blessed, concurrency,
+                                        count=self.config.storm_launches)
+                else:
+                    storm = LaunchStorm(blessed, concurrency,
+                                        duration=self.config.storm_duration)
+                storm.run()
+                summary = storm.summary()
+                log.info('Storm at concurrency %d: %s' % (concurrency, summary))
+                bench.add({'concurrency': concurrency, 'kind': 'summary'},
+                          summary)
+                for latency in storm.latencies():
+                    bench.add({'concurrency': concurrency, 'kind': 'launch'},
+                              {'latency': latency})
+                # Clean up after launches that failed half way.
+                blessed.delete_launched()
+            bench.report()
+
+            # Nothing the storm launched may be left behind.
+            assert blessed.list_launched() == []
+            leaks = []
+            def no_leaks():
+                leaks[:] = leak_check.leaks()
+                return len(leaks) == 0
+            try:
+                wait_for('storm leftovers to be cleaned up', no_leaks,
+                         interval=5)
+            except Exception:
+                log.error('Leaked after the storm: %s' % leaks)
+                raise
@@ -43,11 +43,11 @@ class TestMemory(harness.TestCase):
 
             # No target so hoard finishes without surprises.
             info = vmsctl.info()
-            assert int(info["eviction.dropshared"]) == 1
-            assert int(info["zeros.enabled"]) == 0
-            assert int(info["eviction.paging"]) == 0
-            assert int(info["eviction.sharing"]) == 0
-            assert int(info["stats.enabled"]) == 1
+            assert info["eviction.dropshared"] == 1
+            assert info["zeros.enabled"] == 0
+            assert info["eviction.paging"] == 0
+            assert info["eviction.sharing"] == 0
+            assert info["stats.enabled"] == 1
 
             # Hoard. Will clear target and eviction, remember.
             assert vmsctl.full_hoard()
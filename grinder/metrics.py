@@ -0,0 +1,144 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import threading
+import time
+
+from . logger import log
+from . util import Notifier
+from . util import percentile
+
+class MetricsLog(object):
+
+    '''Collects the metrics of every test in the session. With a path, each
+    metric is also appended to it as a line of JSON as soon as it is added,
+    so nothing is lost if the session dies.'''
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+        self.file = None
+
+    def open(self, path):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+            self.file = open(path, 'a')
+        log.debug('Writing metrics to %s' % path)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def add(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+            if self.file is not None:
+                self.file.write(json.dumps(metric) + '\n')
+                self.file.flush()
+
+    def summary(self):
+        '''Returns [(name, count, p50, p90, p99, max)] for every metric
+        name, sorted by name.'''
+        with self.lock:
+            values = {}
+            for metric in self.metrics:
+                values.setdefault(metric['name'], []).append(metric['value'])
+        return [(name, len(vals), percentile(vals, 50), percentile(vals, 90),
+                 percentile(vals, 99), max(vals))
+                for (name, vals) in sorted(values.items())]
+
+    def format_summary(self):
+        summary = self.summary()
+        if len(summary) == 0:
+            return []
+        width = max(len(row[0]) for row in summary)
+        lines = ['%-*s %6s %9s %9s %9s %9s' %
+                 (width, 'metric', 'count', 'p50', 'p90', 'p99', 'max')]
+        for row in summary:
+            lines.append('%-*s %6d %9.3f %9.3f %9.3f %9.3f' %
+                         ((width,) + row))
+        return lines
+
+# Every TestHarness adds its metrics here; conftest.py writes and
+# summarizes them.
+session_metrics = MetricsLog()
+
+class MetricsRecorder(object):
+
+    '''Records the wall-clock latency of the harness and instance operations
+    wrapped by Notifier.notify, through their pre and post hooks. Instances
+    returned by boot, bless and launch are watched in turn. Latencies are
+    added to the harness' metrics as latency.<operation>, tagged with the
+    image, flavor, host and instance.'''
+
+    OPERATIONS = ['bless', 'launch', 'migrate', 'delete', 'discard']
+
+    def __init__(self, harness):
+        self.harness = harness
+        # Operations may run in several threads at once; pair up pre and
+        # post per thread, and per object and operation.
+        self.local = threading.local()
+        harness.pre_boot(self.pre('boot'))
+        harness.post_boot(self.post('boot'))
+
+    def watch(self, instance):
+        if getattr(instance, 'metrics_recorder', None) is self:
+            return
+        instance.metrics_recorder = self
+        for op in self.OPERATIONS:
+            getattr(instance, 'pre_%s' % op)(self.pre(op))
+            getattr(instance, 'post_%s' % op)(self.post(op))
+
+    def starts(self):
+        if not hasattr(self.local, 'starts'):
+            self.local.starts = {}
+        return self.local.starts
+
+    def pre(self, op):
+        def callback(obj):
+            self.starts().setdefault((id(obj), op), []).append(time.time())
+        return callback
+
+    def post(self, op):
+        def callback(obj, result):
+            pending = self.starts().get((id(obj), op))
+            if not pending:
+                return
+            duration = time.time() - pending.pop()
+            if op == 'boot':
+                (instance, tags) = (result, {})
+            else:
+                (instance, tags) = (obj, {})
+            if isinstance(result, list):
+                tags['clones'] = len(result)
+            tags.update(self.describe(instance))
+            self.harness.add_metric('latency.%s' % op, duration, **tags)
+            for new in (result if isinstance(result, list) else [result]):
+                if isinstance(new, Notifier) and new is not self.harness:
+                    self.watch(new)
+        return callback
+
+    def describe(self, instance):
+        image_config = instance.image_config
+        return {'instance': instance.id,
+                'image': image_config.name,
+                'flavor': image_config.flavor or
+                          self.harness.config.flavor_name,
+                # The last known host; asking nova again would skew timings.
+                'host': getattr(instance.server, 'OS-EXT-SRV-ATTR:host', None)}
@@ -0,0 +1,95 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import tempfile
+
+from . config import Config, Image
+from . metrics import MetricsLog, MetricsRecorder
+from . util import Notifier
+
+class FakeServer(object):
+    def __init__(self, id):
+        self.id = id
+
+class FakeInstance(Notifier):
+    def __init__(self, id):
+        Notifier.__init__(self)
+        self.id = id
+        self.server = FakeServer(id)
+        self.image_config = Image('precise', 'ubuntu', '64')
+
+    @Notifier.notify
+    def bless(self):
+        return FakeInstance(self.id + 1)
+
+    @Notifier.notify
+    def launch(self, num_instances=1):
+        return [FakeInstance(self.id + 1 + i) for i in range(num_instances)]
+
+    @Notifier.notify
+    def migrate(self, host, dest):
+        pass
+
+    @Notifier.notify
+    def delete(self):
+        pass
+
+    @Notifier.notify
+    def discard(self):
+        pass
+
+class FakeHarness(Notifier):
+    def __init__(self):
+        Notifier.__init__(self)
+        self.config = Config()
+        self.metrics = []
+        self.recorder = MetricsRecorder(self)
+
+    @Notifier.notify
+    def boot(self):
+        return FakeInstance(1)
+
+    def add_metric(self, name, value, **tags):
+        self.metrics.append((name, tags))
+
+def test_recorder():
+    harness = FakeHarness()
+    master = harness.boot()
+    blessed = master.bless()
+    clones = blessed.launch(num_instances=3)
+    clones[0].delete()
+    assert [name for (name, tags) in harness.metrics] == \
+        ['latency.boot', 'latency.bless', 'latency.launch', 'latency.delete']
+    (name, tags) = harness.metrics[2]
+    assert tags['instance'] == 2
+    assert tags['clones'] == 3
+    assert tags['image'] == 'precise'
+    assert tags['flavor'] == harness.config.flavor_name
+
+def test_log():
+    path = tempfile.NamedTemporaryFile()
+    metrics = MetricsLog()
+    metrics.open(path.name)
+    for value in range(1, 101):
+        metrics.add({'name': 'latency.launch', 'value': float(value)})
+    metrics.add({'name': 'latency.bless', 'value': 2.0})
+    metrics.close()
+    assert len(open(path.name).readlines()) == 101
+    assert json.loads(open(path.name).readline())['value'] == 1.0
+    summary = metrics.summary()
+    assert summary[0] == ('latency.bless', 1, 2.0, 2.0, 2.0, 2.0)
+    assert summary[1][:3] == ('latency.launch', 100, 50.5)
+    assert len(metrics.format_summary()) == 3
@@ -20,6 +20,7 @@ from . import harness
 from . logger import log
 from . util import assert_raises
 from . host import Host
+from . downtime import check_downtime_budget
 
 class TestMigration(harness.TestCase):
 
@@ -33,7 +34,8 @@ class TestMigration(harness.TestCase):
             host = master.get_host()
             dest = Host([h for h in self.config.hosts if h != host.id][0], self.harness.config)
             assert host.id != dest.id
-            master.migrate(host, dest)
+            stats = master.migrate(host, dest)
+            check_downtime_budget(self.harness.config, stats)
 
     @harness.platformtest(exclude=["windows"])
     def test_migration_errors(self, image_finder):
@@ -74,7 +76,6 @@ class TestMigration(harness.TestCase):
             host = master.get_host()
             dest = Host([h for h in self.config.hosts if h != host.id][0], self.harness.config)
             assert host.id != dest.id
-            master.migrate(host, dest)
-            master.migrate(dest, host)
-            master.migrate(host, dest)
-            master.migrate(dest, host)
+            for (source, target) in [(host, dest), (dest, host)] * 2:
+                stats = master.migrate(source, target)
+                check_downtime_budget(self.harness.config, stats)
@@ -0,0 +1,193 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import cProfile
+import os
+import re
+import threading
+import time
+import urlparse
+
+from contextlib import contextmanager
+
+from . logger import log
+
+# The wall time categories, in the order they are reported. Whatever is left
+# over is time spent in the harness itself.
+CATEGORIES = ['api', 'ssh', 'link', 'sleep']
+
+# Resource ids in API paths: uuids, tenant ids and numeric ids.
+ID_PATTERN = re.compile(r'/(?:[0-9a-fA-F-]{32,36}|\d+)(?=/|$)')
+
+def api_name(method, url):
+    '''Names an API request by its method and path, with ids elided so
+    that requests for different servers are accounted together.'''
+    path = urlparse.urlparse(url).path
+    return '%s %s' % (method, ID_PATTERN.sub('/{id}', path))
+
+def command_name(command):
+    '''Names a shell command by its program, or by the label set with
+    naming() in the calling thread.'''
+    label = getattr(local, 'label', None)
+    if label is not None:
+        return label
+    words = command.split()
+    if len(words) == 0:
+        return command
+    return os.path.basename(words[0])
+
+class Profile(object):
+
+    '''Accounts the wall time of one test into (category, name) buckets:
+    API requests by path, shell commands by program, and sleeps by where
+    they happen. Buckets are summed over all threads, so with operations in
+    parallel they can add up to more than the test's wall time. CPU time is
+    that of the harness process and of its children (mostly ssh).'''
+
+    def __init__(self, name, dump_dir=None):
+        self.name = name
+        self.dump_dir = dump_dir
+        self.lock = threading.Lock()
+        # (category, name) -> [count, seconds]
+        self.buckets = {}
+        self.profiler = None
+        self.wall = None
+        self.cpu = None
+        self.children_cpu = None
+
+    def start(self):
+        self.started = time.time()
+        self.times = os.times()
+        if self.dump_dir is not None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+            path = self.path('prof')
+            self.profiler.dump_stats(path)
+            log.info('Wrote cProfile stats of %s to %s' % (self.name, path))
+        end = os.times()
+        self.wall = time.time() - self.started
+        self.cpu = (end[0] - self.times[0]) + (end[1] - self.times[1])
+        self.children_cpu = (end[2] - self.times[2]) + (end[3] - self.times[3])
+        if self.dump_dir is not None:
+            path = self.path('folded')
+            with open(path, 'w') as folded:
+                for line in self.folded():
+                    folded.write(line + '\n')
+
+    def path(self, extension):
+        if not os.path.isdir(self.dump_dir):
+            os.makedirs(self.dump_dir)
+        name = re.sub(r'[^\w.-]+', '_', self.name)
+        return os.path.join(self.dump_dir, '%s.%s' % (name, extension))
+
+    def add(self, category, name, seconds):
+        with self.lock:
+            bucket = self.buckets.setdefault((category, name), [0, 0.0])
+            bucket[0] += 1
+            bucket[1] += seconds
+
+    def totals(self):
+        '''Returns {category: seconds}, with the harness' own time as
+        'other'.'''
+        totals = dict((category, 0.0) for category in CATEGORIES)
+        with self.lock:
+            for ((category, name), (count, seconds)) in self.buckets.items():
+                totals[category] = totals.get(category, 0.0) + seconds
+        totals['other'] = max(self.wall - sum(totals.values()), 0.0)
+        return totals
+
+    def folded(self):
+        '''Returns the buckets as folded stacks (test;category;name
+        milliseconds), the input format of flamegraph tools.'''
+        lines = []
+        with self.lock:
+            for ((category, name), (count, seconds)) in \
+                    sorted(self.buckets.items()):
+                lines.append('%s;%s;%s %d' % (self.name, category, name,
+                                              int(seconds * 1000)))
+        other = self.totals()['other']
+        lines.append('%s;other %d' % (self.name, int(other * 1000)))
+        return lines
+
+    def format_summary(self, limit=5):
+        '''Returns the time of each category and its limit largest buckets,
+        as a tree.'''
+        totals = self.totals()
+        lines = ['%-50s %9.3fs' % (self.name, self.wall)]
+        for category in CATEGORIES + ['other']:
+            if totals[category] == 0.0:
+                continue
+            lines.append('  %-48s %9.3fs %5.1f%%' %
+                         (category, totals[category],
+                          100.0 * totals[category] / max(self.wall, 1e-9)))
+            with self.lock:
+                buckets = [(seconds, count, name) for
+                           ((cat, name), (count, seconds)) in
+                           self.buckets.items() if cat == category]
+            for (seconds, count, name) in sorted(buckets, reverse=True)[:limit]:
+                lines.append('    %-46s %9.3fs %5dx' %
+                             (name[:46], seconds, count))
+        lines.append('  cpu: harness %.3fs, children %.3fs' %
+                     (self.cpu, self.children_cpu))
+        return lines
+
+# The profile of the running test, if profiling is enabled.
+active = None
+local = threading.local()
+
+def start(name, dump_dir=None):
+    global active
+    active = Profile(name, dump_dir)
+    active.start()
+    return active
+
+def stop():
+    global active
+    profile = active
+    active = None
+    if profile is not None:
+        profile.stop()
+    return profile
+
+@contextmanager
+def timed(category, name):
+    '''Accounts the time spent in the block to the active profile.'''
+    profile = active
+    if profile is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        profile.add(category, name, time.time() - start)
+
+@contextmanager
+def naming(label):
+    '''Names the shell commands run by this thread in the block.'''
+    previous = getattr(local, 'label', None)
+    local.label = label
+    try:
+        yield
+    finally:
+        local.label = previous
+
+def sleep(seconds, name):
+    with timed('sleep', name):
+        time.sleep(seconds)
@@ -0,0 +1,95 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+import time
+
+from . import profiling
+from . accounting import instrument_client
+
+def test_api_name():
+    assert profiling.api_name('GET',
+        'http://nova:8774/v2/0123456789abcdef0123456789abcdef/servers/'
+        '6c1b8a36-8d0e-4a7f-9a3c-2f6a4c1e5d7b?all_tenants=1') == \
+        'GET /v2/{id}/servers/{id}'
+    assert profiling.api_name('DELETE', 'http://cinder/v1/volumes/42') == \
+        'DELETE /v1/volumes/{id}'
+
+def test_command_name():
+    assert profiling.command_name('/usr/bin/vmsctl get 1234 eviction') == \
+        'vmsctl'
+    with profiling.naming('guesthelper read-params'):
+        assert profiling.command_name('if [ -e x ]; then python x; fi') == \
+            'guesthelper read-params'
+    assert profiling.command_name('cat > /tmp/x') == 'cat'
+
+def test_inactive():
+    assert profiling.active is None
+    with profiling.timed('api', 'GET /servers'):
+        pass
+    assert profiling.stop() is None
+
+class FakeHTTPClient(object):
+    def request(self, url, method, **kwargs):
+        time.sleep(0.01)
+        return (url, method)
+
+class FakeClient(object):
+    def __init__(self):
+        self.client = FakeHTTPClient()
+
+def test_profile():
+    client = instrument_client(FakeClient(), 'nova')
+    profile = profiling.start('test_profile')
+    try:
+        assert client.client.request('http://nova/servers/12', 'GET') == \
+            ('http://nova/servers/12', 'GET')
+        client.client.request('http://nova/servers/13', 'GET')
+        with profiling.timed('ssh', 'vmsctl'):
+            time.sleep(0.01)
+        profiling.sleep(0.02, 'wait_for')
+    finally:
+        assert profiling.stop() is profile
+    assert profile.buckets[('api', 'GET /servers/{id}')][0] == 2
+    totals = profile.totals()
+    assert totals['api'] >= 0.02
+    assert totals['ssh'] >= 0.01
+    assert totals['sleep'] >= 0.02
+    assert abs(sum(totals.values()) - profile.wall) < 0.005
+    lines = profile.format_summary()
+    assert lines[0].startswith('test_profile')
+    assert any('GET /servers/{id}' in line for line in lines)
+    stacks = [line.rsplit(' ', 1)[0] for line in profile.folded()]
+    assert stacks == ['test_profile;api;GET /servers/{id}',
+                      'test_profile;sleep;wait_for',
+                      'test_profile;ssh;vmsctl',
+                      'test_profile;other']
+
+def test_dumps():
+    directory = tempfile.mkdtemp()
+    try:
+        profile = profiling.start('test_dumps[ubuntu]',
+                                  os.path.join(directory, 'profiles'))
+        profiling.sleep(0.01, 'wait_for')
+        profiling.stop()
+        files = sorted(os.listdir(os.path.join(directory, 'profiles')))
+        assert files == ['test_dumps_ubuntu_.folded', 'test_dumps_ubuntu_.prof']
+        folded = open(os.path.join(directory, 'profiles',
+                                   'test_dumps_ubuntu_.folded')).read()
+        assert folded.startswith('test_dumps[ubuntu];sleep;wait_for ')
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,157 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import socket
+import threading
+import time
+
+from . logger import log
+
+# Installed into masters by LinuxInstance.setup_params() as the last clone.d
+# hook. Once the clone has an address, it sends a single JSON datagram to
+# the harness (a few times over, it is UDP). Must work on python 2 and 3.
+READY_SCRIPT = """#!/usr/bin/env python
+import json
+import socket
+import subprocess
+import sys
+import time
+
+ADDRESS = (%(host)r, %(port)d)
+
+def addresses():
+    output = subprocess.Popen(['ip', '-o', '-4', 'addr', 'show'],
+                              stdout=subprocess.PIPE).communicate()[0]
+    result = []
+    for line in output.decode('ascii', 'replace').split('\\n'):
+        fields = line.split()
+        if len(fields) >= 4 and fields[2] == 'inet':
+            address = fields[3].split('/')[0]
+            if not address.startswith('127.'):
+                result.append(address)
+    return result
+
+deadline = time.time() + 60
+while len(addresses()) == 0 and time.time() < deadline:
+    time.sleep(0.1)
+
+report = json.dumps({
+    'time': time.time(),
+    'uptime': float(open('/proc/uptime').read().split()[0]),
+    'params': json.loads(sys.argv[2]),
+    'addresses': addresses(),
+})
+sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+for i in range(3):
+    try:
+        sock.sendto(report.encode('utf-8'), ADDRESS)
+    except socket.error:
+        pass
+    time.sleep(0.05)
+"""
+
+READY_HOOK_PATH = '/etc/gridcentric/clone.d/95_grinder_ready'
+
+def parse_address(address):
+    '''Parses a host:port readiness address.'''
+    (host, port) = address.rsplit(':', 1)
+    return (host, int(port))
+
+class ReadinessReport(object):
+
+    '''What a clone reported once its clone.d hooks had run. time and uptime
+    are the guest's clock at that point; received is the harness clock.'''
+
+    def __init__(self, data, source, received):
+        self.time = data['time']
+        self.uptime = data['uptime']
+        self.params = data['params']
+        self.addresses = list(data['addresses'])
+        if source not in self.addresses:
+            self.addresses.append(source)
+        self.received = received
+
+    def __str__(self):
+        return 'ReadinessReport(addresses=%s, uptime=%.3f, received=%.3f)' % \
+            (self.addresses, self.uptime, self.received)
+
+class ReadinessListener(object):
+
+    '''Collects the readiness reports sent by clones. Reports are looked up
+    by any of the clone's addresses; a background thread receives them.'''
+
+    def __init__(self, address):
+        self.address = address
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('', address[1]))
+        self.reports = {}
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        log.debug('Listening for clone readiness on %s:%d' % address)
+
+    def script(self):
+        return READY_SCRIPT % {'host': self.address[0],
+                               'port': self.address[1]}
+
+    def run(self):
+        while True:
+            (data, source) = self.sock.recvfrom(65536)
+            try:
+                report = ReadinessReport(json.loads(data), source[0],
+                                         time.time())
+            except (ValueError, KeyError, TypeError), e:
+                log.warn('Bad readiness report from %s: %s' % (source[0], e))
+                continue
+            log.debug('Got %s' % report)
+            with self.cond:
+                for address in report.addresses:
+                    self.reports[address] = report
+                self.cond.notify_all()
+
+    def find(self, addresses, since):
+        for address in addresses:
+            report = self.reports.get(address)
+            if report is not None and report.received >= since:
+                return report
+        return None
+
+    def wait(self, addresses, since, timeout):
+        '''Waits for a report from any of addresses received after since.
+        Returns None on timeout.'''
+        deadline = time.time() + timeout
+        with self.cond:
+            while True:
+                report = self.find(addresses, since)
+                remaining = deadline - time.time()
+                if report is not None or remaining <= 0:
+                    return report
+                self.cond.wait(remaining)
+
+listeners = {}
+listeners_lock = threading.Lock()
+
+def get_listener(config):
+    '''Returns the listener for config.readiness_address, starting it on
+    first use, or None if readiness reports are disabled.'''
+    if not config.readiness_address:
+        return None
+    address = parse_address(config.readiness_address)
+    with listeners_lock:
+        if address not in listeners:
+            listeners[address] = ReadinessListener(address)
+        return listeners[address]
@@ -0,0 +1,41 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import socket
+import time
+
+from . readiness import ReadinessListener, parse_address
+
+def test_parse_address():
+    assert parse_address('10.0.0.1:9000') == ('10.0.0.1', 9000)
+
+def test_listener():
+    listener = ReadinessListener(('127.0.0.1', 0))
+    port = listener.sock.getsockname()[1]
+    since = time.time()
+    assert listener.wait(['10.1.1.1'], since, 0.01) is None
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.sendto('garbage', ('127.0.0.1', port))
+    sock.sendto(json.dumps({'time': 1.0, 'uptime': 2.0, 'params': {'a': 'b'},
+                            'addresses': ['10.1.1.1']}),
+                ('127.0.0.1', port))
+    report = listener.wait(['10.1.1.1'], since, 5)
+    assert report.params == {'a': 'b'}
+    assert '127.0.0.1' in report.addresses
+    assert report.received >= since
+    # Reports from before the launch do not count.
+    assert listener.wait(['10.1.1.1'], time.time() + 1, 0.01) is None
@@ -0,0 +1,171 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import array
+import bisect
+import threading
+import time
+
+from . logger import log
+from . util import percentile
+
+class Series(object):
+
+    '''A time series of one statistic, backed by compact arrays of doubles
+    (exact for page counts well beyond anything vmsfs reports).'''
+
+    def __init__(self):
+        self.times = array.array('d')
+        self.values = array.array('d')
+
+    def append(self, timestamp, value):
+        self.times.append(timestamp)
+        self.values.append(value)
+
+    def __len__(self):
+        return len(self.times)
+
+    def window(self, start=None, end=None):
+        '''Returns the Window of samples taken between start and end
+        (inclusive timestamps, None for unbounded).'''
+        if start is None:
+            lo = 0
+        else:
+            lo = bisect.bisect_left(self.times, start)
+        if end is None:
+            hi = len(self.times)
+        else:
+            hi = bisect.bisect_right(self.times, end)
+        return Window(self.times[lo:hi], self.values[lo:hi])
+
+class Window(object):
+
+    '''A slice of a Series, with the statistics tests assert on.'''
+
+    def __init__(self, times, values):
+        self.times = times
+        self.values = values
+        if len(self.times) == 0:
+            raise ValueError('No samples in window')
+
+    def first(self):
+        return self.values[0]
+
+    def last(self):
+        return self.values[-1]
+
+    def delta(self):
+        return self.values[-1] - self.values[0]
+
+    def duration(self):
+        return self.times[-1] - self.times[0]
+
+    def rate(self):
+        '''The average change per second across the window.'''
+        if self.duration() <= 0:
+            return 0.0
+        return self.delta() / self.duration()
+
+    def min(self):
+        return min(self.values)
+
+    def max(self):
+        return max(self.values)
+
+    def percentile(self, p):
+        return percentile(self.values, p)
+
+class VmsfsSampler(object):
+
+    '''Reads the vmsfs stats of a set of generations on a host at a fixed
+    rate in a background thread. A genid of None follows the global stats.
+
+    Use mark() to take a sample synchronously and name the point in time,
+    then window() to get a Window of any statistic between two marks:
+
+        with VmsfsSampler(host, [generation]) as sampler:
+            sampler.mark('pre')
+            ...
+            sampler.mark('post')
+            cow = sampler.window(generation, 'sh_cow', 'pre', 'post').delta()
+    '''
+
+    def __init__(self, host, genids, interval=None):
+        self.host = host
+        self.genids = list(genids)
+        if interval is None:
+            interval = host.config.vmsfs_sample_interval
+        self.interval = interval
+        self.series = {}
+        self.marks = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        stats = self.host.get_vmsfs_stats_many(self.genids)
+        # Stamped under the lock, so that samples taken by mark() and by the
+        # background thread are appended in time order.
+        with self.lock:
+            timestamp = time.time()
+            for genid in self.genids:
+                for (key, value) in stats[genid].items():
+                    self.series.setdefault((genid, key), Series()).append(
+                        timestamp, value)
+        return timestamp
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.sample()
+            except Exception, e:
+                log.warn('vmsfs sampling on %s failed: %s' % (self.host, e))
+            self.stopped.wait(self.interval)
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.stop()
+
+    def mark(self, name):
+        self.marks[name] = self.sample()
+
+    def get_series(self, genid, key):
+        with self.lock:
+            return self.series[(genid, key)]
+
+    def window(self, genid, key, start=None, end=None):
+        '''Returns the Window for a statistic between the marks start and
+        end (None for the first or last sample).'''
+        if start is not None:
+            start = self.marks[start]
+        if end is not None:
+            end = self.marks[end]
+        with self.lock:
+            return self.series[(genid, key)].window(start, end)
@@ -0,0 +1,72 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+import time
+
+import pytest
+
+from . sampler import Series, VmsfsSampler
+
+def test_series_window():
+    series = Series()
+    for (t, v) in [(1.0, 10), (2.0, 30), (3.0, 20), (4.0, 70)]:
+        series.append(t, v)
+    window = series.window(2.0, 4.0)
+    assert window.first() == 30
+    assert window.last() == 70
+    assert window.delta() == 40
+    assert window.duration() == 2.0
+    assert window.rate() == 20.0
+    assert window.min() == 20
+    assert window.max() == 70
+    assert window.percentile(50) == 30
+    assert series.window().delta() == 60
+    pytest.raises(ValueError, series.window, 5.0, 6.0)
+
+class FakeHost(object):
+
+    def __init__(self):
+        self.cur_resident = 0
+
+    def get_vmsfs_stats_many(self, genids):
+        self.cur_resident += 100
+        return dict((genid, {'cur_resident': self.cur_resident})
+                    for genid in genids)
+
+def test_sampler_marks():
+    sampler = VmsfsSampler(FakeHost(), ['gen'], interval=1.0)
+    sampler.mark('pre')
+    sampler.sample()
+    sampler.mark('post')
+    window = sampler.window('gen', 'cur_resident', 'pre', 'post')
+    assert window.first() == 100
+    assert window.delta() == 200
+    assert window.max() == 300
+
+def test_sampler_time_order():
+    sampler = VmsfsSampler(FakeHost(), ['gen'], interval=1.0)
+    sampler.mark('pre')
+    # A sample read while another one holds the lock is stamped after it.
+    sampler.lock.acquire()
+    thread = threading.Thread(target=sampler.sample)
+    thread.start()
+    time.sleep(0.05)
+    released = time.time()
+    sampler.lock.release()
+    thread.join()
+    times = sampler.get_series('gen', 'cur_resident').times
+    assert list(times) == sorted(times)
+    assert times[-1] >= released
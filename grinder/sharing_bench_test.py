@@ -0,0 +1,132 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import random
+import time
+
+from . import harness
+from . import requirements
+from . import host
+from . logger import log
+from . benchmark import Benchmark
+from . sampler import VmsfsSampler
+
+# How long all clones run unpaused at each point of the curve, to measure
+# how fast they unshare.
+RUN_SECONDS = 10
+
+class TestSharingBenchmark(harness.TestCase):
+
+    def launch_colocated(self, blessed, clonelist, target_host):
+        '''Launches a paused clone on the same host as the clones in
+        clonelist (on target_host if there are none yet), as test_sharing
+        does.'''
+        if requirements.SCHEDULER_HINTS.check(self.harness.nova):
+            if len(clonelist) == 0:
+                return blessed.launch(paused_on_launch=True)
+            return blessed.launch(scheduler_hints={'same_host': clonelist[0].id},
+                                  paused_on_launch=True)
+        return blessed.launch(availability_zone=target_host.host_az(),
+                              paused_on_launch=True)
+
+    @harness.benchmark
+    @harness.hosttest
+    @harness.requires(requirements.AVAILABILITY_ZONE)
+    def test_sharing_curve(self, image_finder):
+        bench = Benchmark(self.harness, 'sharing_curve')
+        with self.harness.booted(image_finder) as master:
+            flavor_used  = self.harness.nova.flavors.find(
+                                    name=master.image_config.flavor)
+            maxmem_pages = flavor_used.ram * 256
+            target_pages = min(256 * 256, int(0.9 * float(maxmem_pages)))
+            master.allocate_balloon(target_pages)
+            blessed = master.bless()
+
+            target_host = host.Host(random.choice(self.config.hosts),
+                                    self.config)
+            clonelist = []
+            generation = None
+            sampler = None
+            resident = 0
+            allocated = 0
+            try:
+                while len(clonelist) < self.config.benchmark_max_clones:
+                    try:
+                        clone = self.launch_colocated(blessed, clonelist,
+                                                      target_host)
+                    except Exception, e:
+                        log.info('Host %s is full at %d clones: %s' %
+                                 (target_host.id, len(clonelist), e))
+                        break
+                    clonelist.append(clone)
+                    target_host = clone.get_host()
+                    vmsctl = clone.vmsctl()
+                    vmsctl.set_flag("share.enabled")
+                    vmsctl.set_flag("share.onfetch")
+                    vmsctl.clear_flag("zeros.enabled")
+                    # Turn off eviction to prevent it from unpausing the VM.
+                    vmsctl.clear_flag("eviction.enabled")
+                    if generation is None:
+                        generation = vmsctl.generation()
+                        sampler = VmsfsSampler(target_host, [generation])
+                        sampler.start()
+                    else:
+                        assert generation == vmsctl.generation()
+
+                    # Hoard the new clone fully; what that costs the host is
+                    # the clone's share of the generation's memory.
+                    sampler.mark('pre-hoard')
+                    assert vmsctl.full_hoard()
+                    sampler.mark('post-hoard')
+                    resident += sampler.window(generation, 'cur_resident',
+                                               'pre-hoard', 'post-hoard').delta()
+                    allocated += sampler.window(generation, 'cur_allocated',
+                                                'pre-hoard', 'post-hoard').delta()
+                    if len(clonelist) < 2:
+                        continue
+
+                    # Let all clones run for a while and see how fast they
+                    # unshare.
+                    for clone in clonelist:
+                        clone.vmsctl().unpause()
+                    sampler.mark('run-start')
+                    time.sleep(RUN_SECONDS)
+                    for clone in clonelist:
+                        clone.assert_guest_running()
+                    sampler.mark('run-end')
+                    for clone in clonelist:
+                        clone.vmsctl().pause()
+
+                    def rate(key):
+                        return sampler.window(generation, key,
+                                              'run-start', 'run-end').rate()
+                    values = {
+                        'ratio': float(resident) / max(allocated, 1),
+                        'cost_mb': float(allocated) / len(clonelist) / 256,
+                        'sh_cow': sampler.window(generation, 'sh_cow').last(),
+                        'sh_un': sampler.window(generation, 'sh_un').last(),
+                        'sh_cow_rate': rate('sh_cow'),
+                        'sh_un_rate': rate('sh_un'),
+                    }
+                    log.info('Sharing with %d clones on %s: %s' %
+                             (len(clonelist), target_host.id, values))
+                    bench.add({'clones': len(clonelist)}, values)
+            finally:
+                if sampler is not None:
+                    sampler.stop()
+                for clone in clonelist:
+                    clone.delete()
+                blessed.discard()
+        bench.report()
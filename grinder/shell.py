@@ -13,14 +13,39 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
 import select
 import socket
 import subprocess
 import time
 
 from . logger import log
+from . accounting import count
+from . profiling import command_name
+from . profiling import timed
 from . util import wait_for
 
+def check_result(command, returncode, stdout, stderr,
+                 expected_rc, expected_output, exc):
+    '''Checks the outcome of a command run by a shell's check_output() and
+    returns its stripped (stdout, stderr). See SecureShell.check_output.'''
+    (stdout, stderr) = (stdout.strip(), stderr.strip())
+    if (expected_rc != None and expected_rc != returncode) or \
+       (expected_output != None and stdout != expected_output):
+        errormsg = 'Command failed: %s\n' \
+                   'returncode: %d\n' \
+                   '-------------------------\n' \
+                   'stdout:\n%s\n' \
+                   '-------------------------\n' \
+                   'stderr:\n%s' % (command, returncode, stdout, stderr)
+        if exc:
+            raise Exception(errormsg)
+        log.error(errormsg)
+        assert (expected_rc == None or expected_rc == returncode)
+        assert (expected_output == None or expected_output == stdout)
+
+    return (stdout, stderr)
+
 class SecureShell(object):
 
     def __init__(self, host, key_path, user, port):
@@ -48,32 +73,38 @@ class SecureShell(object):
                      expected_rc=0, expected_output=None,
                      exc=False):
         # Run the given command through a shell on the other end.
+        name = command_name(command)
+        count('ssh', '%s %s' % (self.host, name))
+        command = self.ssh_args() + ['sh', '-c', "'%s'" % command]
+        with timed('ssh', name):
+            ssh = subprocess.Popen(command,
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   close_fds=True)
+
+            # Always execute the command in one go, we don't support
+            # running long running commands in the test framework.
+            (stdout, stderr) = ssh.communicate(input)
+        return check_result(" ".join(command), ssh.returncode, stdout, stderr,
+                            expected_rc, expected_output, exc)
+
+    def popen(self, command):
+        '''Starts the given command through a shell on the other end and
+        returns the Popen object without waiting. This is for commands that
+        stream their output back over the ssh channel; the caller reads from
+        stdout and terminates the process when done.'''
+        count('ssh', '%s %s' % (self.host, command_name(command)))
         command = self.ssh_args() + ['sh', '-c', "'%s'" % command]
-        ssh = subprocess.Popen(command,
-                               stdin=subprocess.PIPE,
-                               stdout=subprocess.PIPE,
-                               stderr=subprocess.PIPE,
-                               close_fds=True)
-
-        # Always execute the command in one go, we don't support
-        # running long running commands in the test framework.
-        (stdout, stderr) = ssh.communicate(input)
-        (stdout, stderr) = (stdout.strip(), stderr.strip())
-        if (expected_rc != None and expected_rc != ssh.returncode) or \
-           (expected_output != None and stdout != expected_output):
-            errormsg = 'Command failed: %s\n' \
-                       'returncode: %d\n' \
-                       '-------------------------\n' \
-                       'stdout:\n%s\n' \
-                       '-------------------------\n' \
-                       'stderr:\n%s' % (" ".join(command), ssh.returncode, stdout, stderr)
-            if exc:
-                raise Exception(errormsg)
-            log.error(errormsg)
-            assert (expected_rc == None or expected_rc == ssh.returncode)
-            assert (expected_output == None or expected_output == stdout)
-
-        return (stdout, stderr)
+        devnull = open(os.devnull, 'w')
+        try:
+            return subprocess.Popen(command,
+                                    stdin=subprocess.PIPE,
+                                    stdout=subprocess.PIPE,
+                                    stderr=devnull,
+                                    close_fds=True)
+        finally:
+            devnull.close()
 
     def is_alive(self):
         '''Runs a dummy command through the shell. Returns True if the
@@ -100,6 +131,22 @@ class RootShell(SecureShell):
     def ssh_args(self):
         return super(RootShell,self).ssh_args() + self.sudo
 
+def secure_shell(config, host, key_path, user):
+    '''Returns a SecureShell to host, or a simulated one if config.sim_shell
+    is set (see simshell.py).'''
+    if config.sim_shell:
+        from . simshell import SimShell
+        return SimShell(config, host)
+    return SecureShell(host, key_path, user, config.ssh_port)
+
+def root_shell(config, host, key_path, user):
+    '''Returns a RootShell to host, or a simulated one if config.sim_shell
+    is set. Simulated shells always run commands as root.'''
+    if config.sim_shell:
+        from . simshell import SimShell
+        return SimShell(config, host)
+    return RootShell(host, key_path, user, config.ssh_port)
+
 def wait_for_shell(shell):
     wait_for('shell %s to respond' % shell.host, shell.is_alive)
 
@@ -129,6 +176,12 @@ class WinShell(object):
                     raise
 
     def check_output(self, command, expected_output="ok", timeout=60):
+        name = command_name(command)
+        count('ssh', '%s %s' % (self.host, name))
+        with timed('link', name):
+            return self._check_output(command, expected_output, timeout)
+
+    def _check_output(self, command, expected_output, timeout):
         sock = self._connect()
         try:
             log.debug("Link I: %s" % command)
@@ -0,0 +1,936 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+'''A simulator of the hosts and Linux guests of the fake cloud, so that host
+and guest commands can run without ssh.
+
+With config.sim_shell set (which needs config.fake_cloud), secure_shell()
+and root_shell() return SimShells. They answer the commands grinder sends
+to hosts (ps, vmsctl, /sys/fs/vmsfs, ip addr, iptables-save, /proc/stat)
+and to guests (files, tmpfs, /proc/partitions, md5sum, the agent and the
+guest helper's operations) from a single SimWorld. The world runs a vms
+process for every server of the fake cloud on its host, each with a simple
+memory model: pages are faulted in as the clone runs and by hoarding,
+evicted down to the target, shared within a generation and unshared as
+clones run or write. Model rates are per simulated second, and simulated
+time runs time_scale times faster than the wall clock, so that hoards and
+evictions of real flavors take moments and the memory, sharing and
+migration tests can be run over and over to find the harness' hot spots.
+
+Only the commands grinder itself sends are understood; anything else fails
+with return code 127.
+'''
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from . logger import log
+from . accounting import count
+from . balloon import BalloonFingerprint
+from . breadcrumbs import chain_digest
+from . fakecloud import get_fake_cloud
+from . fakecloud import parse_settings
+from . profiling import command_name
+from . profiling import timed
+from . shell import check_result
+
+# The memory model and timings. Pages and rates are per simulated second,
+# except where noted.
+DEFAULT_MODEL = {
+    # Simulated seconds per wall clock second.
+    'time_scale': 100.0,
+    # Wall clock seconds of every command, for its round trip.
+    'ssh': 0.0,
+    # Pages a clone has when it comes up; a running clone faults in more at
+    # fetch_rate until it has working_set of its memory.
+    'launch_pages': 2048,
+    'fetch_rate': 2000.0,
+    'working_set': 0.25,
+    # How fast eviction gets a vms down to its target.
+    'evict_rate': 50000.0,
+    # The fraction of the pages fetched with share.onfetch that are shared
+    # with the generation, and how fast a running clone unshares them.
+    'share_fraction': 0.95,
+    'cow_rate': 200.0,
+    # The fraction of its memory the agent finds free on dropall.
+    'free_fraction': 0.6,
+    # Pages a guest reads from its balloon while all of it is resident;
+    # reads slow down in proportion to what is evicted.
+    'walk_rate': 200000.0,
+    # The guest-visible pause of a migration and the time each clone hook
+    # takes, in wall clock seconds.
+    'downtime': 0.1,
+    'hook_time': 0.05,
+}
+
+# What vmsctl set and get accept, with their initial values. pages,
+# generation, memory.current, memory.complete and eviction.pagedout are
+# read-only and come from the memory model.
+VMS_PARAMS = {
+    'memory.hole': 0,
+    'memory.target': 0,
+    'hoard': 0,
+    'hoard.rate': 0,
+    'zeros.enabled': 1,
+    'share.enabled': 0,
+    'share.onfetch': 0,
+    'eviction.enabled': 1,
+    'eviction.paging': 0,
+    'eviction.sharing': 0,
+    'eviction.dropshared': 0,
+    'eviction.dropdirty': 0,
+    'eviction.dropclean': 1,
+    'stats.enabled': 0,
+    'stats.eviction.drop.freepgsize.max': 0,
+}
+
+HOST_CPUS = 8
+HOST_KEY = 'ssh-rsa AAAAB3NzaC1yc2EAAAADAQABAAABAQDsim grinder@simguest'
+
+def parse_target(target):
+    try:
+        return int(target)
+    except (TypeError, ValueError):
+        return 0
+
+class SimVms(object):
+
+    '''The vms process of one server. current counts its resident pages, of
+    which shared are shared with its generation.'''
+
+    def __init__(self, world, record, pid):
+        self.world = world
+        self.id = record.id
+        self.raw_id = record.raw_id
+        self.host = record.host
+        self.pid = pid
+        self.migrations = 0
+        self.status = record.status
+        self.pages = world.flavor_pages(record)
+        self.generation = world.generation_of(record)
+        self.params = dict(VMS_PARAMS)
+        if self.generation is None:
+            # A booted master is fully resident and not managed by vmsd.
+            self.current = float(self.pages)
+            self.params['eviction.enabled'] = 0
+        else:
+            self.current = float(min(world.model['launch_pages'], self.pages))
+            self.params['memory.target'] = \
+                parse_target(record.metadata.get('target'))
+        self.shared = 0.0
+        self.pagedout = 0.0
+        self.sh_cow = 0.0
+        self.sh_un = 0.0
+        # Set by vmsctl pause and unpause, until nova changes the status.
+        self.paused = None
+        self.updated = time.time()
+
+    def is_paused(self):
+        if self.paused is not None:
+            return self.paused
+        return self.status == 'PAUSED'
+
+    def max_memory(self):
+        return self.pages - self.params['memory.hole']
+
+    def fetch(self, pages, share=True):
+        if pages <= 0:
+            return
+        self.current += pages
+        if share and self.params['share.enabled'] and \
+           self.params['share.onfetch']:
+            self.shared += pages * self.world.model['share_fraction']
+        self.world.host(self.host).net_rx += long(pages) * 4096
+
+    def evict(self, pages, paging=False):
+        if pages <= 0 or self.current <= 0:
+            return
+        self.shared -= self.shared * pages / self.current
+        self.current -= pages
+        if paging:
+            self.pagedout += pages
+            self.world.host(self.host).net_tx += long(pages) * 4096
+
+    def write(self, pages):
+        '''The guest writes pages: shared ones are unshared and missing ones
+        are faulted in.'''
+        unshared = min(pages, self.shared)
+        self.shared -= unshared
+        self.sh_un += unshared
+        self.fetch(min(pages, self.max_memory() - self.current), share=False)
+
+    def advance(self, now):
+        model = self.world.model
+        elapsed = (now - self.updated) * model['time_scale']
+        self.updated = now
+        if elapsed <= 0:
+            return
+        params = self.params
+        running = not self.is_paused()
+        maxmem = self.max_memory()
+        fetched = 0.0
+        if params['hoard'] and params['hoard.rate'] > 0:
+            fetched += params['hoard.rate'] * elapsed
+        working_set = model['working_set'] * maxmem
+        if running and self.current < working_set:
+            fetched += min(model['fetch_rate'] * elapsed,
+                           working_set - self.current)
+        self.fetch(max(0.0, min(fetched, maxmem - self.current)))
+        target = params['memory.target']
+        if params['eviction.enabled'] and target > 0 and \
+           self.current >= target:
+            self.evict(min(model['evict_rate'] * elapsed,
+                           self.current - (target - 1)),
+                       paging=bool(params['eviction.paging']))
+        if running and self.shared > 0:
+            cow = min(model['cow_rate'] * elapsed, self.shared)
+            self.shared -= cow
+            self.sh_cow += cow
+
+    def dropall(self):
+        if not self.params['eviction.enabled']:
+            return
+        freed = min(self.current,
+                    self.world.model['free_fraction'] * self.max_memory())
+        self.evict(freed)
+        self.params['stats.eviction.drop.freepgsize.max'] = int(freed)
+
+    def get(self, key):
+        if key == 'pages':
+            return self.pages
+        if key == 'generation':
+            return self.generation or '0'
+        if key == 'memory.current':
+            return int(self.current)
+        if key == 'memory.complete':
+            return int(self.current >= self.max_memory())
+        if key == 'eviction.pagedout':
+            return int(self.pagedout)
+        return self.params[key]
+
+    def set(self, key, value):
+        if key not in self.params:
+            raise KeyError(key)
+        self.params[key] = int(value)
+
+    def info(self):
+        keys = self.params.keys() + ['pages', 'generation', 'memory.current',
+                                     'memory.complete', 'eviction.pagedout']
+        return dict((key, str(self.get(key))) for key in keys)
+
+class SimHost(object):
+
+    '''A host: its address, cpu and network counters and the commands sent
+    to it.'''
+
+    COMMANDS = [
+        (r'true$', 'cmd_true'),
+        (r'whoami$', 'cmd_whoami'),
+        (r'ps -eo pid=,args=$', 'cmd_ps'),
+        (r'ls /sys/fs/vmsfs$', 'cmd_ls_vmsfs'),
+        (r'cat /sys/fs/vmsfs/(\S+)$', 'cmd_cat_vmsfs'),
+        (r'for f in (.*); do echo "== \$f"; cat /sys/fs/vmsfs/\$f; done$',
+         'cmd_cat_vmsfs_many'),
+        (r'head -1 /proc/stat; cat /proc/net/dev; '
+         r'ls -d /sys/class/net/\*/device 2>/dev/null \|\| true$',
+         'cmd_counters'),
+        (r'ip addr \| grep "inet "$', 'cmd_ip_addr'),
+        (r'ip addr \| grep "inet "; echo "(.*)"; '
+         r'iptables-save -t filter \|\| true$', 'cmd_iptables'),
+        (r'vmsctl (\S+) (\d+) ?(.*)$', 'cmd_vmsctl'),
+    ]
+
+    def __init__(self, world, name, address):
+        self.world = world
+        self.name = name
+        self.address = address
+        self.cpu_total = 0.0
+        self.cpu_busy = 0.0
+        self.net_rx = 0L
+        self.net_tx = 0L
+        self.updated = time.time()
+
+    def vmses(self):
+        return [vms for vms in self.world.vmses.values()
+                if vms.host == self.name]
+
+    def advance(self, now):
+        elapsed = now - self.updated
+        self.updated = now
+        running = len([vms for vms in self.vmses() if not vms.is_paused()])
+        self.cpu_total += elapsed * 100 * HOST_CPUS
+        self.cpu_busy += elapsed * 100 * min(running, HOST_CPUS)
+
+    def cmd_true(self):
+        return (0, '', '')
+
+    def cmd_whoami(self):
+        return (0, 'root', '')
+
+    def cmd_ps(self):
+        lines = ['    1 /sbin/init', '    2 [kthreadd]',
+                 '  812 /usr/sbin/sshd -D', '  907 /usr/bin/vmsd']
+        for vms in sorted(self.vmses(), key=lambda vms: vms.pid):
+            lines.append('%5d /usr/bin/qemu-system-x86_64 '
+                         '-name guest=instance-%08x,debug-threads=on '
+                         '-m %d -smp 1 -nographic' %
+                         (vms.pid, vms.raw_id, vms.pages / 256))
+        return (0, '\n'.join(lines), '')
+
+    def generations(self):
+        generations = {}
+        for vms in self.vmses():
+            if vms.generation is not None:
+                generations.setdefault(vms.generation, []).append(vms)
+        return generations
+
+    def vmsfs_stats(self, vmses):
+        shared = max([vms.shared for vms in vmses] or [0.0])
+        return [('cur_resident', sum(vms.current for vms in vmses)),
+                ('cur_allocated',
+                 sum(vms.current - vms.shared for vms in vmses) + shared),
+                ('cur_shared', shared),
+                ('sh_cow', sum(vms.sh_cow for vms in vmses)),
+                ('sh_un', sum(vms.sh_un for vms in vmses))]
+
+    def vmsfs_file(self, name):
+        generations = self.generations()
+        if name == 'stats':
+            vmses = sum(generations.values(), [])
+        elif name in generations:
+            vmses = generations[name]
+        else:
+            return None
+        return '\n'.join(['%s: %d - pages' % (key, long(value))
+                          for (key, value) in self.vmsfs_stats(vmses)])
+
+    def cmd_ls_vmsfs(self):
+        return (0, '\n'.join(sorted(self.generations().keys()) + ['stats']),
+                '')
+
+    def cmd_cat_vmsfs(self, name):
+        stats = self.vmsfs_file(name)
+        if stats is None:
+            return (1, '', 'cat: /sys/fs/vmsfs/%s: No such file or directory' %
+                           name)
+        return (0, stats, '')
+
+    def cmd_cat_vmsfs_many(self, names):
+        (out, err) = ([], [])
+        for name in names.split():
+            out.append('== %s' % name)
+            stats = self.vmsfs_file(name)
+            if stats is None:
+                err.append('cat: /sys/fs/vmsfs/%s: No such file or directory' %
+                           name)
+            else:
+                out.append(stats)
+        return (err and 1 or 0, '\n'.join(out), '\n'.join(err))
+
+    def cmd_counters(self):
+        stat = 'cpu  %d 0 0 %d 0 0 0 0 0 0' % \
+            (self.cpu_busy, self.cpu_total - self.cpu_busy)
+        dev = ['Inter-|   Receive                |  Transmit',
+               ' face |bytes    packets errs drop|bytes    packets errs drop',
+               '    lo: 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0',
+               '  eth0: %d 0 0 0 0 0 0 0 %d 0 0 0 0 0 0 0' %
+                    (self.net_rx, self.net_tx),
+               # The bridge over eth0 sees the same traffic.
+               '   br0: %d 0 0 0 0 0 0 0 %d 0 0 0 0 0 0 0' %
+                    (self.net_rx, self.net_tx)]
+        devices = ['/sys/class/net/eth0/device']
+        return (0, '\n'.join([stat] + dev + devices), '')
+
+    def ip_addr(self):
+        return '\n'.join([
+            '    inet 127.0.0.1/8 scope host lo',
+            '    inet %s/24 brd 192.168.100.255 scope global eth0' %
+                self.address])
+
+    def cmd_ip_addr(self):
+        return (0, self.ip_addr(), '')
+
+    def cmd_iptables(self, separator):
+        local = []
+        chains = []
+        for vms in sorted(self.vmses(), key=lambda vms: vms.raw_id):
+            record = self.world.records.get(vms.id)
+            if record is None:
+                continue
+            chain = 'nova-compute-inst-%d' % vms.raw_id
+            chains.append(':%s - [0:0]' % chain)
+            for address in record.addresses:
+                local.append('-A nova-compute-local -d %s/32 -j %s' %
+                             (address, chain))
+            chains.extend([
+                '-A %s -m state --state INVALID -j DROP' % chain,
+                '-A %s -m state --state RELATED,ESTABLISHED -j ACCEPT' % chain,
+                '-A %s -s %s/32 -p udp -m udp --sport 67 --dport 68 '
+                    '-j ACCEPT' % (chain, self.address)])
+            for rule in self.world.security_rules(record):
+                chains.append('-A %s %s' % (chain, rule))
+            chains.append('-A %s -j nova-compute-sg-fallback' % chain)
+        rules = ['*filter', ':INPUT ACCEPT [0:0]', ':FORWARD ACCEPT [0:0]',
+                 ':OUTPUT ACCEPT [0:0]', ':nova-compute-local - [0:0]',
+                 ':nova-compute-sg-fallback - [0:0]'] + local + chains + \
+                ['-A nova-compute-sg-fallback -j DROP', 'COMMIT']
+        return (0, '\n'.join([self.ip_addr(), separator] + rules), '')
+
+    def cmd_vmsctl(self, command, pid, args):
+        vms = None
+        for candidate in self.vmses():
+            if candidate.pid == int(pid):
+                vms = candidate
+        if vms is None:
+            return (1, '', 'vmsctl: no vms with pid %s' % pid)
+        args = args.split()
+        try:
+            if command == 'get':
+                return (0, str(vms.get(args[0])), '')
+            if command == 'set':
+                vms.set(args[0], args[1])
+            elif command == 'info':
+                return (0, '%d: %r' % (vms.pid, vms.info()), '')
+            elif command == 'pause':
+                vms.paused = True
+            elif command == 'unpause':
+                vms.paused = False
+            elif command == 'dropall':
+                vms.dropall()
+            else:
+                return (1, '', 'vmsctl: unknown command %s' % command)
+        except (KeyError, IndexError, ValueError), e:
+            return (1, '', 'vmsctl: bad arguments %s: %s' % (args, e))
+        return (0, '', '')
+
+class SimWatcher(object):
+
+    '''What popen() returns for the vmsctl sampling loop of Vmsctl.watch():
+    a thread writes the samples to a pipe until terminated.'''
+
+    def __init__(self, world, host, params, interval):
+        self.world = world
+        self.host = host
+        self.params = params
+        self.interval = interval
+        (read, self.write) = os.pipe()
+        self.stdout = os.fdopen(read, 'rb', 0)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        self.returncode = None
+
+    def sample(self):
+        values = []
+        with self.world.lock:
+            self.world.sync()
+            for (pid, param) in self.params:
+                (rc, out, err) = self.world.hosts[self.host].cmd_vmsctl(
+                    'get', pid, param)
+                values.append(out)
+        return '%.9f %s\n' % (time.time(), ' '.join(values))
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                os.write(self.write, self.sample())
+                self.stopped.wait(self.interval)
+        except OSError:
+            pass
+        finally:
+            os.close(self.write)
+
+    def terminate(self):
+        self.stopped.set()
+
+    def wait(self):
+        # Closing our end first stops a writer stuck on a full pipe.
+        self.stdout.close()
+        self.thread.join()
+        self.returncode = 0
+        return self.returncode
+
+class SimGuest(object):
+
+    '''A Linux guest: its files, tmpfs balloons and breadcrumb trails, and
+    the commands sent to it. A clone starts with a copy of its master's.'''
+
+    COMMANDS = [
+        (r'true$', 'cmd_true'),
+        (r'whoami$', 'cmd_whoami'),
+        (r'uptime$', 'cmd_uptime'),
+        (r'ps aux$', 'cmd_true'),
+        (r'find / > /dev/null$', 'cmd_true'),
+        (r'mkdir -p (\S+)$', 'cmd_true'),
+        (r'cat > (\S+)$', 'cmd_write'),
+        (r'chmod a\+x (\S+)$', 'cmd_chmod'),
+        (r'cat (\S+)$', 'cmd_cat'),
+        (r'md5sum (\S+)$', 'cmd_md5sum'),
+        (r'mount -o remount,size=(\d+) /dev/shm$', 'cmd_remount'),
+        (r'pidof vmsagent$', 'cmd_pidof_agent'),
+        (r'\s*dpkg -r vms-agent ', 'cmd_remove_agent'),
+        (r'curl http://169.254.169.254/latest/user-data 2>/dev/null$',
+         'cmd_userdata'),
+        (r'if \[ -e (\S+) \]; then python \S+; else echo (\S+); fi$',
+         'cmd_helper'),
+    ]
+
+    def __init__(self, world, record, master=None):
+        self.world = world
+        self.id = record.id
+        self.booted = time.time()
+        if master is None:
+            self.files = {'/etc/ssh/ssh_host_rsa_key.pub': HOST_KEY,
+                          '/tmp/curr_ssh_key': HOST_KEY}
+            self.executable = set()
+            self.balloons = {}
+            self.trails = {}
+            # Half of memory, as tmpfs defaults to.
+            self.tmpfs_size = world.flavor_pages(record) * 4096 / 2
+            self.agent_removed = None
+            self.inherited = []
+            # The primed test file on each device.
+            self.disks = {}
+        else:
+            self.files = dict(master.files)
+            self.executable = set(master.executable)
+            self.balloons = dict(master.balloons)
+            self.trails = dict((path, (list(trail), digest)) for
+                               (path, (trail, digest)) in master.trails.items())
+            self.tmpfs_size = master.tmpfs_size
+            self.agent_removed = master.agent_removed
+            # Clones get copies of the master's volumes.
+            self.inherited = [(device, pages) for (device, volume, pages)
+                              in master.devices() if device != '/dev/vda']
+            self.disks = dict(master.disks)
+        self.tasks = {}
+        self.next_pid = 2000
+
+    def record(self):
+        return self.world.records[self.id]
+
+    def vms(self):
+        return self.world.vmses.get(self.id)
+
+    def cmd_true(self, *args):
+        return (0, '', '')
+
+    def cmd_whoami(self):
+        return (0, 'root', '')
+
+    def cmd_uptime(self):
+        return (0, ' up %d min,  0 users,  load average: 0.00, 0.00, 0.00' %
+                   ((time.time() - self.booted) / 60), '')
+
+    def cmd_write(self, path, input):
+        self.files[path] = input or ''
+        return (0, '', '')
+
+    def cmd_chmod(self, path):
+        if path not in self.files:
+            return (1, '', 'chmod: cannot access %s' % path)
+        self.executable.add(path)
+        return (0, '', '')
+
+    def read(self, path):
+        if path == '/proc/partitions':
+            return self.partitions()
+        if path == '/proc/uptime':
+            uptime = time.time() - self.booted
+            return '%.2f %.2f' % (uptime, uptime)
+        return self.files.get(path)
+
+    def cmd_cat(self, path):
+        data = self.read(path)
+        if data is None:
+            return (1, '', 'cat: %s: No such file or directory' % path)
+        return (0, data, '')
+
+    def cmd_md5sum(self, path):
+        data = self.read(path)
+        if data is None:
+            return (1, '', 'md5sum: %s: No such file or directory' % path)
+        return (0, '%s  %s' % (hashlib.md5(data).hexdigest(), path), '')
+
+    def cmd_remount(self, size):
+        self.tmpfs_size = int(size)
+        return (0, '', '')
+
+    def agent_running(self):
+        installs = getattr(self.record(), 'agent_installs', 0)
+        return self.agent_removed is None or installs > self.agent_removed
+
+    def cmd_pidof_agent(self):
+        if self.agent_running():
+            return (0, '1234', '')
+        return (1, '', '')
+
+    def cmd_remove_agent(self):
+        self.agent_removed = getattr(self.record(), 'agent_installs', 0)
+        return (0, '', '')
+
+    def cmd_userdata(self):
+        return (0, self.record().metadata.get('user_data') or '', '')
+
+    def cmd_helper(self, path, missing, input):
+        if path not in self.files:
+            return (0, missing, '')
+        try:
+            request = json.loads(input)
+            args = dict((str(key), value)
+                        for (key, value) in request.get('args', {}).items())
+            op = getattr(self, 'op_%s' % request['op'].replace('-', '_'))
+            response = {'result': op(**args)}
+        except Exception, e:
+            response = {'error': '%s: %s' % (e.__class__.__name__, e)}
+        return (0, json.dumps(response), '')
+
+    def devices(self):
+        '''Returns (device, volume id, pages) for each disk the guest sees;
+        the volume id is None for the root disk and inherited volumes.'''
+        record = self.record()
+        devices = [('/dev/vda', None, self.world.flavor_pages(record) * 8)]
+        devices.extend([(device, None, pages)
+                        for (device, pages) in self.inherited])
+        for volume in self.world.cloud.live(self.world.cloud.volumes):
+            if volume.server_id == record.id and volume.status == 'in-use':
+                devices.append((volume.device, volume.id,
+                                volume.size * 256 * 1024))
+        return devices
+
+    def partitions(self):
+        lines = ['major minor  #blocks  name', '']
+        for (i, (device, volume, pages)) in enumerate(self.devices()):
+            lines.append(' 253 %5d %10d %s' %
+                         (i * 16, pages * 4, os.path.basename(device)))
+        return '\n'.join(lines)
+
+    def check_device(self, device):
+        if device == '/dev/vda' or \
+           device not in [name for (name, volume, pages) in self.devices()]:
+            raise IOError('%s: No such device' % device)
+
+    def digests(self, fingerprint, indexes):
+        result = {}
+        for index in indexes:
+            if index < fingerprint.chunks():
+                result[str(index)] = fingerprint.chunk_digest(index)
+            else:
+                result[str(index)] = hashlib.md5('').hexdigest()
+        return result
+
+    # The guest helper's operations, see guesthelper.py.
+
+    def op_list_devices(self):
+        lines = self.partitions().split('\n')[2:]
+        return ['/dev/%s' % line.split()[-1] for line in lines if line.strip()]
+
+    def op_drop_caches(self):
+        return None
+
+    def op_prime_volume(self, device, seed, pages):
+        self.check_device(device)
+        self.disks[device] = BalloonFingerprint(seed, pages)
+
+    def op_verify_volume(self, device, indexes):
+        self.check_device(device)
+        fingerprint = self.disks.pop(device, None)
+        if fingerprint is None:
+            raise IOError('%s: test.file not found' % device)
+        return self.digests(fingerprint, indexes)
+
+    def op_balloon_fill(self, path, seed, pages):
+        if pages * 4096 > self.tmpfs_size:
+            raise IOError('%s: No space left on device' % path)
+        self.balloons[path] = BalloonFingerprint(seed, pages)
+        vms = self.vms()
+        if vms is not None:
+            vms.write(pages)
+
+    def op_balloon_digest(self, path, indexes):
+        if path not in self.balloons:
+            raise IOError('%s: No such file or directory' % path)
+        return self.digests(self.balloons[path], indexes)
+
+    def op_breadcrumb_add(self, path, text):
+        (trail, digest) = self.trails.get(path, ([], ''))
+        trail.append(text)
+        digest = chain_digest(digest, text)
+        self.trails[path] = (trail, digest)
+        return (len(trail), digest)
+
+    def op_breadcrumb_list(self, path):
+        if path not in self.trails:
+            return None
+        return self.trails[path][0]
+
+    def op_read_params(self):
+        metadata = self.record().metadata
+        if 'launched_from' not in metadata:
+            raise IOError('/tmp/clone.log: No such file or directory')
+        return metadata.get('guest') or {}
+
+    def op_wrap_hooks(self, hooks, timed, log):
+        wrapped = []
+        for path in sorted(self.executable):
+            (directory, name) = os.path.split(path)
+            if directory != hooks or name == '00_grinder_resume' or \
+               self.files.get(path) == 'wrapped':
+                continue
+            self.files[os.path.join(timed, name)] = self.files[path]
+            self.files[path] = 'wrapped'
+            wrapped.append(name)
+        resume = os.path.join(hooks, '00_grinder_resume')
+        self.files[resume] = 'wrapped'
+        self.executable.add(resume)
+        return wrapped
+
+    def op_hook_timeline(self, log):
+        if 'launched_from' not in self.record().metadata:
+            return []
+        hooks = sorted(os.path.basename(path) for path in self.executable
+                       if self.files.get(path) == 'wrapped')
+        timeline = []
+        step = self.world.model['hook_time']
+        for (i, name) in enumerate([name for name in hooks
+                                    if name != '00_grinder_resume']):
+            timeline.append({'hook': name, 'start': round(i * step, 2),
+                             'end': round((i + 1) * step, 2), 'rc': 0})
+        return timeline
+
+    def start_task(self, **state):
+        pid = self.next_pid
+        self.next_pid += 1
+        vms = self.vms()
+        state.update({'start': time.time(),
+                      'migrations': vms and vms.migrations})
+        self.tasks[pid] = state
+        return pid
+
+    def op_heartbeat_start(self, path, interval):
+        return self.start_task(path=path, interval=interval)
+
+    def op_heartbeat_stop(self, path, pid):
+        task = self.tasks.pop(pid)
+        elapsed = time.time() - task['start']
+        max_gap = task['interval']
+        vms = self.vms()
+        if vms is not None and vms.migrations != task['migrations']:
+            max_gap += self.world.model['downtime']
+        return {'beats': max(1, int(elapsed / task['interval'])),
+                'max_gap': round(max_gap, 2)}
+
+    def op_memwalk_start(self, path, log, pages, interval):
+        if path not in self.balloons:
+            raise IOError('%s: No such file or directory' % path)
+        return self.start_task(path=path, pages=pages, interval=interval)
+
+    def op_memwalk_stop(self, log, pid):
+        task = self.tasks.pop(pid)
+        samples = int((time.time() - task['start']) / task['interval'])
+        if samples < 2:
+            return {'rate': 0.0, 'min_rate': 0.0, 'samples': samples}
+        model = self.world.model
+        resident = 1.0
+        vms = self.vms()
+        if vms is not None:
+            resident = min(1.0, vms.current / vms.max_memory())
+        rate = model['walk_rate'] * model['time_scale'] * resident
+        return {'rate': rate, 'min_rate': rate, 'samples': samples}
+
+class SimWorld(object):
+
+    '''The simulated hosts, their vms processes and the guests of the fake
+    cloud's servers. sync() brings them up to date with the cloud: vms
+    processes come and go with the servers, and get a new pid when their
+    server changes host.'''
+
+    def __init__(self, cloud, model=None):
+        self.cloud = cloud
+        self.model = dict(DEFAULT_MODEL)
+        self.model.update(model or {})
+        self.lock = threading.RLock()
+        self.hosts = {}
+        for (i, name) in enumerate(cloud.hosts):
+            self.hosts[name] = SimHost(self, name, '192.168.100.%d' % (i + 1))
+        self.records = {}
+        self.vmses = {}
+        self.guests = {}
+        self.next_pid = 10000
+
+    def host(self, name):
+        return self.hosts[name]
+
+    def flavor_pages(self, record):
+        for flavor in self.cloud.flavors:
+            if flavor.id == record.flavor:
+                return flavor.ram * 256
+        return 512 * 256
+
+    def generation_of(self, record):
+        blessed = self.records.get(record.metadata.get('launched_from'))
+        if blessed is None:
+            return None
+        return str(blessed.raw_id)
+
+    def security_rules(self, record):
+        rules = []
+        for group in self.cloud.security_groups.values():
+            if group.name not in record.security_groups:
+                continue
+            for rule in group.rules:
+                rules.append('-s %s -p %s -m %s --dport %s:%s -j ACCEPT' %
+                             (rule['cidr'] or '0.0.0.0/0', rule['ip_protocol'],
+                              rule['ip_protocol'], rule['from_port'],
+                              rule['to_port']))
+        return rules
+
+    def sync(self):
+        now = time.time()
+        records = self.cloud.live(self.cloud.servers)
+        self.records = dict((record.id, record) for record in records)
+        for record in records:
+            master = self.guests.get(record.metadata.get('blessed_from'))
+            if master is not None and record.id not in self.guests:
+                # Clones start from the guest as it was when blessed.
+                self.guests[record.id] = SimGuest(self, record, master)
+            if 'blessed_from' in record.metadata or record.status == 'ERROR' \
+               or record.host not in self.hosts:
+                continue
+            vms = self.vmses.get(record.id)
+            if vms is None:
+                vms = SimVms(self, record, self.next_pid)
+                self.next_pid += 1
+                self.vmses[record.id] = vms
+            vms.advance(now)
+            if vms.host != record.host:
+                vms.host = record.host
+                vms.pid = self.next_pid
+                vms.migrations += 1
+                self.next_pid += 1
+            if vms.status != record.status:
+                vms.status = record.status
+                vms.paused = None
+        for table in (self.vmses, self.guests):
+            for id in table.keys():
+                if id not in self.records:
+                    del table[id]
+        for host in self.hosts.values():
+            host.advance(now)
+
+    def guest(self, address):
+        for record in self.records.values():
+            if address not in record.addresses:
+                continue
+            if record.id not in self.guests:
+                master = self.guests.get(record.metadata.get('launched_from'))
+                self.guests[record.id] = SimGuest(self, record, master)
+            return self.guests[record.id]
+        return None
+
+    def run(self, target, command, input=None):
+        '''Runs command on the host or guest named target and returns its
+        (returncode, stdout, stderr).'''
+        with self.lock:
+            self.sync()
+            if target in self.hosts:
+                (handler, commands) = (self.hosts[target], SimHost.COMMANDS)
+            else:
+                handler = self.guest(target)
+                if handler is None:
+                    return (255, '', 'ssh: connect to host %s port 22: '
+                                     'No route to host' % target)
+                commands = SimGuest.COMMANDS
+            for (pattern, method) in commands:
+                match = re.match(pattern, command)
+                if match is None:
+                    continue
+                args = match.groups()
+                if method in ('cmd_write', 'cmd_helper'):
+                    args += (input,)
+                return getattr(handler, method)(*args)
+            log.debug('Simulated %s cannot run: %s' % (target, command))
+            return (127, '', 'sh: unsupported command: %s' % command)
+
+    WATCH = r'while true; do echo "\$\(date \+%s\.%N\) (.*)"; ' \
+            r'sleep (\S+); done$'
+
+    def popen(self, target, command):
+        '''Starts the vmsctl sampling loop of Vmsctl.watch(), the only
+        command grinder streams.'''
+        match = re.match(self.WATCH, command)
+        if match is None or target not in self.hosts:
+            raise ValueError('Simulated %s cannot stream: %s' %
+                             (target, command))
+        params = re.findall(r'\$\(vmsctl get (\d+) (\S+)\)', match.group(1))
+        return SimWatcher(self, target, params, float(match.group(2)))
+
+class SimShell(object):
+
+    '''A stand-in for SecureShell and RootShell that runs commands in the
+    SimWorld. Commands are counted and timed as ssh commands are.'''
+
+    def __init__(self, config, host):
+        self.host = host
+        self.port = config.ssh_port
+        self.world = get_sim_world(config)
+
+    def check_output(self, command, input=None,
+                     expected_rc=0, expected_output=None,
+                     exc=False):
+        name = command_name(command)
+        count('ssh', '%s %s' % (self.host, name))
+        with timed('ssh', name):
+            latency = self.world.model['ssh']
+            if latency > 0:
+                time.sleep(latency)
+            (returncode, stdout, stderr) = \
+                self.world.run(self.host, command, input)
+        return check_result(command, returncode, stdout, stderr,
+                            expected_rc, expected_output, exc)
+
+    def popen(self, command):
+        count('ssh', '%s %s' % (self.host, command_name(command)))
+        return self.world.popen(self.host, command)
+
+    def is_alive(self):
+        try:
+            self.check_output('true', exc=True)
+            return True
+        except:
+            return False
+
+worlds = {}
+worlds_lock = threading.Lock()
+
+def get_sim_world(config):
+    '''Returns the simulated world of this process, creating it on first
+    use over the fake cloud and with config.sim_model.'''
+    if not config.fake_cloud:
+        raise ValueError('sim_shell needs fake_cloud')
+    with worlds_lock:
+        if 'world' not in worlds:
+            model = parse_settings(config.sim_model)
+            for name in model:
+                if name not in DEFAULT_MODEL:
+                    raise ValueError('Unknown sim model setting %s' % name)
+            worlds['world'] = SimWorld(get_fake_cloud(config), model)
+            log.info('Simulating the hosts and guests of the fake cloud')
+        return worlds['world']
@@ -0,0 +1,253 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import hashlib
+import json
+import os
+import time
+
+from . import fakecloud
+from . import simshell
+from . balloon import BalloonFingerprint
+from . breadcrumbs import trail_digest
+from . config import Config
+from . fakecloud import FakeCloud
+from . host import Host, vms_indexes
+from . shell import secure_shell
+from . vmsctl import VmsInfo
+
+LATENCIES = dict((name, 0.02) for name in
+                 ('boot', 'bless', 'launch', 'migrate', 'delete', 'discard',
+                  'volume_create', 'volume_attach', 'volume_detach',
+                  'volume_delete'))
+
+HELPER = '/var/lib/grinder/helper/guesthelper.py'
+
+class SimTest(object):
+
+    def setup_method(self, method):
+        self.config = Config()
+        self.config.fake_cloud = True
+        self.config.sim_shell = True
+        self.config.sim_model = ['time_scale=1000']
+        self.cloud = FakeCloud(['host1', 'host2'], ['precise'],
+                               latencies=LATENCIES)
+        # The session's own fake cloud and world, if any, are put back
+        # afterwards.
+        self.saved = (dict(fakecloud.clouds), dict(simshell.worlds),
+                      dict(vms_indexes))
+        fakecloud.clouds.clear()
+        simshell.worlds.clear()
+        vms_indexes.clear()
+        fakecloud.clouds['cloud'] = self.cloud
+        self.world = simshell.get_sim_world(self.config)
+
+    def teardown_method(self, method):
+        (clouds, worlds, indexes) = self.saved
+        for (table, saved) in [(fakecloud.clouds, clouds),
+                               (simshell.worlds, worlds),
+                               (vms_indexes, indexes)]:
+            table.clear()
+            table.update(saved)
+
+    def settle(self):
+        time.sleep(0.03)
+
+    def boot(self, host='host1'):
+        nova = self.cloud.nova
+        server = nova.servers.create(name='master',
+            image=nova.images.find(name='precise').id,
+            flavor=nova.flavors.find(name='m1.tiny').id,
+            availability_zone='nova:%s' % host)
+        self.settle()
+        return server
+
+    def bless(self, master):
+        blessed = self.cloud.nova.gridcentric.bless(master)[0]
+        self.settle()
+        return blessed
+
+    def launch(self, blessed, host='host1', **kwargs):
+        clone = self.cloud.nova.gridcentric.launch(
+            blessed, availability_zone='nova:%s' % host, **kwargs)[0]
+        self.settle()
+        clone.get()
+        return clone
+
+    def address(self, server):
+        server.get()
+        return server.networks['private'][0]
+
+    def vmsctl(self, host, clone, command, *args):
+        pid = host.get_vms_id('%08x' % self.cloud.server(clone.id).raw_id)
+        (stdout, stderr) = host.check_output(
+            'vmsctl %s %d %s' % (command, pid, ' '.join(args)))
+        return stdout
+
+    def hoard(self, host, clone):
+        self.vmsctl(host, clone, 'set', 'hoard', '1')
+        self.vmsctl(host, clone, 'set', 'hoard.rate', '100000')
+        for i in range(100):
+            if self.vmsctl(host, clone, 'get', 'memory.complete') == '1':
+                return
+            time.sleep(0.01)
+        assert False
+
+    def helper(self, shell, op, **args):
+        command = 'if [ -e %s ]; then python %s; else echo MISSING; fi' % \
+                    (HELPER, HELPER)
+        (stdout, stderr) = shell.check_output(
+            command, input=json.dumps({'op': op, 'args': args}))
+        return json.loads(stdout)
+
+class TestSimHost(SimTest):
+
+    def test_vms_and_sharing(self):
+        host = Host('host1', self.config)
+        blessed = self.bless(self.boot())
+        clones = [self.launch(blessed) for i in range(2)]
+        for clone in clones:
+            self.vmsctl(host, clone, 'pause')
+            self.vmsctl(host, clone, 'set', 'share.enabled', '1')
+            self.vmsctl(host, clone, 'set', 'share.onfetch', '1')
+            self.vmsctl(host, clone, 'set', 'eviction.enabled', '0')
+        info = VmsInfo(self.vmsctl(host, clones[0], 'info'),
+                       host.get_vms_id('%08x' %
+                                       self.cloud.server(clones[0].id).raw_id))
+        assert info['share.enabled'] == 1
+        assert info['pages'] == 512 * 256
+        generation = self.vmsctl(host, clones[0], 'get', 'generation')
+        assert self.vmsctl(host, clones[1], 'get', 'generation') == generation
+        assert host.get_vmsfs_generations() == set([generation])
+
+        for clone in clones:
+            self.hoard(host, clone)
+        stats = host.get_vmsfs_stats(generation)
+        ratio = float(stats['cur_resident']) / stats['cur_allocated']
+        assert ratio > 2 * 0.8
+        assert stats['sh_cow'] == 0
+        # Running clones unshare.
+        self.vmsctl(host, clones[0], 'unpause')
+        time.sleep(0.01)
+        assert host.get_vmsfs_stats(generation)['sh_cow'] > 0
+        many = host.get_vmsfs_stats_many([None, generation])
+        assert many[None]['cur_resident'] == many[generation]['cur_resident']
+        assert host.check_output('vmsctl get 1 pages',
+                                 expected_rc=None)[0] == ''
+
+    def test_eviction(self):
+        host = Host('host1', self.config)
+        clone = self.launch(self.bless(self.boot()))
+        self.hoard(host, clone)
+        self.vmsctl(host, clone, 'set', 'eviction.paging', '1')
+        self.vmsctl(host, clone, 'set', 'eviction.enabled', '1')
+        self.vmsctl(host, clone, 'set', 'memory.target', '10000')
+        time.sleep(0.05)
+        assert int(self.vmsctl(host, clone, 'get', 'memory.current')) < 10000
+        assert int(self.vmsctl(host, clone, 'get', 'eviction.pagedout')) > 0
+        self.vmsctl(host, clone, 'set', 'memory.target', '0')
+        self.hoard(host, clone)
+        self.vmsctl(host, clone, 'dropall')
+        freed = self.vmsctl(host, clone, 'get',
+                            'stats.eviction.drop.freepgsize.max')
+        assert int(freed) > 0.5 * 512 * 256
+
+    def test_counters_and_iptables(self):
+        host = Host('host1', self.config)
+        clone = self.launch(self.bless(self.boot()))
+        raw_id = self.cloud.server(clone.id).raw_id
+        before = host.get_resource_counters()
+        self.hoard(host, clone)
+        after = host.get_resource_counters()
+        assert after['cpu_total'] > before['cpu_total']
+        assert after['net_rx'] > before['net_rx']
+        assert host.get_ips() == ['127.0.0.1', '192.168.100.1']
+        (exists, rules) = host.get_nova_compute_instance_filter_rules(raw_id)
+        assert exists
+        assert '-s HOST_IP -p udp -m udp --sport 67 --dport 68 -j ACCEPT' in \
+            rules
+
+    def test_migration(self):
+        (host1, host2) = (Host('host1', self.config),
+                          Host('host2', self.config))
+        clone = self.launch(self.bless(self.boot()))
+        raw_id = self.cloud.server(clone.id).raw_id
+        rules = host1.get_nova_compute_instance_filter_rules(raw_id)
+        pid = host1.get_vms_id('%08x' % raw_id)
+        self.cloud.nova.gridcentric.migrate(clone, 'host2')
+        self.settle()
+        host1.invalidate_vms_ids()
+        host2.invalidate_vms_ids()
+        assert host2.get_vms_id('%08x' % raw_id) != pid
+        assert host1.get_nova_compute_instance_filter_rules(raw_id) == \
+            (False, [])
+        assert host2.get_nova_compute_instance_filter_rules(raw_id) == rules
+
+    def test_watch(self):
+        host = Host('host1', self.config)
+        clone = self.launch(self.bless(self.boot()))
+        pid = host.get_vms_id('%08x' % self.cloud.server(clone.id).raw_id)
+        proc = host.get_shell().popen(
+            'while true; do echo "$(date +%%s.%%N) $(vmsctl get %d pages) '
+            '$(vmsctl get %d hoard)"; sleep 0.01; done' % (pid, pid))
+        try:
+            time.sleep(0.05)
+            lines = os.read(proc.stdout.fileno(), 4096).strip().split('\n')
+        finally:
+            proc.terminate()
+            proc.wait()
+        assert len(lines) >= 2
+        assert lines[0].split()[1:] == [str(512 * 256), '0']
+
+class TestSimGuest(SimTest):
+
+    def test_files_and_helper(self):
+        master = self.boot()
+        shell = secure_shell(self.config, self.address(master), 'key', 'user')
+        assert shell.is_alive()
+        (stdout, stderr) = shell.check_output(
+            'if [ -e %s ]; then python %s; else echo MISSING; fi' %
+                (HELPER, HELPER), input='{}')
+        assert stdout == 'MISSING'
+        shell.check_output('cat > %s' % HELPER, input='# helper')
+        assert shell.check_output('md5sum %s' % HELPER)[0].split()[0] == \
+            hashlib.md5('# helper').hexdigest()
+        assert self.helper(shell, 'list-devices') == {'result': ['/dev/vda']}
+        shell.check_output('unknown-command', expected_rc=127)
+
+        # Balloons are only as big as tmpfs allows.
+        fingerprint = BalloonFingerprint.generate(1024)
+        shell.check_output('mount -o remount,size=%d /dev/shm' % (512 << 12))
+        assert 'error' in self.helper(shell, 'balloon-fill',
+                                      path='/dev/shm/file',
+                                      seed=fingerprint.seed, pages=1024)
+        shell.check_output('mount -o remount,size=%d /dev/shm' % (2048 << 12))
+        self.helper(shell, 'balloon-fill', path='/dev/shm/file',
+                    seed=fingerprint.seed, pages=1024)
+        self.helper(shell, 'breadcrumb-add', path='/dev/shm/trail', text='one')
+
+        # Clones inherit the master's guest.
+        clone = self.launch(self.bless(master),
+                            guest_params={'key': 'verified'})
+        shell = secure_shell(self.config, self.address(clone), 'key', 'user')
+        reported = self.helper(shell, 'balloon-digest', path='/dev/shm/file',
+                               indexes=[0, 1])['result']
+        assert fingerprint.mismatches(reported) == []
+        result = self.helper(shell, 'breadcrumb-add', path='/dev/shm/trail',
+                             text='two')['result']
+        assert result == [2, trail_digest(['one', 'two'])]
+        assert self.helper(shell, 'read-params') == \
+            {'result': {'key': 'verified'}}
@@ -0,0 +1,147 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+import time
+
+from . logger import log
+from . util import percentile
+from . util import run_parallel
+
+INSTANCE_CHAIN_PREFIX = 'nova-compute-inst-'
+
+class LaunchStorm(object):
+
+    '''Keeps concurrency launch/delete cycles of clones of one blessed
+    instance in flight, until duration seconds have passed or count
+    launches were started. Each launch is timed from the request until the
+    clone is up, as Instance.launch() defines it.'''
+
+    def __init__(self, blessed, concurrency, duration=None, count=None):
+        assert duration is not None or count is not None
+        self.blessed = blessed
+        self.concurrency = concurrency
+        self.duration = duration
+        self.count = count
+        self.lock = threading.Lock()
+        self.started = 0
+        # (start, latency, error) per launch.
+        self.launches = []
+        self.delete_errors = []
+        self.elapsed = None
+
+    def next(self):
+        with self.lock:
+            if self.count is not None and self.started >= self.count:
+                return False
+            if self.deadline is not None and time.time() >= self.deadline:
+                return False
+            self.started += 1
+            return True
+
+    def worker(self, index):
+        while self.next():
+            start = time.time()
+            try:
+                clone = self.blessed.launch()
+            except Exception, e:
+                log.error('Storm launch failed: %s' % e)
+                with self.lock:
+                    self.launches.append((start, time.time() - start, e))
+                continue
+            with self.lock:
+                self.launches.append((start, time.time() - start, None))
+            try:
+                clone.delete()
+            except Exception, e:
+                log.error('Storm delete of %s failed: %s' % (clone, e))
+                with self.lock:
+                    self.delete_errors.append(e)
+
+    def run(self):
+        log.info('Storming %s with %d launches in flight' %
+                 (self.blessed, self.concurrency))
+        start = time.time()
+        if self.duration is not None:
+            self.deadline = start + self.duration
+        else:
+            self.deadline = None
+        run_parallel(self.worker, range(self.concurrency))
+        self.elapsed = time.time() - start
+        return self
+
+    def latencies(self):
+        return [latency for (start, latency, error) in self.launches
+                if error is None]
+
+    def summary(self):
+        latencies = self.latencies()
+        errors = len(self.launches) - len(latencies)
+        result = {'launches': len(latencies),
+                  'errors': errors,
+                  'error_rate': float(errors) / max(len(self.launches), 1),
+                  'delete_errors': len(self.delete_errors),
+                  'per_minute': len(latencies) * 60.0 / self.elapsed}
+        if len(latencies) > 0:
+            for p in (50, 90, 99):
+                result['p%d' % p] = percentile(latencies, p)
+        return result
+
+class LeakCheck(object):
+
+    '''Remembers the instance iptables chains and the vmsfs generations of
+    every host in a cluster, to find those that are left over later. Fails
+    right away if the state of any host can't be collected to begin with.'''
+
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.before = self.state()
+        failed = sorted(key for (key, names) in self.before.items()
+                        if names is None)
+        if len(failed) > 0:
+            raise Exception('Cannot check the leaks of %s' %
+                            ', '.join('%s %ss' % key for key in failed))
+
+    def state(self):
+        '''Returns {(host, kind): names}, with None as the names of a host
+        that failed to report them.'''
+        iptables = self.cluster.iptables()
+        generations = self.cluster.vmsfs_generations()
+        state = {}
+        for (hostname, snapshot) in iptables.results.items():
+            state[(hostname, 'chain')] = \
+                set(chain for chain in snapshot.chains
+                    if chain.startswith(INSTANCE_CHAIN_PREFIX))
+        for (hostname, names) in generations.results.items():
+            state[(hostname, 'generation')] = names
+        for hostname in iptables.errors:
+            state[(hostname, 'chain')] = None
+        for hostname in generations.errors:
+            state[(hostname, 'generation')] = None
+        return state
+
+    def leaks(self):
+        '''Returns a sorted list of (host, kind, name) that appeared since
+        the check was created. A host that failed to report its state is
+        listed as (host, kind, None), as it can't be shown to be clean.'''
+        after = self.state()
+        leaked = []
+        for (key, names) in after.items():
+            if names is None:
+                leaked.append(key + (None,))
+            else:
+                for name in names - self.before.get(key, set()):
+                    leaked.append(key + (name,))
+        return sorted(leaked)
@@ -0,0 +1,103 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+import pytest
+
+from . cluster import ClusterSnapshot
+from . storm import LaunchStorm, LeakCheck
+
+class FakeClone(object):
+    def __init__(self, blessed):
+        self.blessed = blessed
+
+    def delete(self):
+        with self.blessed.lock:
+            self.blessed.live -= 1
+
+class FakeBlessed(object):
+    def __init__(self, fail_every):
+        self.fail_every = fail_every
+        self.lock = threading.Lock()
+        self.launched = 0
+        self.live = 0
+        self.peak = 0
+
+    def launch(self):
+        with self.lock:
+            self.launched += 1
+            if self.launched % self.fail_every == 0:
+                raise Exception('launch failed')
+            self.live += 1
+            self.peak = max(self.peak, self.live)
+        return FakeClone(self)
+
+def test_storm_count():
+    blessed = FakeBlessed(4)
+    storm = LaunchStorm(blessed, 3, count=20).run()
+    assert blessed.launched == 20
+    assert blessed.live == 0
+    assert blessed.peak <= 3
+    summary = storm.summary()
+    assert summary['launches'] == 15
+    assert summary['errors'] == 5
+    assert summary['error_rate'] == 0.25
+    assert summary['per_minute'] > 0
+    assert len(storm.latencies()) == 15
+
+def test_storm_duration():
+    blessed = FakeBlessed(1000)
+    storm = LaunchStorm(blessed, 2, duration=0.1).run()
+    assert storm.elapsed >= 0.1
+    summary = storm.summary()
+    assert summary['launches'] + summary['errors'] == blessed.launched
+
+class FakeIptables(object):
+    def __init__(self, chains):
+        self.chains = dict((chain, []) for chain in chains)
+
+class FakeCluster(object):
+    def __init__(self):
+        self.chains = {'h1': ['INPUT', 'nova-compute-inst-1']}
+        self.generations = {'h1': set(['100'])}
+        self.failed = set()
+
+    def errors(self):
+        return dict((host, Exception('unreachable')) for host in self.failed)
+
+    def iptables(self):
+        return ClusterSnapshot(0, 0, dict((host, FakeIptables(chains))
+                               for (host, chains) in self.chains.items()
+                               if host not in self.failed), self.errors())
+
+    def vmsfs_generations(self):
+        return ClusterSnapshot(0, 0, dict((host, names)
+                               for (host, names) in self.generations.items()
+                               if host not in self.failed), self.errors())
+
+def test_leak_check():
+    cluster = FakeCluster()
+    check = LeakCheck(cluster)
+    assert check.leaks() == []
+    cluster.chains['h1'] = ['INPUT', 'FORWARD', 'nova-compute-inst-2']
+    cluster.generations['h1'] = set(['100', '101'])
+    assert check.leaks() == [('h1', 'chain', 'nova-compute-inst-2'),
+                             ('h1', 'generation', '101')]
+    # A host that can't be queried is not taken to be clean.
+    cluster.failed.add('h1')
+    assert check.leaks() == [('h1', 'chain', None), ('h1', 'generation', None)]
+    # Nor can it be checked if it could not be queried to begin with.
+    pytest.raises(Exception, LeakCheck, cluster)
@@ -13,6 +13,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import math
+import sys
+import threading
 import types
 import time
 import os
@@ -21,6 +24,9 @@ import urllib
 
 from . logger import log
 from . config import default_config
+from . import profiling
+from . accounting import count
+from . accounting import poll_name
 
 def assert_raises(exception_type, command, *args, **kwargs):
     try:
@@ -90,17 +96,84 @@ def list_filter(l, exclude=None, include=None, only=None):
         only = l
     return [e for e in l if e not in exclude and e in only]
 
+def percentile(values, p):
+    '''Returns the p-th percentile (0 <= p <= 100) of values, interpolating
+    linearly between the closest ranks.'''
+    if len(values) == 0:
+        raise ValueError('percentile of an empty sequence')
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100.0
+    lower = int(math.floor(rank))
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+def run_parallel(fn, items, timeout=None):
+    '''Calls fn(item) for each item in its own thread and waits at most
+    timeout seconds (None waits forever) for all of them. Returns a tuple
+    (results, errors) of dictionaries keyed by item. Calls that raised are
+    in errors with their exception, calls still running at the deadline are
+    in errors with a timeout exception and are left to finish on their own.
+    An exception raised by a call keeps its sys.exc_info() in exc_info, so
+    that reraise() shows where in the thread it was raised.'''
+    results = {}
+    errors = {}
+    lock = threading.Lock()
+
+    def run(item):
+        try:
+            result = fn(item)
+            with lock:
+                results[item] = result
+        except Exception, e:
+            e.exc_info = sys.exc_info()
+            with lock:
+                errors[item] = e
+
+    threads = []
+    for item in items:
+        thread = threading.Thread(target=run, args=(item,))
+        thread.daemon = True
+        thread.start()
+        threads.append((item, thread))
+
+    if timeout is not None:
+        deadline = time.time() + timeout
+    for (item, thread) in threads:
+        if timeout is None:
+            thread.join()
+        else:
+            thread.join(max(0, deadline - time.time()))
+
+    with lock:
+        results = dict(results)
+        errors = dict(errors)
+    for (item, thread) in threads:
+        if item not in results and item not in errors:
+            errors[item] = Exception('Timeout: waited %ss for %s' %
+                                     (timeout, item))
+    return (results, errors)
+
+def reraise(error):
+    '''Raises an error collected by run_parallel() with its original
+    traceback.'''
+    exc_info = getattr(error, 'exc_info', None)
+    if exc_info is None:
+        raise error
+    raise exc_info[0], exc_info[1], exc_info[2]
+
 def wait_for(message, condition, interval=1):
     duration = int(default_config.ops_timeout)
     log.info('Waiting %ss for %s', duration, message)
     start = time.time()
+    name = poll_name(message)
     while True:
+        count('poll', name)
         if condition():
             return
         remaining = start + duration - time.time()
         if remaining <= 0:
             raise Exception('Timeout: waited %ss for %s' % (duration, message))
-        time.sleep(min(interval, remaining))
+        profiling.sleep(min(interval, remaining), 'wait_for')
 
 def wait_for_ping(addrs):
     assert len(addrs) > 0
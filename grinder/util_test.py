@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import sys
+
 import pytest
 
 import util
@@ -59,3 +61,32 @@ def test_list_filter():
     assert [1, 4] == util.list_filter([1,2,3,4], exclude = [2, 3], only = [1, 2, 4])
     assert [1, 4] == util.list_filter([1,2,3], include = [4], only = [1, 4])
     assert [1, 4] == util.list_filter([1,2,3,4], exclude = [2, 3], include = [5], only = [1, 2, 4])
+
+def test_percentile():
+    assert 3 == util.percentile([5, 1, 3], 50)
+    assert 1 == util.percentile([5, 1, 3], 0)
+    assert 5 == util.percentile([5, 1, 3], 100)
+    assert 2.5 == util.percentile([1, 2, 3, 4], 50)
+    assert 7 == util.percentile([7], 99)
+    pytest.raises(ValueError, util.percentile, [], 50)
+
+def test_run_parallel():
+    def fn(x):
+        if x < 0:
+            raise ValueError(x)
+        return x * 2
+    (results, errors) = util.run_parallel(fn, [1, 2, -1])
+    assert results == {1: 2, 2: 4}
+    assert errors.keys() == [-1]
+    assert isinstance(errors[-1], ValueError)
+    # Re-raised, the error still points at where fn raised it.
+    try:
+        util.reraise(errors[-1])
+    except ValueError:
+        tb = sys.exc_info()[2]
+        while tb.tb_next is not None:
+            tb = tb.tb_next
+        assert tb.tb_frame.f_code is fn.func_code
+    else:
+        assert False
+    pytest.raises(ValueError, util.reraise, ValueError('no traceback'))
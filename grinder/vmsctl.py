@@ -13,10 +13,106 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import ast
+import os
+import select
 import time
 
 from . config import default_config
 
+class Trajectory(object):
+
+    '''The samples streamed back by Vmsctl.watch(). Each sample is a tuple
+    of the host timestamp and a dictionary of the watched parameters. The
+    met attribute says whether the watched condition held in the end.'''
+
+    def __init__(self, params):
+        self.params = params
+        self.samples = []
+        self.met = False
+
+    def add(self, timestamp, values):
+        self.samples.append((timestamp, values))
+
+    def times(self):
+        return [t for (t, values) in self.samples]
+
+    def values(self, key):
+        return [values[key] for (t, values) in self.samples]
+
+    def duration(self):
+        if len(self.samples) < 2:
+            return 0.0
+        return self.samples[-1][0] - self.samples[0][0]
+
+    def rate(self, key):
+        '''The average rate of change of key per second over the trajectory,
+        e.g. pages per second for memory.current while hoarding.'''
+        duration = self.duration()
+        if duration <= 0:
+            return 0.0
+        return (self.samples[-1][1][key] - self.samples[0][1][key]) / duration
+
+    def rates(self, key):
+        '''The rate of change of key per second between consecutive samples,
+        as a list of (timestamp, rate) tuples.'''
+        rates = []
+        for (prev, cur) in zip(self.samples, self.samples[1:]):
+            elapsed = cur[0] - prev[0]
+            if elapsed > 0:
+                rates.append((cur[0], (cur[1][key] - prev[1][key]) / elapsed))
+        return rates
+
+    def __str__(self):
+        return 'Trajectory(params=%s, samples=%d, duration=%.2fs, met=%s)' % \
+            (','.join(self.params), len(self.samples), self.duration(), self.met)
+
+def coerce_info_value(value):
+    if isinstance(value, basestring):
+        for convert in (int, float):
+            try:
+                return convert(value)
+            except ValueError:
+                pass
+    return value
+
+class VmsInfo(object):
+
+    '''A parsed snapshot of the output of vmsctl info for one vms. Numeric
+    values are already converted to int or float; everything else is left
+    as the string vmsctl reported.'''
+
+    def __init__(self, output, vmsid):
+        # The output is a python-style literal of the form
+        # "<vmsid>: {'key': 'value', ...}". Parse it without evaluating it.
+        try:
+            info = ast.literal_eval('{' + output + '}')
+            values = info[vmsid]
+        except (SyntaxError, ValueError, KeyError, TypeError):
+            raise ValueError('Cannot parse vmsctl info for %d: %s' %
+                             (vmsid, output))
+        self.values = dict((key, coerce_info_value(value))
+                           for (key, value) in values.items())
+        self.timestamp = time.time()
+
+    def age(self):
+        return time.time() - self.timestamp
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def keys(self):
+        return self.values.keys()
+
+    def items(self):
+        return self.values.items()
+
 class Vmsctl(object):
 
     '''The Vmsctl interface wraps around an Instance object and provides
@@ -25,8 +121,14 @@ class Vmsctl(object):
     def __init__(self, instance):
         self.instance = instance
         self.vmsid = self.instance.get_vms_id()
+        # The trajectory of the last full_hoard() or meet_target().
+        self.trajectory = None
+        self.last_info = None
 
     def call(self, command, *args):
+        if command not in ("get", "info"):
+            # Anything else may change what info() reports.
+            self.last_info = None
         host = self.instance.get_host()
         (stdout, stderr) = host.check_output(
             "vmsctl %s %d " % (command, self.vmsid) + " ".join(args))
@@ -71,33 +173,93 @@ class Vmsctl(object):
     def dropall(self):
         self.call("dropall")
 
+    def watch(self, params, condition, interval=None,
+              wait_seconds=default_config.ops_timeout):
+        '''Samples the given params on the host every interval seconds and
+        streams them back over a single ssh channel, until condition (called
+        with a dictionary of the latest values) holds or wait_seconds elapse.
+        Returns the Trajectory of all samples.'''
+        if interval is None:
+            interval = self.instance.harness.config.vmsctl_watch_interval
+        values = ' '.join(['$(vmsctl get %d %s)' % (self.vmsid, param)
+                           for param in params])
+        script = 'while true; do echo "$(date +%%s.%%N) %s"; sleep %s; done' % \
+                    (values, str(interval))
+
+        trajectory = Trajectory(params)
+        shell = self.instance.get_host().get_shell()
+        proc = shell.popen(script)
+        try:
+            fd = proc.stdout.fileno()
+            deadline = time.time() + wait_seconds
+            buf = ''
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return trajectory
+                (ready, _, _) = select.select([fd], [], [], remaining)
+                if len(ready) == 0:
+                    return trajectory
+                data = os.read(fd, 4096)
+                if data == '':
+                    raise Exception('Watcher on host %s exited: %s' %
+                                    (shell.host, str(trajectory)))
+                buf += data
+                while '\n' in buf:
+                    (line, buf) = buf.split('\n', 1)
+                    tokens = line.split()
+                    if len(tokens) != len(params) + 1:
+                        continue
+                    sample = {}
+                    for (param, token) in zip(params, tokens[1:]):
+                        try:
+                            sample[param] = long(token)
+                        except ValueError:
+                            sample[param] = token
+                    trajectory.add(float(tokens[0]), sample)
+                    if condition(sample):
+                        trajectory.met = True
+                        return trajectory
+        finally:
+            proc.terminate()
+            proc.wait()
+
     # You need to set the appropriate knobs for vmsd to have the
     # right tools to meet your target.
     def meet_target(self, target, wait_seconds=default_config.ops_timeout):
-        tries = 0
         self.set_target(target)
-        while int(self.get_param("memory.current")) >= target:
-            time.sleep(1.0)
-            tries += 1
-            if tries >= wait_seconds:
-                return False
-        return True
+        self.trajectory = self.watch(
+            ["memory.current"],
+            lambda values: values["memory.current"] < target,
+            wait_seconds=wait_seconds)
+        return self.trajectory.met
 
     def full_hoard(self, rate=10000, wait_seconds=default_config.ops_timeout):
         self.clear_target()
         self.clear_flag("eviction.enabled")
+        start = time.time()
         self.set_flag("hoard")
         self.set_param("hoard.rate", str(rate))
-        tries = 0
 
-        while int(self.get_param("memory.complete")) != 1:
-            time.sleep(1.0)
-            tries += 1
-            if tries >= wait_seconds:
-                return False
+        self.trajectory = self.watch(
+            ["memory.complete", "memory.current"],
+            lambda values: values["memory.complete"] == 1,
+            wait_seconds=wait_seconds)
+        if not self.trajectory.met:
+            return False
 
+        harness = self.instance.harness
+        harness.add_metric('latency.hoard', time.time() - start, rate=rate,
+                           **harness.recorder.describe(self.instance))
         self.clear_flag("hoard")
         return True
 
-    def info(self):
-        return eval('{' + self.call("info") + '}')[self.vmsid]
+    def info(self, max_age=None):
+        '''Returns a VmsInfo. A snapshot taken less than max_age seconds ago
+        (vmsctl_info_ttl by default) is reused, so reading many fields costs
+        a single remote call. Pass max_age=0 to force a fresh one.'''
+        if max_age is None:
+            max_age = self.instance.harness.config.vmsctl_info_ttl
+        if self.last_info is None or self.last_info.age() > max_age:
+            self.last_info = VmsInfo(self.call("info"), self.vmsid)
+        return self.last_info
@@ -0,0 +1,41 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import pytest
+
+from . vmsctl import VmsInfo, Trajectory
+
+def test_info_parsing():
+    info = VmsInfo("1234: {'eviction.paging': '0', 'stats.enabled': '1', "
+                   "'hoard.rate': '2.5', 'generation': 'abc-def'}", 1234)
+    assert info['eviction.paging'] == 0
+    assert info['stats.enabled'] == 1
+    assert info['hoard.rate'] == 2.5
+    assert info['generation'] == 'abc-def'
+    assert 'stats.enabled' in info
+    assert info.get('missing') is None
+
+def test_info_is_not_evaluated():
+    pytest.raises(ValueError, VmsInfo, "1234: __import__('os').getpid()", 1234)
+    pytest.raises(ValueError, VmsInfo, "1234: {'a': '1'}", 4321)
+
+def test_trajectory_rates():
+    trajectory = Trajectory(['memory.current'])
+    for (t, current) in [(10.0, 0), (10.5, 500), (11.0, 2000)]:
+        trajectory.add(t, {'memory.current': current})
+    assert trajectory.duration() == 1.0
+    assert trajectory.rate('memory.current') == 2000.0
+    assert trajectory.rates('memory.current') == [(10.5, 1000.0),
+                                                  (11.0, 3000.0)]
@@ -22,6 +22,7 @@ from . util import assert_raises
 from . import requirements
 from . host import Host
 from . import instance
+from . volumes import prime_volumes, verify_volumes
 
 class TestVolume(harness.TestCase):
 
@@ -34,11 +35,11 @@ class TestVolume(harness.TestCase):
         with self.harness.volume() as volume:
             with self.harness.booted(image_finder) as master:
                 device = master.attach_volume(volume)
-                md5 = master.prime_volume(device)
+                fingerprint = master.prime_volume(device)
                 blessed = master.bless()
                 master.assert_alive()
                 blessed.discard()
-                master.verify_volume(device, md5)
+                master.verify_volume(device, fingerprint)
 
     @harness.requires(requirements.VOLUME_SUPPORT)
     @harness.platformtest(exclude=["windows"])
@@ -47,11 +48,11 @@ class TestVolume(harness.TestCase):
         with self.harness.volume() as volume:
             with self.harness.booted(image_finder) as master:
                 device = master.attach_volume(volume)
-                md5 = master.prime_volume(device)
+                fingerprint = master.prime_volume(device)
                 blessed = master.bless()
                 launched = blessed.launch()
-                launched.verify_volume(device, md5)
-                master.verify_volume(device, md5)
+                launched.verify_volume(device, fingerprint)
+                master.verify_volume(device, fingerprint)
                 launched.delete()
                 blessed.discard()
 
@@ -59,43 +60,43 @@ class TestVolume(harness.TestCase):
     @harness.platformtest(exclude=["windows"])
     def test_launch_with_multiple_volumes(self, image_finder):
         image_finder.find(self.harness.nova, self.harness.config)
-        with self.harness.volume() as volume_1:
-            with self.harness.volume() as volume_2:
-                with self.harness.booted(image_finder) as master:
-                    device_1 = master.attach_volume(volume_1)
-                    md5_1 = master.prime_volume(device_1)
-                    device_2 = master.attach_volume(volume_2)
-                    md5_2 = master.prime_volume(device_2)
-                    blessed = master.bless()
-                    launched = blessed.launch()
-                    launched.verify_volume(device_1, md5_1)
-                    launched.verify_volume(device_2, md5_2)
-                    master.verify_volume(device_1, md5_1)
-                    master.verify_volume(device_2, md5_2)
-                    launched.delete()
-                    blessed.discard()
+        with self.harness.volumes(2) as (volume_1, volume_2):
+            with self.harness.booted(image_finder) as master:
+                devices = master.attach_volumes([volume_1, volume_2])
+                primed = prime_volumes([(master, device) for device in devices])
+                blessed = master.bless()
+                launched = blessed.launch()
+                checks = {}
+                for device in devices:
+                    checks[(launched, device)] = primed[(master, device)]
+                # The clone shreds its copies, then the master's volumes
+                # must still be intact.
+                verify_volumes(checks)
+                verify_volumes(primed)
+                launched.delete()
+                blessed.discard()
 
     @harness.requires(requirements.VOLUME_SUPPORT)
     @harness.platformtest(exclude=["windows"])
     def test_multiple_launch_multiple_volumes(self, image_finder):
         image_finder.find(self.harness.nova, self.harness.config)
-        with self.harness.volume() as volume_1:
-            with self.harness.volume() as volume_2:
-                with self.harness.booted(image_finder) as master:
-                    device_1 = master.attach_volume(volume_1)
-                    md5_1 = master.prime_volume(device_1)
-                    device_2 = master.attach_volume(volume_2)
-                    md5_2 = master.prime_volume(device_2)
-                    blessed = master.bless()
-                    clones = blessed.launch(num_instances=3)
-                    for clone in clones:
-                        clone.verify_volume(device_1, md5_1)
-                        clone.verify_volume(device_2, md5_2)
-                    master.verify_volume(device_1, md5_1)
-                    master.verify_volume(device_2, md5_2)
-                    for clone in clones:
-                        clone.delete()
-                    blessed.discard()
+        with self.harness.volumes(2) as (volume_1, volume_2):
+            with self.harness.booted(image_finder) as master:
+                devices = master.attach_volumes([volume_1, volume_2])
+                primed = prime_volumes([(master, device) for device in devices])
+                blessed = master.bless()
+                clones = blessed.launch(num_instances=3)
+                checks = {}
+                for clone in clones:
+                    for device in devices:
+                        checks[(clone, device)] = primed[(master, device)]
+                # The clones shred their copies, then the master's volumes
+                # must still be intact.
+                verify_volumes(checks)
+                verify_volumes(primed)
+                for clone in clones:
+                    clone.delete()
+                blessed.discard()
 
     @harness.requires(requirements.VOLUME_SUPPORT)
     @harness.platformtest(exclude=["windows"])
@@ -108,9 +109,9 @@ class TestVolume(harness.TestCase):
         with self.harness.volume() as volume:
             with self.harness.booted(image_finder) as master:
                 device = master.attach_volume(volume)
-                md5 = master.prime_volume(device)
+                fingerprint = master.prime_volume(device)
                 host = master.get_host()
                 dest = Host([h for h in self.config.hosts if h != host.id][0], self.harness.config)
                 master.migrate(host, dest)
-                master.verify_volume(device, md5)
+                master.verify_volume(device, fingerprint)
 
@@ -0,0 +1,90 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+import time
+
+from . logger import log
+from . util import reraise
+from . util import run_parallel
+from . util import wait_for
+
+class VolumeTracker(object):
+
+    '''Follows the status of cinder volumes. Every poll lists all volumes in
+    a single call, and the listing is shared by everyone waiting within the
+    same interval, so waiting on many volumes (or from many threads) costs
+    one API call per tick.'''
+
+    def __init__(self, cinder, interval=1.0):
+        self.cinder = cinder
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.statuses = {}
+        self.polled = None
+
+    def poll(self):
+        with self.lock:
+            if self.polled is None or \
+               time.time() - self.polled >= self.interval:
+                self.statuses = dict((volume.id, volume.status.lower())
+                                     for volume in self.cinder.volumes.list())
+                self.polled = time.time()
+            return self.statuses
+
+    def status(self, volume_id):
+        return self.poll().get(volume_id)
+
+    def wait_for(self, targets):
+        '''Waits until every volume id in the dict targets has its target
+        status. Fails early if a volume goes into error.'''
+        def condition():
+            statuses = self.poll()
+            for (volume_id, status) in targets.items():
+                if statuses.get(volume_id) == 'error':
+                    raise Exception('Volume %s went into error waiting for %s'
+                                    % (volume_id, status))
+            return all(statuses.get(volume_id) == status
+                       for (volume_id, status) in targets.items())
+        wait_for('volumes %s' % ', '.join('%s to be %s' % item
+                                          for item in sorted(targets.items())),
+                 condition, interval=self.interval)
+        log.debug('Volumes reached %s' % targets)
+
+def raise_errors(errors, what):
+    for ((instance, device), error) in errors.items():
+        log.error('%s %s on %s failed: %s' % (what, device, instance, error))
+    if len(errors) > 0:
+        reraise(errors.values()[0])
+
+def prime_volumes(targets):
+    '''Primes every (instance, device) pair of targets at the same time.
+    Returns a dict of the fingerprints keyed by (instance, device).'''
+    (results, errors) = run_parallel(
+        lambda (instance, device): instance.prime_volume(device), targets)
+    raise_errors(errors, 'Priming')
+    return results
+
+def verify_volumes(fingerprints):
+    '''Verifies, at the same time, every (instance, device) pair of the
+    dict fingerprints against its fingerprint. Pairs from clones may reuse
+    the fingerprint their master's device was primed with. Verifying
+    shreds the device, so verify the clones' pairs in one call and the
+    master's in a later one: the master's volumes must survive the clones
+    shredding their copies.'''
+    def verify((instance, device)):
+        instance.verify_volume(device, fingerprints[(instance, device)])
+    (results, errors) = run_parallel(verify, fingerprints.keys())
+    raise_errors(errors, 'Verifying')
@@ -0,0 +1,57 @@
+# Copyright 2013 GridCentric Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import pytest
+
+from . volumes import VolumeTracker
+
+class FakeVolume(object):
+    def __init__(self, id, status):
+        self.id = id
+        self.status = status
+
+class FakeVolumes(object):
+    '''Each volume goes through its list of statuses, one per listing.'''
+    def __init__(self, histories):
+        self.histories = histories
+        self.calls = 0
+
+    def list(self):
+        self.calls += 1
+        return [FakeVolume(id, history[min(self.calls, len(history)) - 1])
+                for (id, history) in self.histories.items()]
+
+class FakeCinder(object):
+    def __init__(self, histories):
+        self.volumes = FakeVolumes(histories)
+
+def test_one_listing_per_tick():
+    cinder = FakeCinder({'a': ['creating', 'available'],
+                         'b': ['creating', 'creating', 'Available']})
+    tracker = VolumeTracker(cinder, interval=0.01)
+    tracker.wait_for({'a': 'available', 'b': 'available'})
+    assert cinder.volumes.calls == 3
+
+def test_shared_listing():
+    cinder = FakeCinder({'a': ['in-use']})
+    tracker = VolumeTracker(cinder, interval=60)
+    assert tracker.status('a') == 'in-use'
+    assert tracker.status('b') is None
+    assert cinder.volumes.calls == 1
+
+def test_error():
+    cinder = FakeCinder({'a': ['creating', 'error']})
+    tracker = VolumeTracker(cinder, interval=0.01)
+    pytest.raises(Exception, tracker.wait_for, {'a': 'available'})